@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-replace-me-in-production'
@@ -15,11 +16,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'problems.timing_utils.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'problems.profiling_utils.ProfilingMiddleware',
+    'problems.db_utils.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -28,7 +32,8 @@ ROOT_URLCONF = 'problem_manager.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates + 渲染计时（RequestTimingMiddleware 的 tpl 耗时）
+        'BACKEND': 'problems.timing_utils.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -42,16 +47,56 @@ TEMPLATES = [
     },
 ]
 
+# problems.sqlite_backend = 内置 SQLite 后端 + OPTIONS['transaction_mode']（Django 5.1 的移植），不设置时行为与内置后端相同
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'problems.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {},
     }
 }
+# 基准测试/临时环境：LORE_KEEPER_DB 指向另一个 SQLite 文件（配合 LORE_KEEPER_MEDIA_ROOT）
+if os.environ.get('LORE_KEEPER_DB'):
+    DATABASES['default']['NAME'] = os.environ['LORE_KEEPER_DB']
+
+# 数据库配置档：LORE_KEEPER_DB_PROFILE=production 启用 SQLite 生产参数
+# WAL 让读不再被写阻塞；busy_timeout 让并发写排队等待而不是立即 "database is locked"
+# 事务以 BEGIN IMMEDIATE 开始：编辑等先读后写的事务一开始就取写锁，并发写按 busy_timeout 排队，
+# 而不是在读锁升级为写锁时直接 "database is locked"。代价是每个 atomic()（包括只读的）都取写锁，所以只在生产配置档开启
+DB_PROFILE = os.environ.get('LORE_KEEPER_DB_PROFILE', 'default')
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,          # ms
+    'mmap_size': 268435456,        # 256 MB
+    'cache_size': -20000,          # 负数单位为 KiB，约 20 MB
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == 'production':
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# 只读副本：READ_REPLICA_VIEWS 中的只读视图从 READ_REPLICAS 读取，写入后 READ_REPLICA_STICKY_SECONDS 内回主库
+# 本地测试：LORE_KEEPER_REPLICA_DB=<sqlite 文件>，再用 `manage.py replicate_sqlite --interval 1` 保持同步
+DATABASE_ROUTERS = ['problems.db_utils.ReadReplicaRouter']
+READ_REPLICAS = []
+if os.environ.get('LORE_KEEPER_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['LORE_KEEPER_REPLICA_DB'],
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS = ['replica']
+READ_REPLICA_VIEWS = ['problem_list', 'view_detail', 'cv_base_list', 'cv_base_detail', 'cv_base_calendar_days']
+READ_REPLICA_STICKY_SECONDS = 10
 
 STATIC_URL = '/static/'
 MEDIA_URL = '/uploads/'
-MEDIA_ROOT = BASE_DIR / 'uploads'
+MEDIA_ROOT = Path(os.environ.get('LORE_KEEPER_MEDIA_ROOT', BASE_DIR / 'uploads'))
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
@@ -65,3 +110,100 @@ LOGIN_REDIRECT_URL = '/'
 
 # True 时开放注册；False 时关闭注册
 REGISTRATION_OPEN = False
+
+# 缓存必须在所有 worker 进程间共享：失效（版本号递增、删除键）只作用于这里配置的后端
+# 进程内的 LocMemCache 只会清掉处理写请求的那个 worker，其它 worker 会继续返回旧内容直到过期
+# 默认使用本机文件缓存（同一台机器上的所有 worker 共享）；多台机器部署设置 LORE_KEEPER_REDIS_URL（需安装 redis）
+if os.environ.get('LORE_KEEPER_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['LORE_KEEPER_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('LORE_KEEPER_CACHE_DIR', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+
+# /view/<token>/ 公开分享页缓存：匿名访问复用渲染结果（秒）
+VIEW_DETAIL_CACHE_TIMEOUT = 600
+VIEW_DETAIL_MAX_AGE = 60
+VIEW_DETAIL_STALE_WHILE_REVALIDATE = 300
+
+# 匿名用户问题列表整页缓存（秒），Problem 任意变更时整体失效
+PROBLEM_LIST_CACHE_TIMEOUT = 300
+
+# 问题列表结果总数缓存（秒），Problem 或用户变更时失效；超过上限只显示近似总数（上限+），上限之后的页仍可逐页访问
+PROBLEM_COUNT_CACHE_TIMEOUT = 600
+PROBLEM_COUNT_EXACT_LIMIT = 10000
+
+# 搜索框自动补全结果的浏览器缓存时间（秒）
+AUTOCOMPLETE_MAX_AGE = 30
+
+# CV Base 日历区间接口：按用户缓存（秒），CvBase 变更时失效；单次最多查询的天数
+CV_CALENDAR_CACHE_TIMEOUT = 3600
+CV_CALENDAR_MAX_RANGE_DAYS = 366 * 3
+
+# CV Base 全文检索单次返回的最多条数
+CV_SEARCH_MAX_RESULTS = 50
+
+# 请求计时（RequestTimingMiddleware）：Server-Timing 响应头 + 'problems.timing' 日志（每请求一行 JSON）
+# 查询数或耗时超出预算的请求以 WARNING 级别记录，日志中 over_budget 标明超出项
+SERVER_TIMING_HEADER = True
+REQUEST_QUERY_BUDGET = 30
+REQUEST_LATENCY_BUDGET_MS = 500
+
+# 慢查询日志：请求内超过阈值的 SQL 记入 'problems.slow_query' 日志，并按语句形态汇总到 /staff/slow-queries/
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_MAX_ENTRIES = 200
+SLOW_QUERY_REPORT_SIZE = 50
+
+# /metrics（Prometheus 文本格式）：超级用户，或带 Authorization: Bearer <METRICS_TOKEN> 的抓取请求可访问
+# METRICS_ALLOWED_IPS 按 REMOTE_ADDR 放行，默认为空：经 nginx 等反向代理时所有请求都来自 127.0.0.1，不能据此放行
+# 多进程部署（gunicorn 等）设置 LORE_KEEPER_METRICS_DIR 为所有 worker 共享的目录，各进程定期写入快照，抓取时汇总
+METRICS_TOKEN = os.environ.get('LORE_KEEPER_METRICS_TOKEN')
+METRICS_ALLOWED_IPS = []
+METRICS_MULTIPROC_DIR = os.environ.get('LORE_KEEPER_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
+# 超级用户按请求开启的性能分析（?_profile=1 或 X-Profile: 1 返回报告；=store 时写入此目录）
+PROFILE_DIR = BASE_DIR / 'profiles'
+
+# 导出/导入内存上限：预估内存占用超过上限时，导出改为先写临时文件再分块加密（返回文件流）
+# 分块格式的导入始终边解密边写临时文件；旧格式只能整包解密，超过上限时记录 WARNING
+# 峰值内存（RSS 采样）写入 'problems.archive' 日志和响应
+ARCHIVE_MEMORY_LIMIT_MB = int(os.environ.get('LORE_KEEPER_ARCHIVE_MEMORY_LIMIT_MB', 256))
+ARCHIVE_INMEMORY_FACTOR = 3
+ARCHIVE_SPOOL_DIR = os.environ.get('LORE_KEEPER_ARCHIVE_SPOOL_DIR')  # None 为系统临时目录
+# 诊断模式：同时用 tracemalloc 统计 Python 分配峰值。tracemalloc 对整个进程生效，开启期间同一 worker 的
+# 所有请求都会明显变慢（MinHash 计算约 10 倍），只在排查内存问题时临时开启
+ARCHIVE_TRACEMALLOC = os.environ.get('LORE_KEEPER_ARCHIVE_TRACEMALLOC') == '1'
+# 归档格式：2 = NDJSON（每行一条记录，逐批读取数据库、逐行导入，内存不随数据量增长）；1 = 旧版缩进 JSON（供旧版本导入）
+# 导入两种格式都支持
+ARCHIVE_FORMAT_VERSION = 2
+ARCHIVE_ITERATOR_CHUNK_SIZE = 500
+
+# 后台导出任务：加密归档写入此目录，完成后 EXPORT_JOB_TTL_HOURS 小时内可断点续传下载，过期自动删除
+EXPORT_JOB_DIR = os.environ.get('LORE_KEEPER_EXPORT_DIR', BASE_DIR / 'exports')
+EXPORT_JOB_TTL_HOURS = 24
+EXPORT_JOB_PROGRESS_INTERVAL = 0.5  # 进度写入数据库的最小间隔（秒）
+EXPORT_JOB_STALE_MINUTES = 30  # 超过此时间没有进度的任务视为所在进程已退出，标记为失败
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'problems.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'problems.slow_query': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+        'problems.archive': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'problems.metrics': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
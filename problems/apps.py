@@ -3,3 +3,8 @@ from django.apps import AppConfig
 class ProblemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'problems'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .db_utils import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='problems_sqlite_pragmas')
@@ -0,0 +1,691 @@
+import io
+import json
+import hashlib
+import logging
+import os
+import re
+import resource
+import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .metrics_utils import ARCHIVE_DURATION, ARCHIVE_BYTES, ARCHIVE_PEAK_RSS
+from .models import Problem, CvBase, ExportJob
+
+logger = logging.getLogger('problems.archive')
+
+PROBLEM_EXPORT_FIELDS = [
+    'id', 'key_words', 'title', 'description', 'description_editor_type',
+    'root_cause', 'root_cause_editor_type', 'solutions', 'solutions_editor_type',
+    'others', 'others_editor_type', 'create_time', 'update_time',
+    'root_cause_file', 'solutions_file', 'others_file', 'uploaded_images',
+    'is_public', 'public_token',
+]
+CVBASE_EXPORT_FIELDS = [
+    'id', 'record_date', 'title', 'content', 'content_editor_type',
+    'content_file', 'create_time', 'update_time',
+]
+
+# 分块加密容器：MAGIC + 7 字节随机前缀，之后每块 CHUNK_SIZE 明文单独加密
+# nonce = 前缀 + 4 字节块序号 + 1 字节末块标记，附加数据为文件头：块不能被截断、重排或替换
+# 旧格式（整包一次加密）为 12 字节 nonce + 密文，没有 MAGIC
+CHUNKED_MAGIC = b'LKC1'
+CHUNK_PREFIX_SIZE = 7
+CHUNK_SIZE = 1024 * 1024
+TAG_SIZE = 16
+
+# 后台导出任务的文件：EXPORT_JOB_DIR/<任务 uuid>.bin，写入中为 .part
+EXPORT_JOB_FILE_PATTERN = re.compile(r'^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})\.(?:bin|part)$')
+
+# 选择性导出（parse_export_filters）
+EXPORT_MODELS = ('problems', 'cv_base')
+DATE_FILTERS = ('created_from', 'created_to', 'updated_from', 'updated_to', 'record_date_from', 'record_date_to')
+CV_IMAGE_PATTERN = re.compile(
+    r'!\[.*?\]\(/uploads/upload_images/([^)]+)\)|<img[^>]+src=["\']/uploads/upload_images/([^"\']+)["\']'
+)
+
+
+class MemoryMonitor:
+    """
+    Peak RSS (sampled by a background thread) over a block. The tracemalloc peak is only collected when
+    settings.ARCHIVE_TRACEMALLOC is on or tracing was already running (e.g. under the profiling middleware):
+    tracemalloc slows every thread of the process, not just this block.
+    """
+
+    SAMPLE_INTERVAL = 0.05
+
+    def __init__(self):
+        self.peak_traced = None
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    @staticmethod
+    def current_rss():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            # 非 Linux：只能取进程生命周期内的峰值（macOS 单位为字节，Linux 为 KiB）
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, self.current_rss())
+
+    def start(self):
+        self.started_tracing = settings.ARCHIVE_TRACEMALLOC and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self.peak_rss = self.current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Idempotent, so it can be called both before building a response and in a finally block"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, self.current_rss())
+        if tracemalloc.is_tracing():
+            self.peak_traced = tracemalloc.get_traced_memory()[1]
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def as_dict(self):
+        return {
+            'peak_traced_mb': round(self.peak_traced / 1024 / 1024, 1) if self.peak_traced is not None else None,
+            'peak_rss_mb': round(self.peak_rss / 1024 / 1024, 1),
+        }
+
+
+def memory_limit_bytes():
+    return settings.ARCHIVE_MEMORY_LIMIT_MB * 1024 * 1024
+
+
+def parse_export_filters(body):
+    """
+    Validated export filters from a request body; {} exports everything.
+    Raises ValueError with a message for the client.
+    """
+    filters = {}
+    owner = body.get('owner')
+    if owner not in (None, ''):
+        users = User.objects.filter(pk=owner) if str(owner).isdigit() else User.objects.filter(username=owner)
+        user_id = users.values_list('pk', flat=True).first()
+        if user_id is None:
+            raise ValueError(f'unknown owner: {owner}')
+        filters['owner'] = user_id
+    for name in DATE_FILTERS:
+        value = body.get(name)
+        if value:
+            try:
+                date.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a YYYY-MM-DD date')
+            filters[name] = value
+    if body.get('is_public') is not None:
+        if not isinstance(body['is_public'], bool):
+            raise ValueError('is_public must be true or false')
+        filters['is_public'] = body['is_public']
+    problem_ids = body.get('problem_ids')
+    if problem_ids:
+        if not isinstance(problem_ids, list) or not all(isinstance(pk, int) for pk in problem_ids):
+            raise ValueError('problem_ids must be a list of integers')
+        filters['problem_ids'] = sorted(set(problem_ids))
+    include = body.get('include')
+    if include:
+        if not isinstance(include, list) or not set(include) <= set(EXPORT_MODELS):
+            raise ValueError(f'include must be a list of: {", ".join(EXPORT_MODELS)}')
+        if set(include) != set(EXPORT_MODELS):
+            filters['include'] = sorted(set(include))
+    return filters
+
+
+def export_querysets(filters):
+    """(Problem queryset, CvBase queryset) selected by parse_export_filters() output"""
+    problems = Problem.objects.all()
+    records = CvBase.objects.all()
+    if 'owner' in filters:
+        problems = problems.filter(created_by_id=filters['owner'])
+        records = records.filter(created_by_id=filters['owner'])
+    # 创建/更新时间范围对两种数据都生效，其余条件只作用于各自的模型
+    for name, lookup in (('created_from', 'create_time__date__gte'), ('created_to', 'create_time__date__lte'),
+                         ('updated_from', 'update_time__date__gte'), ('updated_to', 'update_time__date__lte')):
+        if name in filters:
+            problems = problems.filter(**{lookup: filters[name]})
+            records = records.filter(**{lookup: filters[name]})
+    if 'is_public' in filters:
+        problems = problems.filter(is_public=filters['is_public'])
+    if 'problem_ids' in filters:
+        problems = problems.filter(pk__in=filters['problem_ids'])
+    if 'record_date_from' in filters:
+        records = records.filter(record_date__gte=filters['record_date_from'])
+    if 'record_date_to' in filters:
+        records = records.filter(record_date__lte=filters['record_date_to'])
+    include = filters.get('include', EXPORT_MODELS)
+    if 'problems' not in include:
+        problems = problems.none()
+    if 'cv_base' not in include:
+        records = records.none()
+    return problems, records
+
+
+def referenced_images(problems, records):
+    """upload_images file names used by the given rows (Problem.uploaded_images, CvBase markdown content)"""
+    images = set()
+    for images_json in problems.exclude(uploaded_images__isnull=True).values_list('uploaded_images', flat=True):
+        try:
+            names = json.loads(images_json)
+        except ValueError:
+            continue
+        if isinstance(names, list):
+            images.update(names)
+    for content in records.filter(content_editor_type='markdown').values_list('content', flat=True):
+        for markdown_name, html_name in CV_IMAGE_PATTERN.findall(content or ''):
+            images.add(markdown_name or html_name)
+    return images
+
+
+def upload_dirs(filters=None):
+    """
+    (path, arcname) of the upload directories/files that go into an export. Without filters: every
+    numeric Problem directory, cv_base/ and upload_images/; with filters only the selected rows'
+    attachment directories and the upload_images they reference.
+    """
+    uploads_path = Path(settings.MEDIA_ROOT)
+    if not uploads_path.exists():
+        return []
+    numeric_dirs = {
+        int(item_dir.name): item_dir for item_dir in uploads_path.iterdir()
+        if item_dir.is_dir() and item_dir.name.isdigit()
+    }
+    if not filters:
+        dirs = [(numeric_dirs[pk], f'uploads/{pk}') for pk in sorted(numeric_dirs)]
+        for name in ('cv_base', 'upload_images'):
+            if (uploads_path / name).exists():
+                dirs.append((uploads_path / name, f'uploads/{name}'))
+        return dirs
+
+    problems, records = export_querysets(filters)
+    problem_ids = set(problems.values_list('pk', flat=True))
+    dirs = [(numeric_dirs[pk], f'uploads/{pk}') for pk in sorted(problem_ids & numeric_dirs.keys())]
+    for pk in records.order_by('pk').values_list('pk', flat=True):
+        record_dir = uploads_path / 'cv_base' / str(pk)
+        if record_dir.is_dir():
+            dirs.append((record_dir, f'uploads/cv_base/{pk}'))
+    for name in sorted(referenced_images(problems, records)):
+        image = uploads_path / 'upload_images' / name
+        # 文件名来自数据库内容：只接受 upload_images 下的普通文件
+        if '/' not in name and image.is_file():
+            dirs.append((image, f'uploads/upload_images/{name}'))
+    return dirs
+
+
+def directory_size(path):
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def estimate_export_bytes(filters=None):
+    """Rough in-memory footprint of the legacy export: JSON text + upload files, before copies"""
+    text_bytes = 0
+    for queryset, fields in zip(export_querysets(filters or {}), (
+            ['key_words', 'title', 'description', 'root_cause', 'solutions', 'others'], ['title', 'content'])):
+        sums = queryset.aggregate(**{f: Sum(Length(f)) for f in fields})
+        text_bytes += sum(value or 0 for value in sums.values())
+    return text_bytes + sum(directory_size(path) for path, _ in upload_dirs(filters))
+
+
+def upload_files(path, arcname):
+    """(path, arcname) of every directory and file under path, parents first, in a stable order"""
+    yield path, arcname
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        rel = os.path.relpath(root, path)
+        base = arcname if rel == '.' else f'{arcname}/{rel}'
+        for name in dirs + sorted(files):
+            yield Path(root) / name, f'{base}/{name}'
+
+
+def write_ndjson(queryset, fields, fileobj):
+    """One compact JSON object per line, rows fetched in ARCHIVE_ITERATOR_CHUNK_SIZE batches; returns the row count"""
+    count = 0
+    for row in queryset.values(*fields).iterator(chunk_size=settings.ARCHIVE_ITERATOR_CHUNK_SIZE):
+        fileobj.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode())
+        fileobj.write(b'\n')
+        count += 1
+    return count
+
+
+def export_documents(stack, filters):
+    """
+    [(name, fileobj, size)] of the JSON members. Format 2 spools NDJSON to temporary files (closed with
+    the ExitStack) and adds manifest.json; format 1 is the original indent=2 JSON arrays, built in memory.
+    """
+    problems, records = export_querysets(filters or {})
+    documents = []
+    if settings.ARCHIVE_FORMAT_VERSION >= 2:
+        manifest = {'format_version': 2}
+        for name, queryset, fields in (('items', problems, PROBLEM_EXPORT_FIELDS),
+                                       ('cv_base_records', records, CVBASE_EXPORT_FIELDS)):
+            spool = stack.enter_context(tempfile.TemporaryFile(dir=settings.ARCHIVE_SPOOL_DIR))
+            manifest[name] = write_ndjson(queryset, fields, spool)
+            documents.append((f'{name}.ndjson', spool, spool.tell()))
+            spool.seek(0)
+        manifest_data = json.dumps(manifest).encode()
+        return [('manifest.json', io.BytesIO(manifest_data), len(manifest_data))] + documents
+
+    for name, queryset, fields in (('items.json', problems, PROBLEM_EXPORT_FIELDS),
+                                   ('cv_base_records.json', records, CVBASE_EXPORT_FIELDS)):
+        json_data = json.dumps(list(queryset.values(*fields)), cls=DjangoJSONEncoder, ensure_ascii=False,
+                               indent=2).encode()
+        documents.append((name, io.BytesIO(json_data), len(json_data)))
+    return documents
+
+
+def write_export_tar(fileobj, progress=None, filters=None):
+    """tar.gz: manifest + items + cv_base_records documents + uploads/; progress is an optional ExportProgress"""
+    with ExitStack() as stack:
+        documents = export_documents(stack, filters)
+        entries = [entry for path, arcname in upload_dirs(filters) for entry in upload_files(path, arcname)]
+        if progress:
+            files = [path for path, _ in entries if path.is_file()]
+            progress.start(
+                files=len(documents) + len(files),
+                size=sum(size for _, _, size in documents) + sum(f.stat().st_size for f in files),
+            )
+
+        with tarfile.open(fileobj=fileobj, mode='w:gz') as tar:
+            for name, document, size in documents:
+                tarinfo = tarfile.TarInfo(name=name)
+                tarinfo.size = size
+                tar.addfile(tarinfo, document)
+                if progress:
+                    progress.advance(size)
+            for path, arcname in entries:
+                tar.add(path, arcname=arcname, recursive=False)
+                if progress and path.is_file():
+                    progress.advance(path.stat().st_size)
+    if progress:
+        progress.save()
+
+
+def archive_records(directory, name, required=False):
+    """
+    Records of an extracted archive member: <name>.ndjson (format 2) is parsed line by line,
+    <name>.json (format 1) as a whole. A missing member yields nothing unless required.
+    """
+    ndjson_path = os.path.join(directory, f'{name}.ndjson')
+    json_path = os.path.join(directory, f'{name}.json')
+    if os.path.exists(ndjson_path):
+        with open(ndjson_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif os.path.exists(json_path):
+        with open(json_path, encoding='utf-8') as f:
+            yield from json.load(f)
+    elif required:
+        raise FileNotFoundError(f'{name}.ndjson / {name}.json not found in the archive')
+
+
+def encrypt_stream(key, src, dst):
+    """Chunked ChaCha20Poly1305 of the file object src into dst; returns the bytes written"""
+    cipher = ChaCha20Poly1305(key)
+    header = CHUNKED_MAGIC + os.urandom(CHUNK_PREFIX_SIZE)
+    dst.write(header)
+    written = len(header)
+    index = 0
+    chunk = src.read(CHUNK_SIZE)
+    while True:
+        next_chunk = src.read(CHUNK_SIZE)
+        last = not next_chunk
+        nonce = header[len(CHUNKED_MAGIC):] + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+        encrypted = cipher.encrypt(nonce, chunk, header)
+        dst.write(encrypted)
+        written += len(encrypted)
+        if last:
+            return written
+        chunk = next_chunk
+        index += 1
+
+
+def decrypt_stream(key, src, dst):
+    """Inverse of encrypt_stream; raises InvalidTag on a wrong password or a damaged/truncated file"""
+    cipher = ChaCha20Poly1305(key)
+    header = src.read(len(CHUNKED_MAGIC) + CHUNK_PREFIX_SIZE)
+    index = 0
+    block = src.read(CHUNK_SIZE + TAG_SIZE)
+    while True:
+        next_block = src.read(CHUNK_SIZE + TAG_SIZE)
+        last = not next_block
+        nonce = header[len(CHUNKED_MAGIC):] + index.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+        dst.write(cipher.decrypt(nonce, block, header))
+        if last:
+            return
+        block = next_block
+        index += 1
+
+
+def build_export(key, filters=None):
+    """
+    Encrypted export archive. Small sites use the legacy in-memory format (returns bytes); when the estimated
+    footprint exceeds ARCHIVE_MEMORY_LIMIT_MB the tar.gz is spooled to disk and encrypted in chunks
+    (returns an open temporary file positioned at 0).
+    Returns (archive, size, info) where info holds the mode and peak memory.
+    """
+    estimate = estimate_export_bytes(filters)
+    # 旧格式内存中同时存在：JSON 文本、tar.gz 缓冲、其 getvalue() 副本、密文
+    spooled = estimate * settings.ARCHIVE_INMEMORY_FACTOR > memory_limit_bytes()
+    started = time.perf_counter()
+    with MemoryMonitor() as monitor:
+        if spooled:
+            with tempfile.TemporaryFile(dir=settings.ARCHIVE_SPOOL_DIR) as tar_file:
+                write_export_tar(tar_file, filters=filters)
+                tar_file.seek(0)
+                archive = tempfile.TemporaryFile(dir=settings.ARCHIVE_SPOOL_DIR)
+                size = encrypt_stream(key, tar_file, archive)
+                archive.seek(0)
+        else:
+            export_buffer = io.BytesIO()
+            write_export_tar(export_buffer, filters=filters)
+            nonce = os.urandom(12)
+            archive = nonce + ChaCha20Poly1305(key).encrypt(nonce, export_buffer.getvalue(), associated_data=None)
+            size = len(archive)
+    info = {
+        'mode': 'spooled' if spooled else 'memory',
+        'filters': filters or {},
+        'estimate_mb': round(estimate / 1024 / 1024, 1),
+        'bytes': size,
+        'seconds': round(time.perf_counter() - started, 2),
+        **monitor.as_dict(),
+    }
+    logger.info(json.dumps({'operation': 'export', **info}))
+    return archive, size, info
+
+
+def chunked_layout_valid(size):
+    """Whether size fits encrypt_stream's output: header + full blocks + a last block holding at least the tag"""
+    body = size - len(CHUNKED_MAGIC) - CHUNK_PREFIX_SIZE
+    if body < TAG_SIZE:
+        return False
+    last = body % (CHUNK_SIZE + TAG_SIZE)
+    return last == 0 or last >= TAG_SIZE
+
+
+def decrypt_upload(key, uploaded_file, dst):
+    """
+    Decrypt an uploaded archive into the file object dst. Chunked archives stream through in CHUNK_SIZE
+    pieces; legacy archives can only be decrypted whole, so they are read into memory (warned about when
+    larger than ARCHIVE_MEMORY_LIMIT_MB). Returns the mode used.
+    A chunked archive that fails authentication (wrong password, damaged file) raises InvalidTag: it is never
+    retried as a legacy archive, which would read the whole upload into memory.
+    """
+    uploaded_file.seek(0)
+    head = uploaded_file.read(len(CHUNKED_MAGIC))
+    uploaded_file.seek(0)
+    # 旧格式的随机 nonce 恰好以 MAGIC 开头（约 2^-32）且长度不符合分块布局时按旧格式解密；
+    # 布局也吻合的极小概率情况按分块格式处理，解密失败即报错
+    if head == CHUNKED_MAGIC and chunked_layout_valid(uploaded_file.size):
+        decrypt_stream(key, uploaded_file, dst)
+        return 'spooled'
+
+    if uploaded_file.size > memory_limit_bytes():
+        logger.warning(json.dumps({
+            'operation': 'import', 'warning': 'legacy archive is decrypted in memory',
+            'bytes': uploaded_file.size, 'limit_mb': settings.ARCHIVE_MEMORY_LIMIT_MB,
+        }))
+    blob = uploaded_file.read()
+    if len(blob) < 12:
+        raise ValueError('file is too short')
+    nonce, ct = blob[:12], blob[12:]
+    dst.write(ChaCha20Poly1305(key).decrypt(nonce, ct, associated_data=None))
+    return 'memory'
+
+
+class ExportProgress:
+    """Files/bytes counters of a running ExportJob, written to the database at most every EXPORT_JOB_PROGRESS_INTERVAL"""
+
+    def __init__(self, job):
+        self.job = job
+        self.saved_at = 0.0
+
+    def start(self, files, size):
+        self.job.files_total = files
+        self.job.bytes_total = size
+        self.save()
+
+    def advance(self, size):
+        self.job.files_done += 1
+        self.job.bytes_done += size
+        if time.monotonic() - self.saved_at >= settings.EXPORT_JOB_PROGRESS_INTERVAL:
+            self.save()
+
+    def save(self):
+        self.saved_at = time.monotonic()
+        ExportJob.objects.filter(pk=self.job.pk).update(
+            files_total=self.job.files_total, files_done=self.job.files_done,
+            bytes_total=self.job.bytes_total, bytes_done=self.job.bytes_done, updated_at=timezone.now(),
+        )
+
+
+def job_expiry():
+    return timezone.now() + timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+
+
+def cleanup_expired_exports():
+    """Delete expired jobs with their archives, and archives no job refers to; returns the number of files removed"""
+    removed = 0
+    for job in ExportJob.objects.filter(expires_at__lt=timezone.now()):
+        if job.file_path.exists():
+            job.file_path.unlink()
+            removed += 1
+        job.delete()
+
+    export_dir = Path(settings.EXPORT_JOB_DIR)
+    if export_dir.exists():
+        known = {str(job_id) for job_id in ExportJob.objects.values_list('id', flat=True)}
+        for path in export_dir.iterdir():
+            # 只处理任务文件（<uuid>.bin，写入中为 <uuid>.part，属于仍在运行的任务）：
+            # 子目录、符号链接和其它文件一律不动，EXPORT_JOB_DIR 指向共享目录时也不会误删
+            match = EXPORT_JOB_FILE_PATTERN.match(path.name)
+            if not match or match.group(1) in known or path.is_symlink() or not path.is_file():
+                continue
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+def run_export_job(job_id, key):
+    """Thread body: spool the tar.gz, encrypt it in chunks into EXPORT_JOB_DIR/<id>.bin (via a .part file)"""
+    job = ExportJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.save(update_fields=['status'])
+    part_path = job.file_path.with_suffix('.part')
+    started = time.perf_counter()
+    try:
+        with MemoryMonitor() as monitor:
+            with tempfile.TemporaryFile(dir=settings.ARCHIVE_SPOOL_DIR) as tar_file:
+                write_export_tar(tar_file, ExportProgress(job), json.loads(job.filters or '{}'))
+                tar_file.seek(0)
+                ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now())
+                with open(part_path, 'wb') as archive:
+                    size = encrypt_stream(key, tar_file, archive)
+        os.replace(part_path, job.file_path)
+
+        job.status = 'done'
+        job.archive_size = size
+        job.peak_rss = monitor.peak_rss
+        job.finished_at = timezone.now()
+        job.expires_at = job_expiry()
+        job.save()
+        ARCHIVE_DURATION.observe(time.perf_counter() - started, operation='export')
+        ARCHIVE_BYTES.inc(size, operation='export')
+        ARCHIVE_PEAK_RSS.set(monitor.peak_rss, operation='export', mode='job')
+        logger.info(json.dumps({
+            'operation': 'export', 'mode': 'job', 'job': str(job.pk), 'bytes': size, 'files': job.files_done,
+            'seconds': round(time.perf_counter() - started, 2), **monitor.as_dict(),
+        }))
+    except Exception as e:
+        logger.exception(f'export job {job.pk} failed')
+        part_path.unlink(missing_ok=True)
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='failed', error=f'{type(e).__name__}: {e}', finished_at=timezone.now(), expires_at=job_expiry(),
+        )
+    finally:
+        # 线程自己的数据库连接不会被请求周期关闭
+        connection.close()
+
+
+class ExportJobBusy(Exception):
+    """Another export job is pending/running for a different user, filter set or password"""
+
+    def __init__(self, job):
+        super().__init__(f'export job {job.pk} is already {job.status}')
+        self.job = job
+
+
+def export_key_digest(key):
+    return hashlib.blake2b(key, digest_size=16, person=b'lore-export-job').hexdigest()
+
+
+def start_export_job(user, key, filters=None):
+    """
+    Create an ExportJob and run it in a daemon thread of this process. Returns (job, created).
+    One job runs at a time: a repeated request (same user, filters and password) gets the active job back,
+    anything else raises ExportJobBusy instead of handing out someone else's archive.
+    """
+    cleanup_expired_exports()
+    filters = json.loads(json.dumps(filters or {}, cls=DjangoJSONEncoder))
+    key_digest = export_key_digest(key)
+    # 检查与创建在同一事务内（SQLite 生产配置档为 BEGIN IMMEDIATE，否则并发的一方以 database is locked 失败），不会各建一个任务
+    with transaction.atomic():
+        ExportJob.objects.filter(
+            status__in=['pending', 'running'],
+            updated_at__lt=timezone.now() - timedelta(minutes=settings.EXPORT_JOB_STALE_MINUTES),
+        ).update(status='failed', error='worker exited before the export finished', finished_at=timezone.now())
+        active = ExportJob.objects.filter(status__in=['pending', 'running']).first()
+        if active:
+            if (active.created_by_id == user.pk and active.key_digest == key_digest
+                    and json.loads(active.filters or '{}') == filters):
+                return active, False
+            raise ExportJobBusy(active)
+        os.makedirs(settings.EXPORT_JOB_DIR, exist_ok=True)
+        job = ExportJob.objects.create(
+            created_by=user, filters=json.dumps(filters), key_digest=key_digest, expires_at=job_expiry(),
+        )
+        # 提交后再启动线程：线程使用另一条数据库连接，需要能读到这一行
+        transaction.on_commit(
+            lambda: threading.Thread(target=run_export_job, args=(job.pk, key), daemon=True).start()
+        )
+    return job, True
+
+
+def job_status(job):
+    return {
+        'id': str(job.pk),
+        'status': job.status,
+        'files_total': job.files_total,
+        'files_done': job.files_done,
+        'bytes_total': job.bytes_total,
+        'bytes_done': job.bytes_done,
+        'archive_size': job.archive_size,
+        'filters': json.loads(job.filters or '{}'),
+        'peak_rss_mb': round(job.peak_rss / 1024 / 1024, 1) if job.peak_rss else None,
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'expires_at': job.expires_at,
+    }
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range 'bytes=' header, None to serve the whole file
+    (no header, multiple ranges, other units), or 'unsatisfiable'.
+    """
+    units, _, spec = header.partition('=')
+    if units.strip() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            # bytes=-N：最后 N 个字节
+            length = int(last)
+            if length <= 0:
+                return 'unsatisfiable'
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return 'unsatisfiable'
+    return start, min(end, size - 1)
+
+
+def read_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+def ranged_file_response(request, path, filename, etag):
+    """FileResponse with Accept-Ranges; a single Range (honouring If-Range) is answered with 206"""
+    size = path.stat().st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1), status=206, content_type='application/octet-stream',
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        response = FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
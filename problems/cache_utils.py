@@ -0,0 +1,169 @@
+import hashlib
+import time
+from calendar import timegm
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+PROBLEM_CONTENT_VERSION_KEY = 'problem_content_version'
+
+
+def problem_content_version():
+    """Global version of Problem content; bumped on any Problem change"""
+    version = cache.get(PROBLEM_CONTENT_VERSION_KEY)
+    if version is None:
+        # 版本号被淘汰/清空后不能从 1 重新开始：旧的 1、2… 条目可能仍在缓存中
+        cache.add(PROBLEM_CONTENT_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(PROBLEM_CONTENT_VERSION_KEY)
+    return version
+
+
+def bump_problem_content_version():
+    """Invalidate every cache keyed by the content version"""
+    try:
+        cache.incr(PROBLEM_CONTENT_VERSION_KEY)
+    except ValueError:
+        cache.set(PROBLEM_CONTENT_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def problem_list_cache_key(page, query, mode=''):
+    """Cache key for an anonymous problem_list page; mode separates e.g. fuzzy search results"""
+    query_hash = hashlib.md5(query.encode()).hexdigest()
+    return f'problem_list:anon:{problem_content_version()}:{page}:{mode}:{query_hash}'
+
+
+def problem_count_cache_key(scope, query, mode=''):
+    """Cache key for a problem_list result count; scope is the visibility ('anon' or 'u<id>')"""
+    # 只去掉首尾空白：大小写、中间空白在 LIKE 回退路径下会影响匹配结果
+    query_hash = hashlib.md5(query.strip().encode()).hexdigest()
+    return f'problem_count:{problem_content_version()}:{scope}:{mode}:{query_hash}'
+
+
+class ApproximatePage(Page):
+    """Page past a capped count: whether a next page exists comes from the rows fetched, not from num_pages"""
+
+    def __init__(self, object_list, number, paginator, has_more):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_more
+
+    def has_next(self):
+        return self.has_more
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator whose COUNT(*) is cached under cache_key (invalidated with the problem content version).
+    Counting stops at settings.PROBLEM_COUNT_EXACT_LIMIT rows: larger result sets report that
+    limit with count_is_approximate = True. Pages past the limit stay reachable; a page number is only
+    out of range once that page has no rows.
+    """
+
+    def __init__(self, object_list, per_page, cache_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+
+    @cached_property
+    def counted(self):
+        """Matched rows, up to PROBLEM_COUNT_EXACT_LIMIT + 1"""
+        value = cache.get(self.cache_key)
+        if value is None:
+            # 写入共享缓存的计数从主库读：副本落后时会把旧计数存到刚递增的版本号下
+            object_list = self.object_list
+            if hasattr(object_list, 'using'):
+                object_list = object_list.using('default')
+            # COUNT(*) over a LIMIT subquery: stops scanning once limit + 1 rows matched
+            value = object_list[:settings.PROBLEM_COUNT_EXACT_LIMIT + 1].count()
+            cache.set(self.cache_key, value, settings.PROBLEM_COUNT_CACHE_TIMEOUT)
+        return value
+
+    @cached_property
+    def count(self):
+        return min(self.counted, settings.PROBLEM_COUNT_EXACT_LIMIT)
+
+    @property
+    def count_is_approximate(self):
+        return self.counted > settings.PROBLEM_COUNT_EXACT_LIMIT
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # 近似计数时 num_pages 只是下限：超出的页码交给 page() 按实际取到的行判断
+            if not self.count_is_approximate or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_approximate:
+            return super().page(number)
+        # 多取一行判断是否还有下一页，不再 COUNT
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return ApproximatePage(rows[:self.per_page], number, self, has_more=len(rows) > self.per_page)
+
+
+def view_detail_cache_key(token, update_time):
+    """Cache key for the anonymous render of /view/<token>/ at this update_time and content version
+
+    The page also depends on things that do not touch update_time (owner renames, `rerender_markdown`);
+    those bump the content version, which orphans the old entry just like an edit does
+    """
+    return f'view_detail:{problem_content_version()}:{token}:{update_time.isoformat()}'
+
+
+def view_detail_etag(token, update_time, scope):
+    """ETag derived from update_time and the content version; scope separates anonymous and per-user renders"""
+    raw = f'{token}:{update_time.isoformat()}:{problem_content_version()}:{scope}'
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def http_timestamp(dt):
+    """Seconds since epoch for Last-Modified; naive datetimes are in settings.TIME_ZONE"""
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return timegm(dt.utctimetuple())
+
+
+def invalidate_problem(problem):
+    """Drop every cached response that depends on this problem (view_detail entries also carry update_time)"""
+    bump_problem_content_version()
+
+
+def cv_calendar_stamp_key(user_id):
+    return f'cv_calendar:stamp:{user_id}'
+
+
+def cv_calendar_stamp(user_id):
+    """'<latest update_time>:<count>' of the user's CvBase rows; cached until the user's CvBase changes"""
+    key = cv_calendar_stamp_key(user_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        from .models import CvBase
+        agg = CvBase.objects.using('default').filter(created_by_id=user_id).aggregate(latest=Max('update_time'), count=Count('id'))
+        latest = agg['latest'].isoformat() if agg['latest'] else '-'
+        stamp = f"{latest}:{agg['count']}"
+        cache.set(key, stamp, settings.CV_CALENDAR_CACHE_TIMEOUT)
+    return stamp
+
+
+def cv_calendar_range_cache_key(user_id, stamp, start, end):
+    """Cache key for one user's calendar range; a new stamp orphans the old entries"""
+    stamp_hash = hashlib.md5(stamp.encode()).hexdigest()
+    return f'cv_calendar:range:{user_id}:{stamp_hash}:{start.isoformat()}:{end.isoformat()}'
+
+
+def cv_calendar_etag(user_id, stamp, start, end):
+    raw = f'{user_id}:{stamp}:{start.isoformat()}:{end.isoformat()}'
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def invalidate_cv_calendar(user_id):
+    """Drop the user's calendar stamp; range entries keyed by the old stamp are never read again"""
+    cache.delete(cv_calendar_stamp_key(user_id))
@@ -0,0 +1,119 @@
+import time
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created hook: apply settings.SQLITE_PRAGMAS to every new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None) or {}
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+# ---------- 读写分离 ----------
+# 当前请求的路由状态：{'read': 只读副本别名或 None, 'wrote': 本请求是否写过}
+_request_db_state = ContextVar('request_db_state', default=None)
+
+# 只路由本应用的模型；session/auth 等始终走 default，避免副本延迟导致登录态丢失
+ROUTED_APP_LABELS = {'problems'}
+STICKY_SESSION_KEY = 'db_last_write'
+
+
+class ReadReplicaRouter:
+    """Send reads from the views in settings.READ_REPLICA_VIEWS to a replica; writes always go to default"""
+
+    def db_for_read(self, model, **hints):
+        state = _request_db_state.get()
+        if state and state['read'] and model._meta.app_label in ROUTED_APP_LABELS:
+            return state['read']
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本由复制（或本地的 replicate_sqlite）维护，不单独迁移
+        return db == 'default'
+
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def detect_write(execute, sql, params, many, context):
+    """
+    execute_wrapper on the default connection: flag any write statement. Unlike post_save/post_delete this
+    also sees QuerySet.update(), bulk_create and SET_NULL/CASCADE updates, which send no signals.
+    """
+    state = _request_db_state.get()
+    if state is not None and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        state['wrote'] = True
+        # 本请求后续的读也要看到刚写入的数据
+        state['read'] = None
+    return execute(sql, params, many, context)
+
+
+def read_from_primary():
+    """
+    Send the rest of this request's routed reads to default. Call before reads whose result fills a shared
+    cache: after an invalidation, a lagging replica would store the old rows under the fresh key.
+    """
+    state = _request_db_state.get()
+    if state is not None:
+        state['read'] = None
+
+
+class ReadReplicaMiddleware:
+    """Pick a read replica for read-only views, with read-your-writes stickiness per session"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'read': None, 'wrote': False}
+        token = _request_db_state.set(state)
+        try:
+            if settings.READ_REPLICAS:
+                with connections['default'].execute_wrapper(detect_write):
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        finally:
+            _request_db_state.reset(token)
+
+        # 写过数据：在 session 中记下时间，随后一段时间内的读都走主库
+        if state['wrote'] and hasattr(request, 'session') and request.user.is_authenticated:
+            request.session[STICKY_SESSION_KEY] = time.time()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = settings.READ_REPLICAS
+        match = request.resolver_match
+        if (
+            not replicas
+            or request.method not in ('GET', 'HEAD')
+            or match is None
+            or match.url_name not in settings.READ_REPLICA_VIEWS
+            or self.is_sticky(request)
+        ):
+            return None
+        _request_db_state.get()['read'] = random.choice(replicas)
+        return None
+
+    @staticmethod
+    def is_sticky(request):
+        # 没有 session cookie 就不可能刚写过，避免为匿名访问加载 session
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return False
+        last_write = request.session.get(STICKY_SESSION_KEY)
+        return bool(last_write) and time.time() - last_write < settings.READ_REPLICA_STICKY_SECONDS
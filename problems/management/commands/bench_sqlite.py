@@ -0,0 +1,150 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test.utils import override_settings
+
+BENCH_ALIAS = 'bench_sqlite'
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent read/write throughput of a scratch SQLite file through Django connections: '
+        'default journaling vs. the production pragmas, IMMEDIATE vs. deferred transactions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Reader threads')
+        parser.add_argument('--writers', type=int, default=4, help='Writer threads')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--rows', type=int, default=5000, help='Seed rows')
+
+    def handle(self, *args, **options):
+        # (配置档, 连接钩子应用的 PRAGMA, OPTIONS['transaction_mode'])；deferred 即 Django 内置后端的 BEGIN
+        profiles = [
+            ('default', {}, 'IMMEDIATE'),
+            ('default/deferred', {}, None),
+            ('production', settings.SQLITE_PRODUCTION_PRAGMAS, 'IMMEDIATE'),
+            ('production/deferred', settings.SQLITE_PRODUCTION_PRAGMAS, None),
+        ]
+        results = []
+        for label, pragmas, mode in profiles:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db_path = os.path.join(tmp_dir, 'bench.sqlite3')
+                results.append((label, self.run_profile(db_path, pragmas, mode, options)))
+
+        self.stdout.write(f"{options['readers']} readers / {options['writers']} writers, {options['duration']}s per profile")
+        self.stdout.write(f"{'profile':<22}{'reads/s':>12}{'writes/s':>12}{'locked':>10}{'p99 write ms':>15}")
+        for label, r in results:
+            self.stdout.write(
+                f"{label:<22}{r['reads'] / r['elapsed']:>12.0f}{r['writes'] / r['elapsed']:>12.0f}"
+                f"{r['locked']:>10}{r['write_p99'] * 1000:>15.1f}"
+            )
+
+    def register_database(self, db_path, mode):
+        """临时数据库别名：与 default 相同的引擎和参数，只换文件和事务模式；每个线程各自建立连接"""
+        options = {**connections.settings['default'].get('OPTIONS', {})}
+        options.pop('transaction_mode', None)
+        if mode:
+            options['transaction_mode'] = mode
+        connections.settings[BENCH_ALIAS] = {
+            **connections.settings['default'], 'NAME': db_path, 'OPTIONS': options, 'CONN_MAX_AGE': 0,
+        }
+
+    def unregister_database(self):
+        connections[BENCH_ALIAS].close()
+        del connections[BENCH_ALIAS]
+        del connections.settings[BENCH_ALIAS]
+
+    def run_profile(self, db_path, pragmas, mode, options):
+        self.register_database(db_path, mode)
+        # PRAGMA 由 connection_created 钩子（db_utils.apply_sqlite_pragmas）在每条新连接上执行，测的就是部署时的路径
+        with override_settings(SQLITE_PRAGMAS=pragmas):
+            try:
+                return self.run_threads(options)
+            finally:
+                self.unregister_database()
+
+    def run_threads(self, options):
+        body = 'lorem ipsum ' * 100
+        with transaction.atomic(using=BENCH_ALIAS), connections[BENCH_ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, owner INTEGER, title TEXT, body TEXT, update_time REAL)')
+            cursor.execute('CREATE INDEX item_owner_idx ON item (owner, update_time)')
+            cursor.executemany(
+                'INSERT INTO item (owner, title, body, update_time) VALUES (%s, %s, %s, %s)',
+                [(i % 50, f'title {i}', body, time.time()) for i in range(options['rows'])],
+            )
+        connections[BENCH_ALIAS].close()
+
+        stop = threading.Event()
+        counters = {'reads': 0, 'writes': 0, 'locked': 0}
+        write_latencies = []
+        lock = threading.Lock()
+
+        def reader(seed):
+            connection = connections[BENCH_ALIAS]
+            n = 0
+            owner = seed
+            while not stop.is_set():
+                owner = (owner + 7) % 50
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            'SELECT id, title, update_time FROM item WHERE owner = %s ORDER BY update_time DESC LIMIT 20',
+                            [owner],
+                        )
+                        cursor.fetchall()
+                    n += 1
+                except OperationalError:
+                    with lock:
+                        counters['locked'] += 1
+            connection.close()
+            with lock:
+                counters['reads'] += n
+
+        def writer(seed):
+            connection = connections[BENCH_ALIAS]
+            n = 0
+            latencies = []
+            i = seed
+            while not stop.is_set():
+                i += 1
+                row_id = i % options['rows'] + 1
+                start = time.perf_counter()
+                try:
+                    # 一次编辑（与 problem_edit 相同的形状）：atomic 内先读当前行，再更新并追加一条记录
+                    with transaction.atomic(using=BENCH_ALIAS), connection.cursor() as cursor:
+                        cursor.execute('SELECT body FROM item WHERE id = %s', [row_id])
+                        cursor.fetchone()
+                        cursor.execute('UPDATE item SET title = %s, update_time = %s WHERE id = %s',
+                                       [f'edit {i}', time.time(), row_id])
+                        cursor.execute('INSERT INTO item (owner, title, body, update_time) VALUES (%s, %s, %s, %s)',
+                                       [i % 50, f'new {i}', body, time.time()])
+                    n += 1
+                    latencies.append(time.perf_counter() - start)
+                except OperationalError:
+                    with lock:
+                        counters['locked'] += 1
+            connection.close()
+            with lock:
+                counters['writes'] += n
+                write_latencies.extend(latencies)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        threads += [threading.Thread(target=writer, args=(i * 100000,)) for i in range(options['writers'])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        write_latencies.sort()
+        p99 = write_latencies[int(len(write_latencies) * 0.99)] if write_latencies else 0.0
+        return {**counters, 'elapsed': elapsed, 'write_p99': p99}
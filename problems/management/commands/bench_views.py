@@ -0,0 +1,219 @@
+import json
+import logging
+import math
+import platform
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from problems.models import Problem, CvBase, SiteConfig
+from problems.sensitive_utils import SensitiveDataProcessor
+
+ARCHIVE_SCENARIOS = {'export_json', 'import_json'}
+ARCHIVE_PASSWORD = 'bench-password'
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = ('Time the main views and SensitiveDataProcessor on the current database (see generate_corpus) '
+            'and write p50/p95/p99 latency, query counts and peak memory to a JSON report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed runs per scenario')
+        parser.add_argument('--archive-iterations', type=int, default=3, help='Timed runs for export/import')
+        parser.add_argument('--output', default='bench-report.json', help='JSON report path')
+        parser.add_argument('--compare', help='Earlier JSON report to compare against')
+        parser.add_argument('--only', action='append', default=[], help='Run only these scenarios')
+        parser.add_argument('--skip', action='append', default=[], help='Skip these scenarios')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every run')
+
+    def handle(self, *args, **options):
+        admin = User.objects.filter(is_superuser=True).order_by('pk').first()
+        user = (
+            User.objects.filter(is_superuser=False, problem__isnull=False).order_by('pk').first()
+            or admin
+        )
+        if admin is None or not Problem.objects.exists():
+            raise CommandError('No corpus found: run `manage.py generate_corpus` on a scratch database first')
+
+        scenarios = self.scenarios(user, admin)
+        unknown = set(options['only'] + options['skip']) - {name for name, *_ in scenarios}
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}')
+        scenarios = [
+            s for s in scenarios
+            if (not options['only'] or s[0] in options['only']) and s[0] not in options['skip']
+        ]
+
+        # 每个请求一行的计时日志会淹没输出
+        logging.getLogger('problems.timing').setLevel(logging.ERROR)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, run_as, run in scenarios:
+                client = Client()
+                if run_as is not None:
+                    client.force_login(run_as)
+                iterations = options['archive_iterations'] if name in ARCHIVE_SCENARIOS else options['iterations']
+                results[name] = self.measure(run, client, iterations, options['cold'])
+                r = results[name]
+                self.stdout.write(
+                    f"{name:<28} p50 {r['p50_ms']:>9.1f} ms  p95 {r['p95_ms']:>9.1f} ms  p99 {r['p99_ms']:>9.1f} ms"
+                    f"  {r['queries']:>5} queries  peak {r['peak_kb']:>9.0f} KiB"
+                )
+
+        report = {'meta': self.meta(options), 'results': results}
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    def measure(self, run, client, iterations, cold):
+        timings = []
+        queries = []
+        status = None
+        counter = {'queries': 0}
+
+        def count_query(execute, sql, params, many, context):
+            counter['queries'] += 1
+            return execute(sql, params, many, context)
+
+        for _ in range(iterations):
+            if cold:
+                cache.clear()
+            # execute_wrapper 计数：不受 queries_log 9000 条上限影响，也不保存 SQL
+            counter['queries'] = 0
+            with connection.execute_wrapper(count_query):
+                start = time.perf_counter()
+                status = run(client)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(counter['queries'])
+
+        # 峰值内存单独跑一次：tracemalloc 本身会拖慢计时
+        if cold:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            run(client)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def scenarios(self, user, admin):
+        """(name, user, run(client) -> status code)"""
+        per_page = SiteConfig.get_config().items_per_page
+        public_tokens = list(
+            Problem.objects.filter(is_public=True).order_by('?').values_list('public_token', flat=True)[:50]
+        )
+        latest = CvBase.objects.filter(created_by=user).order_by('-record_date').first()
+        calendar_month = latest.record_date if latest else datetime.now().date()
+        deep_page = max(1, min(Problem.objects.count(), 10000) // per_page // 2)
+        sample_texts = list(Problem.objects.values_list('description', flat=True)[:100])
+        state = {'token': 0, 'archive': None}
+
+        def get(url):
+            return lambda client: client.get(url).status_code
+
+        def view_detail(client):
+            # 轮流访问不同条目，避免只测到同一条的缓存
+            token = public_tokens[state['token'] % len(public_tokens)]
+            state['token'] += 1
+            return client.get(f'/view/{token}/').status_code
+
+        def export_archive(client):
+            response = client.post(
+                '/export/', json.dumps({'password': ARCHIVE_PASSWORD, 'sync': True}), content_type='application/json'
+            )
+            state['archive'] = response.content
+            return response.status_code
+
+        def import_archive(client):
+            if state['archive'] is None:
+                export_archive(client)
+            # 导入写入的行回滚，文件写到临时目录，语料保持不变
+            with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+                with transaction.atomic():
+                    response = client.post('/import/', {
+                        'password': ARCHIVE_PASSWORD,
+                        'file': SimpleUploadedFile('bench.bin', state['archive']),
+                    })
+                    transaction.set_rollback(True)
+            return response.status_code
+
+        def desensitize(client):
+            for text in sample_texts:
+                SensitiveDataProcessor.desensitize_text(text)
+            return None
+
+        return [
+            ('problem_list', user, get('/')),
+            ('problem_list_search', user, get('/?q=timeout')),
+            ('problem_list_search_fuzzy', user, get('/?q=timout&mode=fuzzy')),
+            ('problem_list_deep_page', user, get(f'/?page={deep_page}')),
+            ('problem_list_anonymous', None, get('/')),
+            ('view_detail', user, view_detail),
+            ('cv_base_list', user, get('/cv-base/')),
+            ('cv_base_calendar_days', user, get(
+                f'/cv-base/calendar-days/?year={calendar_month.year}&month={calendar_month.month}'
+            )),
+            ('export_json', admin, export_archive),
+            ('import_json', admin, import_archive),
+            ('resource_management', admin, get('/staff/resource-management/')),
+            ('sensitive_desensitize_100', user, desensitize),
+        ]
+
+    def meta(self, options):
+        return {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'problems': Problem.objects.count(),
+            'cv_records': CvBase.objects.count(),
+            'cold_cache': options['cold'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+        }
+
+    def compare(self, baseline, report):
+        self.stdout.write(
+            f"\nvs {baseline['meta'].get('date')} ({baseline['meta'].get('problems')} problems)"
+        )
+        self.stdout.write(f"{'scenario':<28}{'p50 before':>12}{'p50 after':>12}{'change':>9}{'queries':>12}")
+        for name, after in report['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                continue
+            change = (after['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0.0
+            line = (f"{name:<28}{before['p50_ms']:>12.1f}{after['p50_ms']:>12.1f}{change:>+8.0f}%"
+                    f"{before['queries']:>6} ->{after['queries']:>4}")
+            style = self.style.ERROR if change > 20 or after['queries'] > before['queries'] else str
+            self.stdout.write(style(line))
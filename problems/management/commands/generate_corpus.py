@@ -0,0 +1,196 @@
+import html
+import json
+import os
+import random
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from problems.models import Problem, CvBase, SensitiveWord
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+COMPONENTS = [
+    'kafka', 'postgres', 'redis', 'nginx', 'kubernetes', 'docker', 'django', 'celery', 'elasticsearch',
+    'grpc', 'sqlite', 'jenkins', 'terraform', 'prometheus', 'rabbitmq', 'mysql', 'gunicorn', 'oauth',
+]
+SYMPTOMS = [
+    'timeout', 'memory leak', 'deadlock', 'connection refused', 'high latency', 'disk full', 'crash loop',
+    'rebalance storm', 'stale cache', 'slow query', 'certificate expired', 'permission denied', 'OOM killed',
+]
+CAUSES = [
+    'connection pool exhausted', 'missing index on the join column', 'retry storm after a deploy',
+    'misconfigured health check', 'unbounded queue growth', 'clock skew between nodes',
+    'log volume filled the disk', 'a long running transaction held the lock', 'DNS cache pointed at an old host',
+]
+CJK_PHRASES = ['连接池耗尽', '慢查询', '内存泄漏', '配置错误', '磁盘空间不足', '证书过期', '重试风暴', '索引缺失']
+WORDS = (
+    'the service request worker queue node cluster config deploy rollback metric alert log trace '
+    'retry backoff limit buffer thread process socket client server upstream downstream replica'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic Problem/CvBase corpus (markdown bodies, attachments, upload_images) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', default='1k', help=f'Rows per model: {", ".join(SIZES)} or a number')
+        parser.add_argument('--users', type=int, default=20, help='Owners the rows are spread over')
+        parser.add_argument('--attachment-ratio', type=float, default=0.2, help='Share of rows with attachments')
+        parser.add_argument('--image-ratio', type=float, default=0.3, help='Share of rows embedding an upload_image')
+        parser.add_argument('--orphan-images', type=int, default=50, help='Unreferenced files in upload_images/')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--append', action='store_true', help='Allow a database that already has problems')
+
+    def handle(self, *args, **options):
+        size = options['size']
+        count = SIZES.get(size) or (int(size) if size.isdigit() else None)
+        if not count:
+            raise CommandError(f'--size must be one of {", ".join(SIZES)} or a number')
+        if Problem.objects.exists() and not options['append']:
+            raise CommandError(
+                'The database already has problems; point LORE_KEEPER_DB at a scratch file or pass --append'
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.media_root = str(settings.MEDIA_ROOT)
+        self.image_ratio = options['image_ratio']
+        self.attachment_ratio = options['attachment_ratio']
+
+        users = self.create_users(options['users'])
+        self.create_sensitive_words()
+        batch_size = options['batch_size']
+        for start in range(0, count, batch_size):
+            n = min(batch_size, count - start)
+            with transaction.atomic():
+                self.create_problems(users, start, n)
+                self.create_cv_records(users, start, n)
+            self.stdout.write(f'  {start + n}/{count} rows per model')
+        self.create_orphan_images(options['orphan_images'])
+
+        # bulk_create 不触发 post_save：统一重建检索索引和 markdown 预渲染
+        call_command('rebuild_search_index', batch_size=batch_size, stdout=self.stdout)
+        call_command('rerender_markdown', batch_size=batch_size, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {count} problems and {count} CvBase records for {len(users)} users in {self.media_root}'
+        ))
+
+    def create_users(self, n):
+        admin, created = User.objects.get_or_create(
+            username='bench_admin', defaults={'is_superuser': True, 'is_staff': True},
+        )
+        if created:
+            admin.set_unusable_password()
+            admin.save()
+        users = [admin]
+        for i in range(n - 1):
+            user, created = User.objects.get_or_create(username=f'bench_user_{i}')
+            if created:
+                user.set_unusable_password()
+                user.save()
+            users.append(user)
+        return users
+
+    def create_sensitive_words(self):
+        for word in ['password', 'secret', 'internal.example.com', 'api_key', '身份证']:
+            SensitiveWord.objects.get_or_create(word=word, defaults={'replacement': '***'})
+
+    def sentence(self, words=12):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def markdown_body(self, component, symptom, image=None):
+        rng = self.rng
+        parts = [
+            f'## {symptom.capitalize()} in {component}',
+            self.sentence(20),
+            f'- {rng.choice(CAUSES)}\n- {rng.choice(CAUSES)}\n- {rng.choice(CJK_PHRASES)}',
+            f'```python\nfor attempt in range({rng.randint(2, 9)}):\n    if client.ping() < {rng.randint(50, 500)}:\n'
+            f'        break\n    time.sleep(2 ** attempt)\n```',
+            '| metric | before | after |\n|---|---|---|\n'
+            f'| p99 ms | {rng.randint(200, 5000)} | {rng.randint(10, 200)} |',
+            self.sentence(30),
+        ]
+        if image:
+            parts.append(f'![screenshot](/uploads/upload_images/{image})')
+        if rng.random() < 0.05:
+            parts.append('Contact ops@example.com, ticket 123-45-6789, password in the secret store.')
+        # 与表单保存一致：文本字段存转义后的 HTML
+        return html.escape('\n\n'.join(parts))
+
+    def write_file(self, relative_path, size):
+        path = os.path.join(self.media_root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+
+    def image_name(self, prefix, index):
+        if self.rng.random() >= self.image_ratio:
+            return None
+        name = f'{prefix}_{index}.png'
+        self.write_file(os.path.join('upload_images', name), self.rng.randint(2_000, 60_000))
+        return name
+
+    def create_problems(self, users, start, n):
+        rng = self.rng
+        rows = []
+        images = []
+        for i in range(start, start + n):
+            component, symptom = rng.choice(COMPONENTS), rng.choice(SYMPTOMS)
+            image = self.image_name('bench_problem', i)
+            images.append(image)
+            attach = rng.random() < self.attachment_ratio
+            rows.append(Problem(
+                key_words=html.escape(f'{component}, {symptom}, {rng.choice(CJK_PHRASES)}'),
+                title=html.escape(f'{component.capitalize()} {symptom} #{i}'),
+                description=self.markdown_body(component, symptom, image),
+                description_editor_type='markdown',
+                root_cause=html.escape(rng.choice(CAUSES)),
+                solutions=self.markdown_body(component, 'fix'),
+                solutions_editor_type='markdown',
+                others=html.escape(self.sentence()),
+                root_cause_file=Problem.FILE_DELIMITER.join(['trace.log', 'dump.txt']) if attach else None,
+                uploaded_images=json.dumps([image]) if image else None,
+                created_by=users[i % len(users)],
+                is_public=rng.random() < 0.7,
+            ))
+        created = Problem.objects.bulk_create(rows)
+        for problem in created:
+            if problem.root_cause_file:
+                for name in problem.get_root_cause_files():
+                    self.write_file(os.path.join(str(problem.pk), 'root_cause', name), rng.randint(500, 20_000))
+
+    def create_cv_records(self, users, start, n):
+        rng = self.rng
+        # record_date 全局唯一：从今天往前每行一天
+        today = date.today()
+        existing = set(CvBase.objects.filter(
+            record_date__range=(today - timedelta(days=start + n), today - timedelta(days=start))
+        ).values_list('record_date', flat=True))
+        rows = []
+        for i in range(start, start + n):
+            record_date = today - timedelta(days=i)
+            if record_date in existing:
+                continue
+            image = self.image_name('bench_cv', i)
+            attach = rng.random() < self.attachment_ratio
+            rows.append(CvBase(
+                record_date=record_date,
+                title=html.escape(f'{rng.choice(COMPONENTS)} work log {record_date.isoformat()}'),
+                content=self.markdown_body(rng.choice(COMPONENTS), rng.choice(SYMPTOMS), image),
+                content_editor_type='markdown',
+                content_file='notes.txt' if attach else None,
+                created_by=users[i % len(users)],
+            ))
+        created = CvBase.objects.bulk_create(rows)
+        for record in created:
+            for name in record.get_content_files():
+                self.write_file(os.path.join('cv_base', str(record.pk), 'content', name), rng.randint(500, 20_000))
+
+    def create_orphan_images(self, n):
+        for i in range(n):
+            self.write_file(os.path.join('upload_images', f'bench_orphan_{i}.png'), self.rng.randint(2_000, 60_000))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from problems.search_utils import SEARCH_INDEXES
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search indexes from the current rows (run after migrate or bulk imports)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows inserted per batch')
+
+    def handle(self, *args, **options):
+        for index in SEARCH_INDEXES:
+            with transaction.atomic():
+                count = index.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'{index.__name__}: indexed {count} rows into {index.TABLE}'))
@@ -0,0 +1,42 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Replication stand-in: copy the default SQLite database into a replica file (once, or every --interval seconds)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default', help='Source database alias')
+        parser.add_argument('--target', default='replica', help='Replica database alias')
+        parser.add_argument('--interval', type=float, default=0, help='Repeat every N seconds (0 = copy once)')
+
+    def handle(self, *args, **options):
+        source, target = options['source'], options['target']
+        for alias in (source, target):
+            if alias not in settings.DATABASES:
+                raise CommandError(f'Unknown database alias "{alias}" (set LORE_KEEPER_REPLICA_DB for a local replica)')
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'"{alias}" is not a SQLite database')
+
+        source_path = str(settings.DATABASES[source]['NAME'])
+        target_path = str(settings.DATABASES[target]['NAME'])
+
+        while True:
+            started = time.perf_counter()
+            src = sqlite3.connect(source_path)
+            dst = sqlite3.connect(target_path)
+            try:
+                # Online backup API: consistent snapshot even while the source is being written
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+            self.stdout.write(f'Replicated {source} -> {target} in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from problems.cache_utils import bump_problem_content_version
+from problems.markdown_utils import MarkdownRenderer, RENDERER_VERSION
+from problems.models import Problem, CvBase, RenderedMarkdown
+
+
+class Command(BaseCommand):
+    help = 'Re-render all markdown fields with the current renderer and prune stale cached HTML'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows rendered per batch')
+        parser.add_argument('--force', action='store_true', help='Re-render even if cached HTML exists')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['force']:
+            RenderedMarkdown.objects.all().delete()
+
+        live_hashes = set()
+        for model in (Problem, CvBase):
+            fields = MarkdownRenderer.MARKDOWN_FIELDS[model.__name__]
+            columns = ['pk'] + fields + [f'{f}_editor_type' for f in fields]
+            texts = []
+            for row in model.objects.values(*columns).iterator(chunk_size=batch_size):
+                texts.extend(row[f] for f in fields if row[f'{f}_editor_type'] == 'markdown' and row[f])
+                if len(texts) >= batch_size:
+                    MarkdownRenderer.get_html_map(texts, persist=True)
+                    live_hashes.update(MarkdownRenderer.content_hash(t) for t in texts)
+                    texts = []
+            if texts:
+                MarkdownRenderer.get_html_map(texts, persist=True)
+                live_hashes.update(MarkdownRenderer.content_hash(t) for t in texts)
+
+        # 删除旧版本渲染结果以及已不被任何记录引用的缓存
+        stale = RenderedMarkdown.objects.exclude(renderer_version=RENDERER_VERSION)
+        pruned, _ = stale.delete()
+        orphan_ids = [
+            pk for pk, content_hash in RenderedMarkdown.objects.values_list('pk', 'content_hash').iterator()
+            if content_hash not in live_hashes
+        ]
+        for start in range(0, len(orphan_ids), batch_size):
+            RenderedMarkdown.objects.filter(pk__in=orphan_ids[start:start + batch_size]).delete()
+        pruned += len(orphan_ids)
+        # 缓存的页面（/view/<token>/、匿名列表）里嵌着旧的 HTML，而 update_time 没变，靠版本号整体失效
+        bump_problem_content_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(live_hashes)} markdown fields (renderer v{RENDERER_VERSION}), pruned {pruned} stale entries'
+        ))
@@ -0,0 +1,234 @@
+import re
+import html
+import hashlib
+from html.parser import HTMLParser
+
+import markdown
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Token
+from pygments.util import ClassNotFound
+
+from .models import RenderedMarkdown
+
+# Bump when the rendering pipeline changes; run `manage.py rerender_markdown` afterwards
+RENDERER_VERSION = '1'
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'nl2br', 'sane_lists']
+
+COPY_BUTTON = '<button class="btn btn-sm btn-outline-secondary copy-btn">Copy</button>'
+
+# Pygments token type -> Prism token class, so the bundled prism theme styles server output
+PRISM_TOKEN_CLASSES = [
+    (Token.Comment, 'comment'),
+    (Token.Keyword, 'keyword'),
+    (Token.Name.Builtin, 'builtin'),
+    (Token.Name.Function, 'function'),
+    (Token.Name.Class, 'class-name'),
+    (Token.Name.Decorator, 'function'),
+    (Token.Name.Tag, 'tag'),
+    (Token.Name.Attribute, 'attr-name'),
+    (Token.Name.Variable, 'variable'),
+    (Token.Literal.String, 'string'),
+    (Token.Literal.Number, 'number'),
+    (Token.Operator, 'operator'),
+    (Token.Punctuation, 'punctuation'),
+]
+
+ALLOWED_TAGS = {
+    'a', 'b', 'blockquote', 'br', 'button', 'code', 'del', 'div', 'em', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 's', 'span', 'strong',
+    'sub', 'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+ALLOWED_ATTRS = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title', 'width', 'height'},
+    'th': {'align', 'style'},
+    'td': {'align', 'style'},
+}
+GLOBAL_ATTRS = {'class'}
+URL_ATTRS = {'href', 'src'}
+SAFE_URL_PATTERN = re.compile(r'^(https?:|mailto:|/|#|\.{0,2}/|[^:/?#]*(?:[/?#]|$))', re.IGNORECASE)
+SAFE_STYLE_PATTERN = re.compile(r'^\s*text-align:\s*(left|right|center)\s*;?\s*$', re.IGNORECASE)
+
+
+class _HtmlSanitizer(HTMLParser):
+    """Allowlist 过滤：丢弃未知标签/属性及 script/style 内容，只保留安全的 URL"""
+
+    DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'textarea'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.out = []
+        self.open_tags = []
+        self.drop_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.DROP_CONTENT_TAGS:
+            self.drop_depth += 1
+            return
+        if self.drop_depth or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRS.get(tag, set()) | GLOBAL_ATTRS
+        parts = [tag]
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRS and not SAFE_URL_PATTERN.match(html.unescape(value).strip()):
+                continue
+            if name == 'style' and not SAFE_STYLE_PATTERN.match(value):
+                continue
+            parts.append(f'{name}="{html.escape(value, quote=True)}"')
+        self.out.append(f'<{" ".join(parts)}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.open_tags and self.open_tags[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.DROP_CONTENT_TAGS:
+            self.drop_depth = max(0, self.drop_depth - 1)
+            return
+        if self.drop_depth or tag not in self.open_tags:
+            return
+        # 关闭中间未闭合的标签，保证输出结构完整
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.drop_depth:
+            self.out.append(html.escape(data, quote=False))
+
+    def handle_entityref(self, name):
+        if not self.drop_depth:
+            self.out.append(f'&{name};')
+
+    def handle_charref(self, name):
+        if not self.drop_depth:
+            self.out.append(f'&#{name};')
+
+    def get_html(self):
+        self.close()
+        self.out.extend(f'</{tag}>' for tag in reversed(self.open_tags))
+        self.open_tags = []
+        return ''.join(self.out)
+
+
+class MarkdownRenderer:
+    """服务端 Markdown 渲染 + 代码高亮，结果按内容哈希缓存在 RenderedMarkdown 表中"""
+
+    # model -> markdown 字段列表（字段的编辑器类型存放在 <field>_editor_type）
+    MARKDOWN_FIELDS = {
+        'Problem': ['description', 'root_cause', 'solutions', 'others'],
+        'CvBase': ['content'],
+    }
+
+    @classmethod
+    def content_hash(cls, text):
+        """渲染器版本 + 原文 的 sha256，渲染器变化时哈希随之变化"""
+        return hashlib.sha256(f'{RENDERER_VERSION}\0{text}'.encode()).hexdigest()
+
+    @classmethod
+    def highlight_code(cls, code, lang):
+        """用 Pygments 分词，输出 Prism 兼容的 <span class="token ..."> 结构"""
+        try:
+            lexer = get_lexer_by_name(lang) if lang else None
+        except ClassNotFound:
+            lexer = None
+        if lexer is None:
+            return html.escape(code, quote=False)
+
+        out = []
+        for token_type, value in lexer.get_tokens(code):
+            escaped = html.escape(value, quote=False)
+            css_class = next((name for ttype, name in PRISM_TOKEN_CLASSES if token_type in ttype), None)
+            out.append(f'<span class="token {css_class}">{escaped}</span>' if css_class else escaped)
+        return ''.join(out).rstrip('\n')
+
+    @classmethod
+    def render(cls, text):
+        """Markdown 原文 -> 经过过滤的 HTML（与前端 renderMarkdown 的输出结构保持一致）"""
+        if not text:
+            return ''
+        # 表单保存时做过 html.escape，渲染前还原（同前端 unescapeHtml）
+        source = html.unescape(text).replace('\0', '')
+        body = markdown.markdown(source, extensions=MARKDOWN_EXTENSIONS)
+
+        # 代码块：高亮 + 拷贝按钮；先替换成占位符，避免被行内代码规则再次处理
+        blocks = []
+
+        def _code_block(match):
+            lang = match.group(1) or ''
+            code = html.unescape(match.group(2))
+            lang_class = f' class="language-{lang}"' if lang else ''
+            blocks.append(f'<pre>{COPY_BUTTON}<code{lang_class}>{cls.highlight_code(code, lang)}</code></pre>')
+            return f'\0{len(blocks) - 1}\0'
+
+        body = re.sub(r'<pre><code(?: class="language-([\w+#.-]+)")?>([\s\S]*?)</code></pre>', _code_block, body)
+
+        # 行内代码：浅灰背景 + 拷贝按钮
+        body = re.sub(r'<code>(.*?)</code>', rf'<code class="inline-code">{COPY_BUTTON}\1</code>', body)
+
+        # 表格包一层可滚动 div（解决超宽）
+        body = body.replace('<table>', '<div class="table-responsive"><table class="table table-sm table-bordered">')
+        body = body.replace('</table>', '</table></div>')
+        body = body.replace('<thead>', '<thead class="table-light">')
+
+        body = re.sub(r'\0(\d+)\0', lambda m: blocks[int(m.group(1))], body)
+
+        sanitizer = _HtmlSanitizer()
+        sanitizer.feed(body)
+        return sanitizer.get_html()
+
+    @classmethod
+    def get_html_map(cls, texts, persist=False):
+        """批量取渲染结果：{原文: html}，一次查询；缺失的就地渲染
+
+        只有 persist=True（保存钩子、rerender_markdown）才把缺失的结果批量写入库：
+        列表/详情等读请求不写库，否则会抢 SQLite 写锁，并让读副本路由把会话粘到主库
+        """
+        hashes = {cls.content_hash(t): t for t in texts if t}
+        if not hashes:
+            return {}
+
+        rendered = dict(
+            RenderedMarkdown.objects.filter(content_hash__in=list(hashes)).values_list('content_hash', 'html')
+        )
+        missing = [
+            RenderedMarkdown(content_hash=h, renderer_version=RENDERER_VERSION, html=cls.render(t))
+            for h, t in hashes.items() if h not in rendered
+        ]
+        if missing:
+            if persist:
+                RenderedMarkdown.objects.bulk_create(missing, ignore_conflicts=True)
+            rendered.update((obj.content_hash, obj.html) for obj in missing)
+
+        return {t: rendered[h] for h, t in hashes.items()}
+
+    @classmethod
+    def markdown_texts(cls, instance):
+        """返回实例中编辑器类型为 markdown 的字段原文 {field: text}"""
+        fields = cls.MARKDOWN_FIELDS.get(type(instance).__name__, [])
+        return {
+            f: getattr(instance, f)
+            for f in fields
+            if getattr(instance, f'{f}_editor_type', None) == 'markdown' and getattr(instance, f)
+        }
+
+    @classmethod
+    def get_rendered_fields(cls, instance):
+        """单个实例的 {field: html}，非 markdown 字段不出现在结果中"""
+        texts = cls.markdown_texts(instance)
+        html_map = cls.get_html_map(texts.values())
+        return {f: html_map[t] for f, t in texts.items()}
+
+    @classmethod
+    def render_instance(cls, instance):
+        """保存时预渲染实例的 markdown 字段并入库"""
+        cls.get_html_map(cls.markdown_texts(instance).values(), persist=True)
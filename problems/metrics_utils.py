@@ -0,0 +1,301 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('problems.metrics')
+
+# 请求耗时默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 本进程的多进程快照文件名：pid + 启动时间，避免 pid 复用时覆盖已退出进程的计数
+PROCESS_ID = f'{os.getpid()}_{int(time.time() * 1000)}'
+SNAPSHOT_PATTERN = re.compile(r'^(\d+)_\d+\.json$')
+# 已退出进程的快照合并进这个文件后删除：目录里只剩存活进程 + 1 个汇总文件，计数器也不会因为删文件而回退
+EXITED_SNAPSHOT = 'exited.json'
+LOCK_FILE = '.lock'
+
+
+def process_alive(pid):
+    """本机上 pid 是否存在（signal 0 只做检查，不发信号）"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # {json 编码的标签值列表: 值}；json 字符串可直接写入多进程快照
+        self.values = {}
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def label_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name}: expected labels {self.labelnames}, got {tuple(labels)}')
+        return json.dumps([str(labels[name]) for name in self.labelnames], ensure_ascii=False)
+
+    def merge(self, values, other):
+        """Fold another process's snapshot of this metric into values"""
+        raise NotImplementedError
+
+    def samples(self, values):
+        """(suffix, label values, extra labels, value) for the text exposition"""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.label_key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values, other):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield '_total', json.loads(key), (), value
+
+
+class Gauge(Metric):
+    """Last value set in any process (multi-process snapshots keep the most recent one)"""
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.label_key(labels)
+        with self.registry.lock:
+            self.values[key] = [value, time.time()]
+
+    def merge(self, values, other):
+        for key, (value, stamp) in other.items():
+            if key not in values or stamp > values[key][1]:
+                values[key] = [value, stamp]
+
+    def samples(self, values):
+        for key, (value, _stamp) in sorted(values.items()):
+            yield '', json.loads(key), (), value
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self.label_key(labels)
+        with self.registry.lock:
+            # [各分桶计数（非累计）..., sum, count]
+            entry = self.values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def merge(self, values, other):
+        for key, entry in other.items():
+            if key in values:
+                values[key] = [a + b for a, b in zip(values[key], entry)]
+            else:
+                values[key] = list(entry)
+
+    def samples(self, values):
+        for key, entry in sorted(values.items()):
+            label_values = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield '_bucket', label_values, (('le', format_value(bound)),), cumulative
+            yield '_sum', label_values, (), entry[-2]
+            yield '_count', label_values, (), entry[-1]
+
+
+class MetricsRegistry:
+    """
+    In-process metrics registry with Prometheus text exposition.
+    With settings.METRICS_MULTIPROC_DIR each worker process writes a JSON snapshot of its values to
+    that directory (at most every METRICS_FLUSH_INTERVAL seconds, and on every scrape); render()
+    sums the snapshots of all processes, including ones that have exited, so counters never go back.
+    On POSIX, snapshots of exited processes are folded into one file at scrape time, so the directory
+    holds one file per live worker plus the exited total.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f'metric {metric.name} already registered')
+        self.metrics[metric.name] = metric
+
+    def snapshot(self):
+        with self.lock:
+            return {name: json.loads(json.dumps(metric.values)) for name, metric in self.metrics.items()}
+
+    @staticmethod
+    def multiproc_dir():
+        return getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+
+    def flush(self, force=False):
+        """Write this process's snapshot to the shared directory (no-op in single-process mode)"""
+        directory = self.multiproc_dir()
+        if not directory:
+            return
+        now = time.time()
+        if not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{PROCESS_ID}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        # 原子替换：读取方不会看到写了一半的文件
+        os.replace(tmp_path, path)
+
+    def read_snapshot(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning('Skipping metrics snapshot %s: %s', os.path.basename(path), e)
+            return None
+
+    def merge_into(self, merged, snapshot):
+        for name, values in snapshot.items():
+            if name in self.metrics:
+                self.metrics[name].merge(merged.setdefault(name, {}), values)
+
+    def compact(self, directory, file_names):
+        """
+        Fold the snapshots of exited processes into EXITED_SNAPSHOT and delete them; returns the remaining file names.
+        Must hold the directory lock. Liveness is checked by pid on this host, so the directory must not be shared
+        across machines or containers with separate pid namespaces.
+        """
+        exited = [
+            name for name in file_names
+            if (match := SNAPSHOT_PATTERN.match(name)) and name != f'{PROCESS_ID}.json'
+            and not process_alive(int(match.group(1)))
+        ]
+        if not exited:
+            return file_names
+        merged = {}
+        for name in [EXITED_SNAPSHOT] + exited:
+            path = os.path.join(directory, name)
+            if os.path.exists(path):
+                snapshot = self.read_snapshot(path)
+                if snapshot is not None:
+                    self.merge_into(merged, snapshot)
+        path = os.path.join(directory, EXITED_SNAPSHOT)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(merged, f)
+        os.replace(f'{path}.tmp', path)
+        for name in exited:
+            os.remove(os.path.join(directory, name))
+        logger.info('Folded %d metrics snapshot(s) of exited processes into %s', len(exited), EXITED_SNAPSHOT)
+        return [name for name in file_names if name not in exited and name != EXITED_SNAPSHOT] + [EXITED_SNAPSHOT]
+
+    def collect(self):
+        """{metric name: merged values} across all processes"""
+        directory = self.multiproc_dir()
+        if not directory:
+            return self.snapshot()
+        self.flush(force=True)
+        merged = {name: {} for name in self.metrics}
+        # 合并与读取在同一把文件锁下：并发抓取不会看到一半已合并、一半未删除的目录（计数会重复或回退）
+        with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+            if os.name == 'posix':
+                import fcntl
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            file_names = [
+                name for name in os.listdir(directory) if SNAPSHOT_PATTERN.match(name) or name == EXITED_SNAPSHOT
+            ]
+            if os.name == 'posix':
+                file_names = self.compact(directory, file_names)
+            for file_name in file_names:
+                snapshot = self.read_snapshot(os.path.join(directory, file_name))
+                if snapshot is not None:
+                    self.merge_into(merged, snapshot)
+        return merged
+
+    def render(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.TYPE}')
+            for suffix, label_values, extra, value in metric.samples(collected.get(name, {})):
+                labels = format_labels(metric.labelnames, label_values, extra)
+                lines.append(f'{name}{suffix}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = Histogram(
+    'lore_keeper_request_duration_seconds', 'Request wall time by URL name', ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'lore_keeper_cache_requests', 'Lookups of the sensitive-word and site-config caches', ['cache', 'result'],
+)
+UPLOADS = Counter('lore_keeper_uploads', 'Uploaded files', ['kind'])
+UPLOAD_BYTES = Counter('lore_keeper_upload_bytes', 'Bytes of uploaded files', ['kind'])
+ARCHIVE_DURATION = Histogram(
+    'lore_keeper_archive_duration_seconds', 'Export/import duration', ['operation'],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+ARCHIVE_BYTES = Counter('lore_keeper_archive_bytes', 'Bytes of exported/imported archives', ['operation'])
+ARCHIVE_PEAK_RSS = Gauge(
+    'lore_keeper_archive_peak_rss_bytes', 'Peak resident memory during the last export/import', ['operation', 'mode'],
+)
+ORPHAN_IMAGES = Gauge('lore_keeper_orphan_images', 'Orphaned upload_images files found by the last resource scan')
+ORPHAN_IMAGE_BYTES = Gauge('lore_keeper_orphan_image_bytes', 'Size of the orphaned upload_images files')
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def record_upload(kind, size):
+    UPLOADS.inc(kind=kind)
+    UPLOAD_BYTES.inc(size, kind=kind)
@@ -0,0 +1,96 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensitiveWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, unique=True, verbose_name='sensitive word')),
+                ('replacement', models.CharField(default='***', max_length=100, verbose_name='replacement word')),
+                ('is_active', models.BooleanField(default=True, verbose_name='active')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'sensitive word',
+                'verbose_name_plural': 'sensitive word',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SiteConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('items_per_page', models.IntegerField(default=10, help_text='Number of items to display per page', verbose_name='Items per page')),
+                ('max_file_size', models.IntegerField(default=2, help_text='Maximum file size value (1-1000)', verbose_name='Max file size value')),
+                ('max_file_size_unit', models.CharField(choices=[('KB', 'KB'), ('MB', 'MB')], default='MB', max_length=2, verbose_name='File size unit')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'site configuration',
+                'verbose_name_plural': 'site configuration',
+            },
+        ),
+        migrations.CreateModel(
+            name='Problem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_words', models.CharField(max_length=255)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('root_cause', models.TextField(blank=True)),
+                ('root_cause_file', models.FileField(blank=True, null=True, upload_to='')),
+                ('solutions', models.TextField(blank=True)),
+                ('solutions_file', models.FileField(blank=True, null=True, upload_to='')),
+                ('others', models.TextField(blank=True)),
+                ('others_file', models.FileField(blank=True, null=True, upload_to='')),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('is_public', models.BooleanField(default=True, verbose_name='public view')),
+                ('description_editor_type', models.CharField(choices=[('markdown', 'Markdown'), ('plain', 'Plain Text')], default='plain', max_length=10)),
+                ('root_cause_editor_type', models.CharField(choices=[('markdown', 'Markdown'), ('plain', 'Plain Text')], default='plain', max_length=10)),
+                ('solutions_editor_type', models.CharField(choices=[('markdown', 'Markdown'), ('plain', 'Plain Text')], default='plain', max_length=10)),
+                ('others_editor_type', models.CharField(choices=[('markdown', 'Markdown'), ('plain', 'Plain Text')], default='plain', max_length=10)),
+                ('uploaded_images', models.TextField(blank=True, null=True)),
+                ('public_token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-create_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CvBase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('record_date', models.DateField(unique=True, verbose_name='record date')),
+                ('title', models.CharField(max_length=255, verbose_name='title')),
+                ('content', models.TextField(blank=True, verbose_name='content')),
+                ('content_file', models.FileField(blank=True, null=True, upload_to='', verbose_name='content file')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='create time')),
+                ('update_time', models.DateTimeField(auto_now=True, verbose_name='update time')),
+                ('content_editor_type', models.CharField(choices=[('markdown', 'Markdown'), ('plain', 'Plain Text')], default='plain', max_length=10, verbose_name='content editor type')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='created by')),
+            ],
+            options={
+                'verbose_name': 'cv base',
+                'verbose_name_plural': 'cv base',
+                'ordering': ['-record_date'],
+            },
+        ),
+    ]
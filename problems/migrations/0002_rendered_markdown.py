@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedMarkdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='content hash')),
+                ('renderer_version', models.CharField(max_length=20, verbose_name='renderer version')),
+                ('html', models.TextField(blank=True, verbose_name='rendered html')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'rendered markdown',
+                'verbose_name_plural': 'rendered markdown',
+            },
+        ),
+    ]
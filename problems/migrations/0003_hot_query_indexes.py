@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0002_rendered_markdown'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cvbase',
+            index=models.Index(fields=['created_by', 'record_date'], name='cvbase_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-create_time'], name='problem_public_ctime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['created_by', '-create_time'], name='problem_owner_ctime_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+import html
+import re
+
+from django.db import migrations
+
+# 建索引时的分词规则（search_utils.segment 在本迁移时的冻结副本，之后修改 search_utils 不影响本迁移）
+CJK_CHAR = re.compile('([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])')
+BATCH_SIZE = 500
+
+
+def segment(text):
+    text = html.unescape(text or '').replace('\x02', '').replace('\x03', '')
+    return re.sub(r' {2,}', ' ', CJK_CHAR.sub(r' \1 ', text))
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 虚拟表只在 SQLite 上创建；rowid = problems_cvbase.id，scope = 'u<created_by_id>'
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS problems_cvbase_fts '
+        'USING fts5(scope, title, content, tokenize="unicode61 remove_diacritics 2")'
+    )
+
+    # 已有记录建索引，否则升级后的库在 rebuild_search_index 之前搜不到旧记录
+    CvBase = apps.get_model('problems', 'CvBase')
+    rows = CvBase.objects.values_list('pk', 'created_by_id', 'title', 'content').order_by('pk')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DELETE FROM problems_cvbase_fts')
+        batch = []
+        for pk, created_by_id, title, content in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append([pk, f'u{created_by_id}', segment(title), segment(content)])
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany('INSERT INTO problems_cvbase_fts (rowid, scope, title, content) VALUES (%s, %s, %s, %s)', batch)
+                batch = []
+        if batch:
+            cursor.executemany('INSERT INTO problems_cvbase_fts (rowid, scope, title, content) VALUES (%s, %s, %s, %s)', batch)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS problems_cvbase_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0003_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+import html
+import re
+
+from django.db import migrations
+
+# 建索引时的分词规则（search_utils.segment 在本迁移时的冻结副本，之后修改 search_utils 不影响本迁移）
+CJK_CHAR = re.compile('([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])')
+FIELDS = ['key_words', 'title', 'description', 'root_cause', 'solutions', 'others']
+BATCH_SIZE = 500
+
+
+def segment(text):
+    text = html.unescape(text or '').replace('\x02', '').replace('\x03', '')
+    return re.sub(r' {2,}', ' ', CJK_CHAR.sub(r' \1 ', text))
+
+
+def create_fts_table(apps, schema_editor):
+    # rowid = problems_problem.id，scope = 'public' / 'u<created_by_id>'
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS problems_problem_fts '
+        'USING fts5(scope, key_words, title, description, root_cause, solutions, others, '
+        'tokenize="unicode61 remove_diacritics 2")'
+    )
+
+    # 已有问题建索引，否则升级后的库在 rebuild_search_index 之前搜不到旧问题
+    Problem = apps.get_model('problems', 'Problem')
+    rows = Problem.objects.values_list('pk', 'is_public', 'created_by_id', *FIELDS).order_by('pk')
+    insert = (
+        f'INSERT INTO problems_problem_fts (rowid, scope, {", ".join(FIELDS)}) '
+        f'VALUES ({", ".join(["%s"] * (len(FIELDS) + 2))})'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DELETE FROM problems_problem_fts')
+        batch = []
+        for pk, is_public, created_by_id, *texts in rows.iterator(chunk_size=BATCH_SIZE):
+            scope = (['public'] if is_public else []) + ([f'u{created_by_id}'] if created_by_id else [])
+            batch.append([pk, ' '.join(scope)] + [segment(text) for text in texts])
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            cursor.executemany(insert, batch)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS problems_problem_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0004_cvbase_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+import html
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 补全词的切分规则（search_utils.KeywordIndex.terms 在本迁移时的冻结副本，之后修改 search_utils 不影响本迁移）
+WORD_PATTERN = re.compile(r'\w+')
+KEYWORD_SEPARATOR = re.compile(r'[,;，；、\n]+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 100
+BATCH_SIZE = 500
+
+
+def problem_terms(key_words, title):
+    key_words = html.unescape(key_words or '')
+    title = html.unescape(title or '')
+    candidates = [phrase.strip() for phrase in KEYWORD_SEPARATOR.split(key_words)]
+    candidates += WORD_PATTERN.findall(key_words) + WORD_PATTERN.findall(title)
+    terms = []
+    for term in candidates:
+        term = ' '.join(term.lower().split())
+        if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def index_problem_terms(apps, schema_editor):
+    # 已有问题的补全词，否则升级后的库在 rebuild_search_index 之前补全不出旧问题的词
+    Problem = apps.get_model('problems', 'Problem')
+    ProblemTerm = apps.get_model('problems', 'ProblemTerm')
+    rows = Problem.objects.values_list('pk', 'key_words', 'title', 'is_public', 'created_by_id').order_by('pk')
+    batch = []
+    for pk, key_words, title, is_public, created_by_id in rows.iterator(chunk_size=BATCH_SIZE):
+        batch.extend(
+            ProblemTerm(problem_id=pk, term=term, is_public=is_public, created_by_id=created_by_id)
+            for term in problem_terms(key_words, title)
+        )
+        if len(batch) >= BATCH_SIZE:
+            ProblemTerm.objects.bulk_create(batch)
+            batch = []
+    ProblemTerm.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('problems', '0005_problem_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100, verbose_name='term')),
+                ('is_public', models.BooleanField(default=False)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='problems.problem')),
+            ],
+            options={
+                'verbose_name': 'problem term',
+                'verbose_name_plural': 'problem terms',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='problemterm',
+            index=models.Index(fields=['term', 'is_public', 'created_by'], name='problemterm_term_idx'),
+        ),
+        migrations.RunPython(index_problem_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0006_problem_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemSignature',
+            fields=[
+                ('problem', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='minhash', serialize=False, to='problems.problem')),
+                ('signature', models.BinaryField(verbose_name='minhash signature')),
+            ],
+            options={
+                'verbose_name': 'problem signature',
+                'verbose_name_plural': 'problem signatures',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProblemLshBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(verbose_name='band bucket')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='problems.problem')),
+            ],
+            options={
+                'verbose_name': 'problem LSH bucket',
+                'verbose_name_plural': 'problem LSH buckets',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='problemlshbucket',
+            index=models.Index(fields=['bucket', 'problem'], name='problemlsh_bucket_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+import re
+
+from django.db import migrations, models
+
+# trigram 切分规则（search_utils.FuzzyIndex.trigrams 在本迁移时的冻结副本，之后修改 search_utils 不影响本迁移）
+WORD_PATTERN = re.compile(r'\w+')
+BATCH_SIZE = 500
+
+
+def trigrams(term):
+    grams = set()
+    for word in WORD_PATTERN.findall(term.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def index_term_trigrams(apps, schema_editor):
+    # 已有补全词的 trigram，否则升级后的库在 rebuild_search_index 之前模糊搜索找不到旧问题
+    ProblemTerm = apps.get_model('problems', 'ProblemTerm')
+    TermTrigram = apps.get_model('problems', 'TermTrigram')
+    batch = []
+    for term in ProblemTerm.objects.values_list('term', flat=True).distinct().order_by('term').iterator(chunk_size=BATCH_SIZE):
+        batch.extend(TermTrigram(trigram=gram, term=term) for gram in trigrams(term))
+        if len(batch) >= BATCH_SIZE:
+            TermTrigram.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TermTrigram.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0007_problem_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='trigram')),
+                ('term', models.CharField(max_length=100, verbose_name='term')),
+            ],
+            options={
+                'verbose_name': 'term trigram',
+                'verbose_name_plural': 'term trigrams',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='termtrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'term'), name='termtrigram_unique'),
+        ),
+        migrations.RunPython(index_term_trigrams, migrations.RunPython.noop),
+    ]
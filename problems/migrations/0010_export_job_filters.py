@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0009_export_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='filters',
+            field=models.TextField(blank=True, verbose_name='export filters (JSON)'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+import hashlib
+import html
+import struct
+import sys
+from array import array
+
+from django.db import migrations
+
+# MinHash 签名算法（similarity_utils 在本迁移时的冻结副本）：之后修改 similarity_utils 不会改变本迁移写入的内容，
+# 算法再变时另加迁移重新签名
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+MAX_TEXT_LENGTH = 2000
+SIGNATURE_FORMAT = f'<{NUM_PERM}I'
+BATCH_SIZE = 500
+
+
+def signature_for(key_words, title, description):
+    text = ' '.join(html.unescape(t or '') for t in (key_words, title, description))
+    text = ' '.join(text.lower().split())[:MAX_TEXT_LENGTH]
+    if not text:
+        return None
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = array('I', b''.join([hashlib.shake_128(s.encode()).digest(NUM_PERM * 4) for s in shingles]))
+    if sys.byteorder == 'big':
+        hashes.byteswap()
+    return [min(hashes[i::NUM_PERM]) for i in range(NUM_PERM)]
+
+
+def buckets(signature):
+    result = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f'<H{ROWS}I', band, *chunk), digest_size=8).digest()
+        result.append(int.from_bytes(digest, 'little', signed=True))
+    return result
+
+
+def resign_problems(apps, schema_editor):
+    # MinHash 哈希函数改为 SHAKE-128：旧签名与新签名不可比较，按新算法重新计算签名和 LSH 桶
+    Problem = apps.get_model('problems', 'Problem')
+    ProblemSignature = apps.get_model('problems', 'ProblemSignature')
+    ProblemLshBucket = apps.get_model('problems', 'ProblemLshBucket')
+    ProblemLshBucket.objects.all().delete()
+    ProblemSignature.objects.all().delete()
+
+    signatures, bucket_rows = [], []
+    rows = Problem.objects.values_list('pk', 'key_words', 'title', 'description').order_by('pk')
+    for pk, key_words, title, description in rows.iterator(chunk_size=BATCH_SIZE):
+        signature = signature_for(key_words, title, description)
+        if signature is None:
+            continue
+        signatures.append(ProblemSignature(problem_id=pk, signature=struct.pack(SIGNATURE_FORMAT, *signature)))
+        bucket_rows.extend(ProblemLshBucket(problem_id=pk, bucket=b) for b in buckets(signature))
+        if len(signatures) >= BATCH_SIZE:
+            ProblemSignature.objects.bulk_create(signatures)
+            ProblemLshBucket.objects.bulk_create(bucket_rows)
+            signatures, bucket_rows = [], []
+    ProblemSignature.objects.bulk_create(signatures)
+    ProblemLshBucket.objects.bulk_create(bucket_rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0010_export_job_filters'),
+    ]
+
+    operations = [
+        migrations.RunPython(resign_problems, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0011_resign_minhash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='key_digest',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import uuid
+from pathlib import Path
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -29,6 +30,14 @@ class Problem(models.Model):
 
     class Meta:
         ordering = ['-create_time']
+        indexes = [
+            # problem_list: is_public=True ORDER BY create_time DESC
+            # (partial index: SQLite compiles is_public=True to a bare `WHERE is_public`, which a
+            # plain (is_public, create_time) index cannot serve)
+            models.Index(fields=['-create_time'], name='problem_public_ctime_idx', condition=models.Q(is_public=True)),
+            # problem_list (own items) / user_delete: created_by=<user>
+            models.Index(fields=['created_by', '-create_time'], name='problem_owner_ctime_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -120,6 +129,10 @@ class CvBase(models.Model):
 
     class Meta:
         ordering = ['-record_date']
+        indexes = [
+            # cv_base_list / cv_base_calendar_days / cv_base_create_by_date: created_by=<user> + record_date
+            models.Index(fields=['created_by', 'record_date'], name='cvbase_owner_date_idx'),
+        ]
         verbose_name = "cv base"
         verbose_name_plural = "cv base"
 
@@ -210,20 +223,226 @@ class SiteConfig(models.Model):
         else:
             return self.max_file_size * 1024 * 1024
 
+    CACHE_KEY = 'site_config'
+    CACHE_TIMEOUT = 300
+
     @classmethod
     def get_config(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
-        if created:
-            obj.save()
+        # 每个请求会读多次（分页、上传大小限制）：放在所有进程共享的缓存里，保存提交后由信号写入新值
+        from django.core.cache import cache
+        from .metrics_utils import record_cache_lookup
+        obj = cache.get(cls.CACHE_KEY)
+        record_cache_lookup('site_config', obj is not None)
+        if obj is None:
+            obj, created = cls.objects.get_or_create(pk=1)
+            if created:
+                obj.save()
+            # add 而不是 set：未命中期间若有保存已写入新值，不会被这里读到的旧行覆盖
+            cache.add(cls.CACHE_KEY, obj, timeout=cls.CACHE_TIMEOUT)
         return obj
 
 
+class RenderedMarkdown(models.Model):
+    content_hash = models.CharField(max_length=64, unique=True, verbose_name="content hash")
+    renderer_version = models.CharField(max_length=20, verbose_name="renderer version")
+    html = models.TextField(blank=True, verbose_name="rendered html")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "rendered markdown"
+        verbose_name_plural = "rendered markdown"
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} (v{self.renderer_version})"
+
+
+class ProblemSignature(models.Model):
+    """MinHash signature of a problem's key_words + title + description (see similarity_utils)"""
+    problem = models.OneToOneField(Problem, on_delete=models.CASCADE, primary_key=True, related_name='minhash')
+    signature = models.BinaryField(verbose_name="minhash signature")
+
+    class Meta:
+        verbose_name = "problem signature"
+        verbose_name_plural = "problem signatures"
+
+
+class ProblemLshBucket(models.Model):
+    """LSH band bucket of a problem signature; problems sharing a bucket are similarity candidates"""
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='lsh_buckets')
+    bucket = models.BigIntegerField(verbose_name="band bucket")
+
+    class Meta:
+        verbose_name = "problem LSH bucket"
+        verbose_name_plural = "problem LSH buckets"
+        indexes = [
+            models.Index(fields=['bucket', 'problem'], name='problemlsh_bucket_idx'),
+        ]
+
+
+class ProblemTerm(models.Model):
+    """Autocomplete prefix index: one row per (problem, keyword/title term), visibility copied from the problem"""
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=100, verbose_name="term")
+    is_public = models.BooleanField(default=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+
+    class Meta:
+        verbose_name = "problem term"
+        verbose_name_plural = "problem terms"
+        indexes = [
+            # autocomplete: term range scan, visibility checked from the index only
+            models.Index(fields=['term', 'is_public', 'created_by'], name='problemterm_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class TermTrigram(models.Model):
+    """Trigram -> term map over the ProblemTerm vocabulary, used by the fuzzy search mode"""
+    trigram = models.CharField(max_length=3, verbose_name="trigram")
+    term = models.CharField(max_length=100, verbose_name="term")
+
+    class Meta:
+        verbose_name = "term trigram"
+        verbose_name_plural = "term trigrams"
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'term'], name='termtrigram_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.trigram!r} -> {self.term}'
+
+
+
+class ExportJob(models.Model):
+    """Background export (see archive_utils.start_export_job); the archive lives in EXPORT_JOB_DIR until expires_at"""
+    STATUS_CHOICES = [('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    files_total = models.IntegerField(default=0)
+    files_done = models.IntegerField(default=0)
+    bytes_total = models.BigIntegerField(default=0)
+    bytes_done = models.BigIntegerField(default=0)
+    archive_size = models.BigIntegerField(null=True, blank=True)
+    peak_rss = models.BigIntegerField(null=True, blank=True, verbose_name="peak RSS bytes")
+    filters = models.TextField(blank=True, verbose_name="export filters (JSON)")
+    # 加密密钥的指纹：同一用户、同样筛选条件、同一密码的请求才复用正在进行的任务
+    key_digest = models.CharField(max_length=32, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(verbose_name="expires at")
+
+    class Meta:
+        verbose_name = "export job"
+        verbose_name_plural = "export jobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
+
+    @property
+    def file_path(self):
+        return Path(settings.EXPORT_JOB_DIR) / f'{self.id}.bin'
+
+
 import os
 import re
 import json
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from .models import Problem, CvBase
+from .models import Problem, CvBase, SiteConfig
+
+@receiver(post_save, sender=Problem)
+@receiver(post_save, sender=CvBase)
+def prerender_markdown_on_save(sender, instance, **kwargs):
+    # Render markdown fields at save time so views can serve cached HTML
+    from .markdown_utils import MarkdownRenderer
+    MarkdownRenderer.render_instance(instance)
+
+@receiver(post_save, sender=Problem)
+@receiver(post_delete, sender=Problem)
+def invalidate_problem_cache(sender, instance, **kwargs):
+    # Drop cached responses (e.g. the public /view/<token>/ page) for this problem
+    from .cache_utils import invalidate_problem
+    invalidate_problem(instance)
+
+@receiver(post_save, sender=CvBase)
+@receiver(post_delete, sender=CvBase)
+def invalidate_cv_calendar_cache(sender, instance, **kwargs):
+    # New/removed/re-dated records change the owner's calendar ranges and ETag
+    from .cache_utils import invalidate_cv_calendar
+    invalidate_cv_calendar(instance.created_by_id)
+
+@receiver(post_save, sender=Problem)
+def index_problem_for_search(sender, instance, **kwargs):
+    # Keep the full-text index in step with the row (same transaction as the save)
+    from .search_utils import ProblemSearch, defer_problem_index
+    if defer_problem_index(instance.pk):
+        return
+    ProblemSearch.index(instance)
+
+@receiver(post_save, sender=Problem)
+def index_problem_terms(sender, instance, **kwargs):
+    # Refresh this problem's autocomplete terms (rows go away with the problem via CASCADE)
+    from .search_utils import KeywordIndex, defer_problem_index
+    if defer_problem_index(instance.pk):
+        return
+    KeywordIndex.index(instance)
+
+@receiver(post_save, sender=Problem)
+def index_problem_similarity(sender, instance, **kwargs):
+    # Refresh the MinHash signature and LSH buckets used for duplicate/related lookups
+    from .search_utils import defer_problem_index
+    from .similarity_utils import SimilarityIndex
+    if defer_problem_index(instance.pk):
+        return
+    SimilarityIndex.index(instance)
+
+@receiver(post_delete, sender=Problem)
+def unindex_problem_for_search(sender, instance, **kwargs):
+    from .search_utils import ProblemSearch
+    ProblemSearch.remove(instance.pk)
+
+@receiver(post_save, sender=CvBase)
+def index_cvbase_for_search(sender, instance, **kwargs):
+    # Keep the full-text index in step with the row (same transaction as the save)
+    from .search_utils import CvBaseSearch
+    CvBaseSearch.index(instance)
+
+@receiver(post_delete, sender=CvBase)
+def unindex_cvbase_for_search(sender, instance, **kwargs):
+    from .search_utils import CvBaseSearch
+    CvBaseSearch.remove(instance.pk)
+
+@receiver(post_save, sender=SiteConfig)
+def invalidate_list_cache_on_config_change(sender, instance, **kwargs):
+    # After commit, write the new config into the shared cache (every worker sees it at once) and
+    # bump the list version, since items_per_page changes the shape of every cached list page
+    from django.core.cache import cache
+    from django.db import transaction
+    from .cache_utils import bump_problem_content_version
+
+    def publish():
+        cache.set(SiteConfig.CACHE_KEY, instance, timeout=SiteConfig.CACHE_TIMEOUT)
+        bump_problem_content_version()
+
+    transaction.on_commit(publish)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_problem_cache_on_user_change(sender, instance, created=False, update_fields=None, **kwargs):
+    # Renames change the owner shown on cached list pages and username matches in cached counts; deleting a
+    # user SET_NULLs created_by with no Problem signals. New users own nothing, and logins only touch last_login
+    from django.db import transaction
+    from .cache_utils import bump_problem_content_version
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    transaction.on_commit(bump_problem_content_version)
 
 @receiver(post_delete, sender=Problem)
 def auto_delete_files_on_problem_delete(sender, instance, **kwargs):
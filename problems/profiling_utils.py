@@ -0,0 +1,107 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+# ?_profile=1 返回报告代替页面；?_profile=store 正常返回页面，报告写入 PROFILE_DIR
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+class ProfilingMiddleware:
+    """
+    Superuser-only, per-request profiling: cProfile call tree, SQL log and tracemalloc top allocations.
+    Requests without the ?_profile parameter / X-Profile header only pay for the two dict lookups.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER)
+        if not mode or not request.user.is_superuser:
+            return self.get_response(request)
+
+        queries = []
+
+        def log_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries.append((time.perf_counter() - start, sql))
+
+        profiler = cProfile.Profile()
+        baseline = None
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(log_query))
+            # tracemalloc 对整个进程生效：已由别处（如 ARCHIVE_TRACEMALLOC）开启时不重启也不停止，只报告本请求期间的增量
+            if tracemalloc.is_tracing():
+                baseline = tracemalloc.take_snapshot()
+            else:
+                tracemalloc.start(10)
+                stack.callback(tracemalloc.stop)
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+
+        report = self.report(request, profiler, queries, snapshot, baseline)
+        if mode == 'store':
+            response['X-Profile-Report'] = self.store(request, profiler, report)
+            return response
+        return HttpResponse(report, content_type='text/plain; charset=utf-8')
+
+    @staticmethod
+    def report(request, profiler, queries, snapshot, baseline=None):
+        out = io.StringIO()
+        out.write(f'{request.method} {request.get_full_path()}\n\n')
+
+        out.write('== Call tree (cumulative, top 60) ==\n')
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(60)
+        out.write('== Callers of the 15 slowest functions ==\n')
+        stats.sort_stats('tottime').print_callers(15)
+
+        total = sum(duration for duration, _ in queries)
+        out.write(f'== SQL ({len(queries)} queries, {total * 1000:.1f} ms) ==\n')
+        for duration, sql in queries:
+            out.write(f'{duration * 1000:8.2f} ms  {sql}\n')
+
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ]
+        snapshot = snapshot.filter_traces(filters)
+        if baseline is None:
+            out.write('\n== tracemalloc top 25 (by line) ==\n')
+            stats = snapshot.statistics('lineno')
+        else:
+            out.write('\n== tracemalloc top 25 (by line, change during this request; tracing was already on) ==\n')
+            stats = snapshot.compare_to(baseline.filter_traces(filters), 'lineno')
+        for stat in stats[:25]:
+            out.write(f'{stat}\n')
+        return out.getvalue()
+
+    @staticmethod
+    def store(request, profiler, report):
+        """Write <stamp>_<view>.prof (pstats, e.g. for snakeviz) and .txt; returns the base file name"""
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        match = request.resolver_match
+        view = (match.view_name if match else 'unmatched').replace(':', '_')
+        base = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{view}"
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, f'{base}.prof'))
+        with open(os.path.join(settings.PROFILE_DIR, f'{base}.txt'), 'w') as f:
+            f.write(report)
+        return base
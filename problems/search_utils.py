@@ -0,0 +1,464 @@
+import re
+import html
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, router
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Problem, CvBase, ProblemTerm, TermTrigram
+from .similarity_utils import SimilarityIndex
+
+# unicode61 分词器不切分中日韩文字：索引和查询时都在这些字符两侧插入空格（逐字索引，短语查询保证相邻）
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+CJK_CHAR = re.compile(f'([{CJK_RANGES}])')
+WORD_PATTERN = re.compile(r'\w+')
+# key_words 按逗号/分号/顿号分隔成短语
+KEYWORD_SEPARATOR = re.compile(r'[,;，；、\n]+')
+
+# snippet() 的高亮标记先用控制字符占位，转义后再换成 <mark>
+MARK_OPEN = '\x02'
+MARK_CLOSE = '\x03'
+CJK_GAP = re.compile(f'([{CJK_RANGES}])([{MARK_OPEN}{MARK_CLOSE}]*) ([{MARK_OPEN}{MARK_CLOSE}]*)(?=[{CJK_RANGES}])')
+
+
+def segment(text):
+    """Index/query form of a text: CJK characters become separate tokens"""
+    text = text.replace(MARK_OPEN, '').replace(MARK_CLOSE, '')
+    return re.sub(r' {2,}', ' ', CJK_CHAR.sub(r' \1 ', text))
+
+
+def snippet_html(snippet):
+    """Undo segment() spacing, escape, and turn the placeholder marks into <mark>"""
+    text = CJK_GAP.sub(r'\1\2\3', snippet.strip())
+    return html.escape(text, quote=False).replace(MARK_OPEN, '<mark>').replace(MARK_CLOSE, '</mark>')
+
+
+def match_expression(query):
+    """User input -> FTS5 expression: every word must match, the last one as a prefix"""
+    phrases = [segment(word).strip() for word in WORD_PATTERN.findall(query)]
+    if not phrases:
+        return None
+    terms = [f'"{phrase}"' for phrase in phrases]
+    if not CJK_CHAR.search(phrases[-1]):
+        terms[-1] += '*'
+    return ' AND '.join(terms)
+
+
+class FtsIndex:
+    """SQLite FTS5 全文索引：rowid = 模型主键，scope 列存放可见范围标记（如 u<用户id>）"""
+
+    TABLE = None
+    MODEL = None
+    # 建立索引的文本字段（FTS 列名与字段名相同）及其 bm25 权重
+    FIELDS = []
+    WEIGHTS = {}
+    SNIPPET_TOKENS = 16
+
+    @classmethod
+    def scope_tokens(cls, instance):
+        raise NotImplementedError
+
+    @classmethod
+    def available(cls, connection):
+        return connection.vendor == 'sqlite'
+
+    @classmethod
+    def document(cls, instance):
+        """[scope, field1, field2, ...]；表单保存时做过 html.escape，索引前还原"""
+        return [' '.join(cls.scope_tokens(instance))] + [
+            segment(html.unescape(getattr(instance, f) or '')) for f in cls.FIELDS
+        ]
+
+    @classmethod
+    def index(cls, instance):
+        connection = connections[router.db_for_write(cls.MODEL)]
+        if not cls.available(connection):
+            return
+        columns = ', '.join(['rowid', 'scope'] + cls.FIELDS)
+        placeholders = ', '.join(['%s'] * (len(cls.FIELDS) + 2))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {cls.TABLE} WHERE rowid = %s', [instance.pk])
+            cursor.execute(
+                f'INSERT INTO {cls.TABLE} ({columns}) VALUES ({placeholders})',
+                [instance.pk] + cls.document(instance),
+            )
+
+    @classmethod
+    def index_many(cls, instances):
+        """一批行一次性重建索引（批量导入结束后使用）"""
+        connection = connections[router.db_for_write(cls.MODEL)]
+        if not cls.available(connection) or not instances:
+            return
+        columns = ', '.join(['rowid', 'scope'] + cls.FIELDS)
+        placeholders = ', '.join(['%s'] * (len(cls.FIELDS) + 2))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {cls.TABLE} WHERE rowid = %s', [[instance.pk] for instance in instances])
+            cursor.executemany(
+                f'INSERT INTO {cls.TABLE} ({columns}) VALUES ({placeholders})',
+                [[instance.pk] + cls.document(instance) for instance in instances],
+            )
+
+    @classmethod
+    def remove(cls, pk):
+        connection = connections[router.db_for_write(cls.MODEL)]
+        if not cls.available(connection):
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {cls.TABLE} WHERE rowid = %s', [pk])
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """清空并重建整个索引，返回写入的行数"""
+        connection = connections[router.db_for_write(cls.MODEL)]
+        if not cls.available(connection):
+            return 0
+        columns = ', '.join(['rowid', 'scope'] + cls.FIELDS)
+        placeholders = ', '.join(['%s'] * (len(cls.FIELDS) + 2))
+        count = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {cls.TABLE}')
+            batch = []
+            for instance in cls.MODEL.objects.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append([instance.pk] + cls.document(instance))
+                if len(batch) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {cls.TABLE} ({columns}) VALUES ({placeholders})', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {cls.TABLE} ({columns}) VALUES ({placeholders})', batch)
+                count += len(batch)
+            cursor.execute(f"INSERT INTO {cls.TABLE} ({cls.TABLE}) VALUES ('optimize')")
+        return count
+
+    @classmethod
+    def text_match(cls, expression):
+        """MATCH string restricted to the text columns"""
+        return f'{{{" ".join(cls.FIELDS)}}} : ({expression})'
+
+    @classmethod
+    def snippet_columns(cls):
+        return ', '.join(
+            f"snippet({cls.TABLE}, {i}, char(2), char(3), '…', {cls.SNIPPET_TOKENS})"
+            for i, _ in enumerate(cls.FIELDS, start=1)
+        )
+
+    @classmethod
+    def matching_pks(cls, query):
+        """
+        子查询表达式：filter(pk__in=...) 与计数/分页在同一条 SQL 中完成，不把 id 列表取回 Python。
+        非 SQLite 或查询中没有可索引的词时返回 None
+        """
+        connection = connections[router.db_for_read(cls.MODEL)]
+        expression = match_expression(query)
+        if not cls.available(connection) or not expression:
+            return None
+        return RawSQL(f'SELECT rowid FROM {cls.TABLE} WHERE {cls.TABLE} MATCH %s', [cls.text_match(expression)])
+
+    @classmethod
+    def snippets(cls, query, pks):
+        """{pk: {field: html}} for the given rows (e.g. the current page), highlighted by snippet()"""
+        connection = connections[router.db_for_read(cls.MODEL)]
+        expression = match_expression(query)
+        pks = list(pks)
+        if not cls.available(connection) or not expression or not pks:
+            return {}
+        placeholders = ', '.join(['%s'] * len(pks))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, {cls.snippet_columns()} FROM {cls.TABLE} '
+                f'WHERE {cls.TABLE} MATCH %s AND rowid IN ({placeholders})',
+                [cls.text_match(expression)] + pks,
+            )
+            rows = cursor.fetchall()
+        return {row[0]: {f: snippet_html(s or '') for f, s in zip(cls.FIELDS, row[1:])} for row in rows}
+
+    @classmethod
+    def search(cls, scopes, query, limit=50):
+        """
+        按 bm25 排序的全文检索，结果限定在 scopes 内。
+        返回 [{'id', 'score', 'snippets': {field: html}}]；非 SQLite 数据库返回 None（由调用方退回 icontains）
+        """
+        connection = connections[router.db_for_read(cls.MODEL)]
+        if not cls.available(connection):
+            return None
+        expression = match_expression(query)
+        if not expression:
+            return []
+
+        scope_expression = ' OR '.join(f'"{scope}"' for scope in scopes)
+        match = f'scope : ({scope_expression}) AND {cls.text_match(expression)}'
+        weights = ', '.join(['0.0'] + [str(cls.WEIGHTS.get(f, 1.0)) for f in cls.FIELDS])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({cls.TABLE}, {weights}) AS score, {cls.snippet_columns()} FROM {cls.TABLE} '
+                f'WHERE {cls.TABLE} MATCH %s ORDER BY score LIMIT %s',
+                [match, limit],
+            )
+            rows = cursor.fetchall()
+
+        return [
+            {
+                'id': row[0],
+                'score': row[1],
+                'snippets': {f: snippet_html(s or '') for f, s in zip(cls.FIELDS, row[2:])},
+            }
+            for row in rows
+        ]
+
+
+class CvBaseSearch(FtsIndex):
+    """CV Base 日志全文检索，只在本人的记录中搜索"""
+
+    TABLE = 'problems_cvbase_fts'
+    MODEL = CvBase
+    FIELDS = ['title', 'content']
+    WEIGHTS = {'title': 10.0, 'content': 1.0}
+
+    @classmethod
+    def scope_tokens(cls, instance):
+        return [f'u{instance.created_by_id}']
+
+    @classmethod
+    def user_scopes(cls, user):
+        return [f'u{user.id}']
+
+
+
+class ProblemSearch(FtsIndex):
+    """问题全文检索；scope 为 'public'（公开）+ 'u<创建者id>'"""
+
+    TABLE = 'problems_problem_fts'
+    MODEL = Problem
+    FIELDS = ['key_words', 'title', 'description', 'root_cause', 'solutions', 'others']
+    WEIGHTS = {'key_words': 8.0, 'title': 10.0, 'description': 2.0, 'root_cause': 1.0, 'solutions': 1.0, 'others': 1.0}
+    SNIPPET_TOKENS = 12
+
+    @classmethod
+    def scope_tokens(cls, instance):
+        tokens = ['public'] if instance.is_public else []
+        if instance.created_by_id:
+            tokens.append(f'u{instance.created_by_id}')
+        return tokens
+
+    @classmethod
+    def user_scopes(cls, user):
+        return ['public', f'u{user.id}'] if user.is_authenticated else ['public']
+
+
+
+class KeywordIndex:
+    """关键词/标题词前缀索引（ProblemTerm 表），供搜索框自动补全"""
+
+    TABLE = ProblemTerm._meta.db_table
+    MIN_TERM_LENGTH = 2
+    MAX_TERM_LENGTH = 100
+    # 每次补全最多扫描的索引行数，保证短前缀也有上界
+    SCAN_LIMIT = 500
+
+    @classmethod
+    def terms(cls, instance):
+        """key_words 短语 + 标题中的词，统一小写去重"""
+        key_words = html.unescape(instance.key_words or '')
+        title = html.unescape(instance.title or '')
+        candidates = [phrase.strip() for phrase in KEYWORD_SEPARATOR.split(key_words)]
+        candidates += WORD_PATTERN.findall(key_words) + WORD_PATTERN.findall(title)
+        terms = []
+        for term in candidates:
+            term = ' '.join(term.lower().split())
+            if cls.MIN_TERM_LENGTH <= len(term) <= cls.MAX_TERM_LENGTH and term not in terms:
+                terms.append(term)
+        return terms
+
+    @classmethod
+    def rows(cls, instance):
+        return [
+            ProblemTerm(problem_id=instance.pk, term=term, is_public=instance.is_public, created_by_id=instance.created_by_id)
+            for term in cls.terms(instance)
+        ]
+
+    @classmethod
+    def index(cls, instance):
+        rows = cls.rows(instance)
+        ProblemTerm.objects.filter(problem_id=instance.pk).delete()
+        ProblemTerm.objects.bulk_create(rows)
+        FuzzyIndex.add_terms(row.term for row in rows)
+
+    @classmethod
+    def index_many(cls, instances):
+        rows = [row for instance in instances for row in cls.rows(instance)]
+        ProblemTerm.objects.filter(problem_id__in=[instance.pk for instance in instances]).delete()
+        ProblemTerm.objects.bulk_create(rows)
+        FuzzyIndex.add_terms(row.term for row in rows)
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        ProblemTerm.objects.all().delete()
+        count = 0
+        batch = []
+        for instance in Problem.objects.only('pk', 'key_words', 'title', 'is_public', 'created_by_id').iterator(chunk_size=batch_size):
+            batch.extend(cls.rows(instance))
+            if len(batch) >= batch_size:
+                ProblemTerm.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        ProblemTerm.objects.bulk_create(batch)
+        return count + len(batch)
+
+    @classmethod
+    def suggest(cls, user, prefix, limit=10):
+        """可见问题中以 prefix 开头的词，按出现次数排序"""
+        prefix = ' '.join(prefix.lower().split())
+        if len(prefix) < cls.MIN_TERM_LENGTH:
+            return []
+        visible = Q(is_public=True)
+        if user.is_authenticated:
+            visible |= Q(created_by=user)
+        # 区间条件（而不是 LIKE 'x%'）才能走 term 索引
+        terms = (
+            ProblemTerm.objects.filter(term__gte=prefix, term__lt=prefix + '\U0010ffff')
+            .filter(visible)
+            .order_by('term')
+            .values_list('term', flat=True)[:cls.SCAN_LIMIT]
+        )
+        counts = Counter(terms)
+        return sorted(counts, key=lambda term: (-counts[term], term))[:limit]
+
+
+
+class FuzzyIndex:
+    """
+    模糊搜索：词表（ProblemTerm.term）上的 trigram 索引。
+    查询词 -> 共享 trigram 的候选词 -> 按 trigram 相似度取相近的词 -> 含这些词的可见问题，按相似度排序
+    """
+
+    TABLE = TermTrigram._meta.db_table
+    MIN_SIMILARITY = 0.3
+    # 每个查询词最多考察的候选词 / 最多取回的 ProblemTerm 行
+    CANDIDATE_LIMIT = 200
+    TERMS_PER_WORD = 20
+    ROW_LIMIT = 5000
+
+    @classmethod
+    def trigrams(cls, term):
+        """pg_trgm 风格：每个词前补两个空格、后补一个空格再切 trigram"""
+        grams = set()
+        for word in WORD_PATTERN.findall(term.lower()):
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+
+    @classmethod
+    def similarity(cls, grams_a, grams_b):
+        shared = len(grams_a & grams_b)
+        return shared / (len(grams_a) + len(grams_b) - shared) if shared else 0.0
+
+    @classmethod
+    def add_terms(cls, terms):
+        """新词加入 trigram 表（已存在的忽略）；不再使用的词留到 rebuild 时清理"""
+        TermTrigram.objects.bulk_create(
+            [TermTrigram(trigram=gram, term=term) for term in set(terms) for gram in cls.trigrams(term)],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        TermTrigram.objects.all().delete()
+        batch = []
+        for term in ProblemTerm.objects.values_list('term', flat=True).distinct().iterator(chunk_size=batch_size):
+            batch.append(term)
+            if len(batch) >= batch_size:
+                cls.add_terms(batch)
+                batch = []
+        cls.add_terms(batch)
+        return TermTrigram.objects.count()
+
+    @classmethod
+    def similar_terms(cls, word):
+        """{term: similarity}：与 word 相近的词，只查与其共享 trigram 的候选"""
+        grams = cls.trigrams(word)
+        if not grams:
+            return {}
+        candidates = (
+            TermTrigram.objects.filter(trigram__in=grams)
+            .values('term')
+            .annotate(shared=Count('id'))
+            .order_by('-shared')
+            .values_list('term', flat=True)[:cls.CANDIDATE_LIMIT]
+        )
+        scored = {term: cls.similarity(grams, cls.trigrams(term)) for term in candidates}
+        best = sorted((t for t, score in scored.items() if score >= cls.MIN_SIMILARITY), key=lambda t: -scored[t])
+        return {term: scored[term] for term in best[:cls.TERMS_PER_WORD]}
+
+    @classmethod
+    def search(cls, user, query):
+        """按相似度排序的可见问题 id 列表；每个查询词都要有相近的词命中"""
+        words = [w for w in WORD_PATTERN.findall(query.lower()) if len(w) >= 2]
+        if not words:
+            return []
+        per_word = [cls.similar_terms(word) for word in words]
+        if not all(per_word):
+            return []
+
+        visible = Q(is_public=True)
+        if user.is_authenticated:
+            visible |= Q(created_by=user)
+        all_terms = set().union(*per_word)
+        rows = (
+            ProblemTerm.objects.filter(term__in=all_terms)
+            .filter(visible)
+            .values_list('problem_id', 'term')[:cls.ROW_LIMIT]
+        )
+        # 每个问题：各查询词取最相近的一个词的相似度，全部命中才计入
+        best = {}
+        for problem_id, term in rows:
+            scores = best.setdefault(problem_id, [0.0] * len(words))
+            for i, terms in enumerate(per_word):
+                if term in terms and terms[term] > scores[i]:
+                    scores[i] = terms[term]
+        ranked = [(sum(scores), pk) for pk, scores in best.items() if all(scores)]
+        ranked.sort(key=lambda item: (-item[0], -item[1]))
+        return [pk for _, pk in ranked]
+
+
+# rebuild_search_index 重建的全部索引（FuzzyIndex 依赖 KeywordIndex 的词表，需排在其后）
+SEARCH_INDEXES = [CvBaseSearch, ProblemSearch, KeywordIndex, FuzzyIndex, SimilarityIndex]
+
+# Problem 行级索引（全文 / 补全词 / 相似度）；批量导入时暂停逐行更新，结束后按批补建
+PROBLEM_INDEXES = [ProblemSearch, KeywordIndex, SimilarityIndex]
+_deferred_problem_pks = ContextVar('deferred_problem_pks', default=None)
+
+
+def defer_problem_index(pk):
+    """post_save 钩子先调用：处于 deferred_problem_indexing() 中时只记下主键并返回 True"""
+    pks = _deferred_problem_pks.get()
+    if pks is None:
+        return False
+    pks.add(pk)
+    return True
+
+
+def index_problems(pks, batch_size=500):
+    """按批为给定问题重建 PROBLEM_INDEXES（已不存在的主键自动跳过）"""
+    pks = sorted(pks)
+    for start in range(0, len(pks), batch_size):
+        problems = list(Problem.objects.filter(pk__in=pks[start:start + batch_size]))
+        for index in PROBLEM_INDEXES:
+            index.index_many(problems)
+
+
+@contextmanager
+def deferred_problem_indexing(batch_size=500):
+    """
+    批量导入时使用：期间 Problem 的 post_save 不逐行更新索引，退出时对保存过的问题统一建一次索引。
+    导入中途出错也会为已写入的行补建索引（导入不在单个事务里，已写入的行会保留）
+    """
+    pks = set()
+    token = _deferred_problem_pks.set(pks)
+    try:
+        yield pks
+    finally:
+        _deferred_problem_pks.reset(token)
+        index_problems(pks, batch_size)
@@ -1,6 +1,7 @@
 import re
 from django.core.cache import cache
 from .models import SensitiveWord
+from .metrics_utils import record_cache_lookup
 
 class SensitiveDataProcessor:
     """敏感数据处理工具类"""
@@ -9,10 +10,12 @@ class SensitiveDataProcessor:
     def get_active_sensitive_words(cls):
         """从数据库获取所有启用的敏感词"""
         cached_words = cache.get('active_sensitive_words')
+        record_cache_lookup('sensitive_words', cached_words is not None)
         if cached_words is not None:
             return cached_words
             
-        active_words = list(SensitiveWord.objects.filter(is_active=True).values('word', 'replacement'))
+        # 写入共享缓存：从主库读，不受只读副本延迟影响
+        active_words = list(SensitiveWord.objects.using('default').filter(is_active=True).values('word', 'replacement'))
         cache.set('active_sensitive_words', active_words, timeout=300)  # 缓存5分钟
         return active_words
     
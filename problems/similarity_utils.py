@@ -0,0 +1,167 @@
+import sys
+import html
+import struct
+import hashlib
+from array import array
+
+from django.db.models import Count, Q
+
+from .models import Problem, ProblemSignature, ProblemLshBucket
+
+# MinHash 参数：64 个哈希函数分成 16 个 band（每个 4 行），Jaccard ≈ 0.5 以上的文档大概率落入同一桶
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 4
+MAX_TEXT_LENGTH = 2000
+
+# 每个 shingle 用 SHAKE-128 一次产出 NUM_PERM 个 32 位哈希值（相当于 NUM_PERM 个独立哈希函数）
+# 签名已入库，修改参数后需要 manage.py rebuild_search_index
+SIGNATURE_FORMAT = f'<{NUM_PERM}I'
+
+
+class SimilarityIndex:
+    """MinHash + LSH 近似重复检测：新增问题时提示重复，详情页展示相关问题"""
+
+    TABLE = ProblemLshBucket._meta.db_table
+    MIN_SIMILARITY = 0.3
+    # 候选数上限（按共享桶数排序），保证查询为次线性
+    CANDIDATE_LIMIT = 200
+
+    @classmethod
+    def document_text(cls, key_words, title, description):
+        text = ' '.join(html.unescape(t or '') for t in (key_words, title, description))
+        return ' '.join(text.lower().split())[:MAX_TEXT_LENGTH]
+
+    @classmethod
+    def shingles(cls, text):
+        """字符 4-gram，对中英文都适用"""
+        if len(text) <= SHINGLE_SIZE:
+            return {text} if text else set()
+        return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+    @classmethod
+    def signature(cls, shingles):
+        """所有 shingle 的哈希值拼成一个 array，每个位置按步长切片取最小值（循环都在 C 里完成）"""
+        shake = hashlib.shake_128
+        hashes = array('I', b''.join([shake(s.encode()).digest(NUM_PERM * 4) for s in shingles]))
+        if sys.byteorder == 'big':
+            hashes.byteswap()
+        return [min(hashes[i::NUM_PERM]) for i in range(NUM_PERM)]
+
+    @classmethod
+    def buckets(cls, signature):
+        """每个 band 的 4 个值哈希成一个 64 位桶号（band 编号参与哈希，不同 band 不会冲突）"""
+        buckets = []
+        for band in range(BANDS):
+            chunk = signature[band * ROWS:(band + 1) * ROWS]
+            digest = hashlib.blake2b(struct.pack(f'<H{ROWS}I', band, *chunk), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, 'little', signed=True))
+        return buckets
+
+    @classmethod
+    def signature_for(cls, key_words, title, description):
+        shingles = cls.shingles(cls.document_text(key_words, title, description))
+        return cls.signature(shingles) if shingles else None
+
+    @classmethod
+    def estimate(cls, sig_a, sig_b):
+        """Jaccard 相似度估计：相同位置取值相等的比例"""
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+    @classmethod
+    def index(cls, instance):
+        signature = cls.signature_for(instance.key_words, instance.title, instance.description)
+        ProblemLshBucket.objects.filter(problem_id=instance.pk).delete()
+        if signature is None:
+            ProblemSignature.objects.filter(problem_id=instance.pk).delete()
+            return
+        ProblemSignature.objects.update_or_create(
+            problem_id=instance.pk, defaults={'signature': struct.pack(SIGNATURE_FORMAT, *signature)}
+        )
+        ProblemLshBucket.objects.bulk_create(
+            ProblemLshBucket(problem_id=instance.pk, bucket=bucket) for bucket in cls.buckets(signature)
+        )
+
+    @classmethod
+    def bulk_index(cls, rows, batch_size=500):
+        """rows: (pk, key_words, title, description)，签名和桶按批写入，返回有签名的问题数"""
+        count = 0
+        signatures, buckets = [], []
+        for pk, key_words, title, description in rows:
+            signature = cls.signature_for(key_words, title, description)
+            if signature is None:
+                continue
+            signatures.append(ProblemSignature(problem_id=pk, signature=struct.pack(SIGNATURE_FORMAT, *signature)))
+            buckets.extend(ProblemLshBucket(problem_id=pk, bucket=b) for b in cls.buckets(signature))
+            if len(signatures) >= batch_size:
+                ProblemSignature.objects.bulk_create(signatures)
+                ProblemLshBucket.objects.bulk_create(buckets)
+                count += len(signatures)
+                signatures, buckets = [], []
+        ProblemSignature.objects.bulk_create(signatures)
+        ProblemLshBucket.objects.bulk_create(buckets)
+        return count + len(signatures)
+
+    @classmethod
+    def index_many(cls, instances):
+        """一批问题一次性重建签名（批量导入结束后使用）"""
+        pks = [instance.pk for instance in instances]
+        ProblemLshBucket.objects.filter(problem_id__in=pks).delete()
+        ProblemSignature.objects.filter(problem_id__in=pks).delete()
+        return cls.bulk_index((i.pk, i.key_words, i.title, i.description) for i in instances)
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        ProblemLshBucket.objects.all().delete()
+        ProblemSignature.objects.all().delete()
+        rows = Problem.objects.values_list('pk', 'key_words', 'title', 'description').iterator(chunk_size=batch_size)
+        return cls.bulk_index(rows, batch_size)
+
+    @classmethod
+    def similar(cls, user, signature, exclude_pk=None, limit=5):
+        """
+        与 signature 相似且 user 可见的问题：[{'id', 'title', 'public_token', 'similarity'}]
+        只比较与其共享 LSH 桶的候选，不做全表比较
+        """
+        if signature is None:
+            return []
+        visible = Q(problem__is_public=True)
+        if user.is_authenticated:
+            visible |= Q(problem__created_by=user)
+
+        candidates = (
+            ProblemLshBucket.objects.filter(bucket__in=cls.buckets(signature))
+            .filter(visible)
+            .exclude(problem_id=exclude_pk)
+            .values('problem_id')
+            .annotate(hits=Count('id'))
+            .order_by('-hits')
+            .values_list('problem_id', flat=True)[:cls.CANDIDATE_LIMIT]
+        )
+        scored = []
+        for pk, packed in ProblemSignature.objects.filter(problem_id__in=list(candidates)).values_list('problem_id', 'signature'):
+            similarity = cls.estimate(signature, struct.unpack(SIGNATURE_FORMAT, bytes(packed)))
+            if similarity >= cls.MIN_SIMILARITY:
+                scored.append((similarity, pk))
+        scored.sort(reverse=True)
+        scored = scored[:limit]
+
+        problems = Problem.objects.in_bulk([pk for _, pk in scored])
+        return [
+            {
+                'id': pk,
+                'title': problems[pk].title,
+                'public_token': str(problems[pk].public_token),
+                'similarity': round(similarity, 2),
+            }
+            for similarity, pk in scored if pk in problems
+        ]
+
+    @classmethod
+    def related(cls, user, problem, limit=5):
+        """详情页“相关问题”：直接使用已存储的签名"""
+        packed = ProblemSignature.objects.filter(problem_id=problem.pk).values_list('signature', flat=True).first()
+        if packed is None:
+            return []
+        return cls.similar(user, list(struct.unpack(SIGNATURE_FORMAT, bytes(packed))), exclude_pk=problem.pk, limit=limit)
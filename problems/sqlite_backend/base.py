@@ -0,0 +1,20 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite 后端，移植 Django 5.1 的 OPTIONS['transaction_mode']（升级到 5.1 后可直接换回内置后端）。
+
+    Django 4.2 的 atomic() 只发 BEGIN（DEFERRED）：两个先读后写的事务都持有读锁，
+    其中一个升级为写锁时 SQLite 立即返回 "database is locked"，busy_timeout 不起作用。
+    transaction_mode='IMMEDIATE' 让事务开始时就取写锁，并发写按 busy_timeout 排队。
+    """
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        return params
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,516 @@
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import uuid
+from datetime import date, timedelta
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from problems.archive_utils import CHUNK_SIZE, CHUNKED_MAGIC, chunked_layout_valid, decrypt_upload, encrypt_stream
+from problems.archive_utils import cleanup_expired_exports, job_expiry
+from problems.cache_utils import problem_content_version
+from problems.metrics_utils import EXITED_SNAPSHOT, PROCESS_ID, Counter, MetricsRegistry
+from problems.models import Problem, CvBase, ExportJob, SensitiveWord, SiteConfig
+from problems.sqlite_backend.base import DatabaseWrapper
+from problems.sensitive_utils import SensitiveDataProcessor
+
+INDEX_PATTERN = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+
+# 测试不碰共享的文件/Redis 缓存：每个测试类用进程内缓存，并在 setUp 中清空
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'problems-tests'}}
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN of the hot view queries must use their composite indexes (SQLite only)"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks only support SQLite')
+
+    def index_columns(self):
+        """索引名 -> 列（含 unique 约束自动生成的 sqlite_autoindex_*）"""
+        columns = {}
+        with connection.cursor() as cursor:
+            for model in (Problem, CvBase):
+                cursor.execute(f'PRAGMA index_list({connection.ops.quote_name(model._meta.db_table)})')
+                for index_name in [row[1] for row in cursor.fetchall()]:
+                    cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(index_name)})')
+                    columns[index_name] = tuple(row[2] for row in cursor.fetchall())
+        return columns
+
+    def hot_queries(self):
+        """(name, queryset, acceptable leading index columns) — mirrors the filters in views.py"""
+        user_id = 1
+        today = date.today()
+        return [
+            (
+                'problem_list (anonymous)',
+                Problem.objects.filter(is_public=True).order_by('-create_time')[:10],
+                [('create_time',)],
+            ),
+            (
+                'user_delete',
+                Problem.objects.filter(created_by_id=user_id),
+                [('created_by_id',)],
+            ),
+            (
+                'cv_base_list',
+                CvBase.objects.filter(created_by_id=user_id).order_by('-record_date'),
+                [('created_by_id', 'record_date')],
+            ),
+            (
+                'cv_base_timeline',
+                CvBase.objects.filter(created_by_id=user_id).values('record_date__year', 'record_date__month')
+                .annotate(count=Count('id')),
+                [('created_by_id', 'record_date')],
+            ),
+            (
+                'cv_base_month_records',
+                CvBase.objects.filter(
+                    created_by_id=user_id, record_date__gte=today.replace(day=1), record_date__lte=today
+                ).values_list('id', 'record_date', 'title', 'update_time', 'content_file'),
+                [('created_by_id', 'record_date')],
+            ),
+            (
+                'cv_base_calendar_days',
+                CvBase.objects.filter(
+                    created_by_id=user_id, record_date__gte=today.replace(day=1), record_date__lte=today
+                ).values_list('record_date__day', flat=True),
+                [('created_by_id', 'record_date')],
+            ),
+            (
+                'cv_base_calendar_range',
+                CvBase.objects.filter(
+                    created_by_id=user_id, record_date__range=(today.replace(month=1, day=1), today)
+                ).values_list('record_date', flat=True),
+                [('created_by_id', 'record_date')],
+            ),
+            (
+                'cv_base_create_by_date',
+                CvBase.objects.filter(created_by_id=user_id, record_date=today),
+                [('created_by_id', 'record_date'), ('record_date',)],
+            ),
+        ]
+
+    def test_hot_queries_use_an_index(self):
+        index_columns = self.index_columns()
+        for name, queryset, expected in self.hot_queries():
+            with self.subTest(name):
+                plan = queryset.explain()
+                used = INDEX_PATTERN.findall(plan)
+                self.assertTrue(
+                    any(index_columns.get(index, ())[:len(prefix)] == prefix for index in used for prefix in expected),
+                    f'{name} does not use an index on {expected}:\n{plan}',
+                )
+
+
+
+@override_settings(CACHES=TEST_CACHES, ALLOWED_HOSTS=['testserver'])
+class EditQueryTests(TestCase):
+    """problem_edit / cv_base_edit: one locked read and one UPDATE of the edited row, files touched only on commit"""
+
+    # 每次编辑 POST 的完整查询数（任何增减都要有意为之，并同步更新这里）：
+    #   problem_edit: session + 用户 + 加锁读 + UPDATE，外加 post_save 钩子维护全文/补全/相似度索引，以及各层 SAVEPOINT
+    #   cv_base_edit: session + 用户 + 加锁读 + record_date 唯一性校验 + UPDATE + 全文索引，以及各层 SAVEPOINT
+    PROBLEM_EDIT_QUERIES = 19
+    CV_BASE_EDIT_QUERIES = 11
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='editor', password=None, is_superuser=True)
+        SiteConfig.objects.create()
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        # 查询数只在缓存已预热时确定：SiteConfig、敏感词、内容版本号都先读一遍
+        cache.clear()
+        SiteConfig.get_config()
+        SensitiveDataProcessor.get_active_sensitive_words()
+        problem_content_version()
+        self.client.force_login(self.user)
+
+    def assert_single_read_then_write(self, queries, model):
+        table = connection.ops.quote_name(model._meta.db_table)
+        sqls = [q['sql'] for q in queries]
+        reads = [i for i, s in enumerate(sqls) if s.startswith(f'SELECT {table}.')]
+        writes = [i for i, s in enumerate(sqls) if s.startswith(f'UPDATE {table}')]
+        self.assertEqual(len(reads), 1, f'expected 1 read of the {table} row:\n' + '\n'.join(sqls))
+        self.assertEqual(len(writes), 1, f'expected 1 UPDATE of {table}:\n' + '\n'.join(sqls))
+        self.assertLess(reads[0], writes[0], f'{table} row read after the write')
+
+    def test_problem_edit(self):
+        problem = Problem.objects.create(title='edit me', created_by=self.user)
+        problem.set_root_cause_files(['a.txt', 'b.txt'])
+        problem.save(update_fields=['root_cause_file'])
+        upload_path = os.path.join(self.media_root, str(problem.pk), 'root_cause', 'c.txt')
+
+        with self.captureOnCommitCallbacks() as callbacks, \
+                self.assertNumQueries(self.PROBLEM_EDIT_QUERIES) as ctx:
+            response = self.client.post(f'/edit/{problem.pk}/', {
+                'title': 'edited', 'key_words': 'k', 'description': 'd',
+                'description_editor_type': 'plain', 'root_cause': '', 'root_cause_editor_type': 'plain',
+                'solutions': '', 'solutions_editor_type': 'plain', 'others': '', 'others_editor_type': 'plain',
+                'root_cause_files_delete': ['a.txt'],
+                'root_cause_files': [SimpleUploadedFile('c.txt', b'c')],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assert_single_read_then_write(ctx.captured_queries, Problem)
+        problem.refresh_from_db()
+        self.assertEqual(problem.get_root_cause_files(), ['b.txt', 'c.txt'])
+
+        # 上传的文件只在事务提交后写盘：TestCase 的外层事务不提交，文件只登记在 on_commit 回调里
+        self.assertTrue(callbacks)
+        self.assertFalse(os.path.exists(upload_path))
+
+    def test_cv_base_edit(self):
+        record = CvBase.objects.create(record_date='1900-01-01', title='t', created_by=self.user)
+        record.set_content_files(['a.txt', 'b.txt'])
+        record.save(update_fields=['content_file'])
+
+        with self.assertNumQueries(self.CV_BASE_EDIT_QUERIES) as ctx:
+            response = self.client.post(f'/cv-base/edit/{record.pk}/', {
+                'record_date': '1900-01-01', 'title': 't2', 'content': 'c', 'content_editor_type': 'plain',
+                'content_files_delete': ['a.txt'],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assert_single_read_then_write(ctx.captured_queries, CvBase)
+        record.refresh_from_db()
+        self.assertEqual(record.get_content_files(), ['b.txt'])
+
+
+class SqliteBackendTests(SimpleTestCase):
+    """problems.sqlite_backend: OPTIONS['transaction_mode'] picks the BEGIN statement (production profile: IMMEDIATE)"""
+
+    def begin_statement(self, options):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wrapper = DatabaseWrapper(
+                {**connection.settings_dict, 'NAME': os.path.join(tmp_dir, 'db.sqlite3'), 'OPTIONS': options},
+                alias='transaction_mode_test',
+            )
+            wrapper.force_debug_cursor = True
+            try:
+                # 与 atomic() 最外层进入事务的调用相同
+                wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                wrapper.rollback()
+                # 连接钩子先执行的 PRAGMA（生产配置档）也会记录，只取 BEGIN
+                return next(q['sql'] for q in wrapper.queries if q['sql'].startswith('BEGIN'))
+            finally:
+                wrapper.close()
+
+    def test_transaction_mode(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('problems.sqlite_backend is SQLite only')
+        self.assertEqual(self.begin_statement({'transaction_mode': 'IMMEDIATE'}), 'BEGIN IMMEDIATE')
+        self.assertEqual(self.begin_statement({}), 'BEGIN')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    """Search results are FTS token matches plus substring matches: part of a word still finds the row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher', password=None)
+        cls.token_hit = Problem.objects.create(title='Exception in handler', created_by=cls.user, is_public=True)
+        cls.substring_hit = Problem.objects.create(title='NullPointerException in parser', created_by=cls.user, is_public=True)
+        Problem.objects.create(title='Timeout in scheduler', created_by=cls.user, is_public=True)
+        CvBase.objects.create(record_date='1900-01-01', title='Exception in handler', created_by=cls.user)
+        CvBase.objects.create(record_date='1900-01-02', title='NullPointerException in parser', created_by=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_problem_list_includes_substring_matches(self):
+        response = self.client.get('/', {'q': 'Exception'})
+        self.assertEqual(response.status_code, 200)
+        ids = {entry['id'] for entry in json.loads(response.context['problems_json'])}
+        self.assertEqual(ids, {self.token_hit.pk, self.substring_hit.pk})
+
+    def test_cv_base_search_includes_substring_matches(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/cv-base/search/', {'q': 'Exception'})
+        self.assertEqual(response.status_code, 200)
+        titles = [result['title_html'] for result in response.json()['results']]
+        self.assertEqual(len(titles), 2)
+        # FTS 命中的排在前面并带高亮，子串命中的补在后面
+        self.assertIn('<mark>Exception</mark>', titles[0])
+
+
+class MetricsSnapshotTests(SimpleTestCase):
+    """Multi-process metrics: snapshots of exited workers are folded into one file and counters never go back"""
+
+    def setUp(self):
+        if os.name != 'posix':
+            self.skipTest('snapshot folding needs POSIX pids and flock')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(METRICS_MULTIPROC_DIR=self.directory))
+        self.registry = MetricsRegistry()
+        self.counter = Counter('test_requests', 'Requests', ['view'], registry=self.registry)
+
+    def write_snapshot(self, pid, value):
+        with open(os.path.join(self.directory, f'{pid}_1.json'), 'w') as f:
+            json.dump({'test_requests': {'["home"]': value}}, f)
+
+    def exited_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def test_exited_snapshots_are_folded(self):
+        self.counter.inc(view='home')
+        self.write_snapshot(self.exited_pid(), 2)
+        self.write_snapshot(self.exited_pid(), 3)
+
+        self.assertEqual(self.registry.collect()['test_requests'], {'["home"]': 6})
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith('.json')),
+            sorted([EXITED_SNAPSHOT, f'{PROCESS_ID}.json']),
+        )
+
+        # 再退出一个进程：汇总文件累加，总数不回退
+        self.write_snapshot(self.exited_pid(), 4)
+        self.assertEqual(self.registry.collect()['test_requests'], {'["home"]': 10})
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryCountTests(TestCase):
+    """N+1 regression check: every view runs the same number of queries with a small and a larger data set"""
+
+    SMALL = 3
+    LARGE = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='harness_admin', password=None, is_superuser=True)
+        cls.other = User.objects.create_user(username='harness_other', password=None)
+        SiteConfig.objects.create()
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+        self.clients = {'anonymous': Client(), 'admin': Client()}
+        self.clients['admin'].force_login(self.admin)
+
+    def write_file(self, relative_path, size=1024):
+        path = os.path.join(self.media_root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+
+    def seed(self, admin, other, start, end):
+        """Rows start..end-1 of each model, alternating owners, with attachments and embedded images"""
+        for i in range(start, end):
+            owner = admin if i % 2 == 0 else other
+            image = f'harness_{i}.png'
+            self.write_file(os.path.join('upload_images', image))
+            problem = Problem.objects.create(
+                key_words=f'harness, keyword{i}', title=f'harness problem {i}',
+                description=f'harness **body** {i}\n\n![img](/uploads/upload_images/{image})',
+                description_editor_type='markdown', uploaded_images=json.dumps([image]),
+                created_by=owner, is_public=True,
+            )
+            problem.set_root_cause_files([f'log_{i}.txt'])
+            problem.save(update_fields=['root_cause_file'])
+            self.write_file(os.path.join(str(problem.pk), 'root_cause', f'log_{i}.txt'))
+
+            record = CvBase.objects.create(
+                record_date=date(1900, 1, 1) + timedelta(days=i), title=f'harness record {i}',
+                content=f'harness log {i}\n\n![img](/uploads/upload_images/{image})',
+                content_editor_type='markdown', created_by=owner,
+            )
+            record.set_content_files([f'notes_{i}.txt'])
+            record.save(update_fields=['content_file'])
+            self.write_file(os.path.join('cv_base', str(record.pk), 'content', f'notes_{i}.txt'))
+
+            SensitiveWord.objects.create(word=f'harness-secret-{i}')
+            User.objects.create_user(username=f'harness_user_{i}', password=None)
+
+    def scenarios(self, admin):
+        """(name, client, method, url, body) — one per view, with ids that exist in both data sets"""
+        problem = Problem.objects.filter(created_by=admin).order_by('pk').first()
+        record = CvBase.objects.filter(created_by=admin).order_by('pk').first()
+        token = problem.public_token
+        similar_body = json.dumps({'key_words': 'harness', 'title': 'harness problem', 'description': 'harness body'})
+        return [
+            ('problem_list', 'admin', 'get', '/', None),
+            ('problem_list (search)', 'admin', 'get', '/?q=harness', None),
+            ('problem_list (fuzzy)', 'admin', 'get', '/?q=harnes&mode=fuzzy', None),
+            ('problem_list (anonymous)', 'anonymous', 'get', '/', None),
+            ('problem_autocomplete', 'admin', 'get', '/autocomplete/?q=ha', None),
+            ('problem_edit (form)', 'admin', 'get', f'/edit/{problem.pk}/', None),
+            ('view_detail', 'admin', 'get', f'/view/{token}/', None),
+            ('view_detail (anonymous)', 'anonymous', 'get', f'/view/{token}/', None),
+            ('problem_related', 'admin', 'get', f'/view/{token}/related/', None),
+            ('problem_similar', 'admin', 'post', '/similar/', similar_body),
+            ('cv_base_list', 'admin', 'get', '/cv-base/', None),
+            ('cv_base_detail', 'admin', 'get', f'/cv-base/detail/{record.pk}/', None),
+            ('cv_base_timeline', 'admin', 'get', '/cv-base/timeline/', None),
+            ('cv_base_month_records', 'admin', 'get', '/cv-base/month-records/?year=1900&month=1', None),
+            ('cv_base_calendar_days', 'admin', 'get', '/cv-base/calendar-days/?year=1900&month=1', None),
+            ('cv_base_calendar_range', 'admin', 'get', '/cv-base/calendar-range/?start=1900-01-01&end=1900-12-31', None),
+            ('cv_base_search', 'admin', 'get', '/cv-base/search/?q=harness', None),
+            ('sensitive_word_list', 'admin', 'get', '/sensitive-words/', None),
+            ('user_list', 'admin', 'get', '/staff/users/', None),
+            ('resource_management', 'admin', 'get', '/staff/resource-management/?kb=0', None),
+            ('site_config_edit (form)', 'admin', 'get', '/site-config/edit/', None),
+            ('export_json', 'admin', 'post', '/export/', json.dumps({'password': 'harness', 'sync': True})),
+            ('metrics', 'admin', 'get', '/metrics', None),
+        ]
+
+    def request(self, role, method, url, body):
+        if method == 'post':
+            return self.clients[role].post(url, body, content_type='application/json')
+        return self.clients[role].get(url)
+
+    def warm_up(self):
+        """
+        Clear the test cache so the measured view takes its uncached path, then prime what many views read first
+        (SiteConfig through a warm-up request, sensitive words, the content version): only the view's own queries count
+        """
+        cache.clear()
+        self.assertEqual(self.clients['admin'].get('/site-config/edit/').status_code, 200)
+        SensitiveDataProcessor.get_active_sensitive_words()
+        problem_content_version()
+
+    def measure(self):
+        """{name: query count} of every scenario with the small data set"""
+        counts = {}
+        for name, role, method, url, body in self.scenarios(self.admin):
+            self.warm_up()
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.request(role, method, url, body)
+            self.assertLess(response.status_code, 400, name)
+            counts[name] = len(ctx.captured_queries)
+        return counts
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        self.seed(self.admin, self.other, 0, self.SMALL)
+        small = self.measure()
+        self.seed(self.admin, self.other, self.SMALL, self.LARGE)
+        for name, role, method, url, body in self.scenarios(self.admin):
+            with self.subTest(name):
+                self.warm_up()
+                with self.assertNumQueries(small[name]):
+                    response = self.request(role, method, url, body)
+                self.assertLess(response.status_code, 400)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProfilingTests(TestCase):
+    """?_profile=1 leaves tracemalloc as it found it: tracing started elsewhere keeps running"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='profiler', password=None, is_superuser=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_stops_only_its_own_tracing(self):
+        self.assertFalse(tracemalloc.is_tracing())
+        response = self.client.get('/', {'_profile': '1'})
+        self.assertContains(response, '== tracemalloc top 25 (by line) ==')
+        self.assertFalse(tracemalloc.is_tracing())
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        response = self.client.get('/', {'_profile': '1'})
+        self.assertContains(response, 'tracing was already on')
+        self.assertTrue(tracemalloc.is_tracing())
+
+
+class BoundedUpload(io.BytesIO):
+    """Uploaded file stand-in that fails on an unbounded read()"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.size = len(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            raise AssertionError('whole upload read into memory')
+        return super().read(size)
+
+
+class DecryptUploadTests(SimpleTestCase):
+    """Chunked archives are decrypted in bounded reads; a wrong password is an error, not a legacy retry"""
+
+    key = bytes(32)
+    plaintext = os.urandom(CHUNK_SIZE + 1000)
+
+    def chunked_archive(self):
+        archive = io.BytesIO()
+        encrypt_stream(self.key, io.BytesIO(self.plaintext), archive)
+        return archive.getvalue()
+
+    def test_chunked_round_trip(self):
+        dst = io.BytesIO()
+        self.assertEqual(decrypt_upload(self.key, BoundedUpload(self.chunked_archive()), dst), 'spooled')
+        self.assertEqual(dst.getvalue(), self.plaintext)
+
+    def test_wrong_password_is_not_retried_as_legacy(self):
+        with self.assertRaises(InvalidTag):
+            decrypt_upload(bytes([1]) * 32, BoundedUpload(self.chunked_archive()), io.BytesIO())
+
+    def test_legacy_archive_with_magic_prefix(self):
+        # 旧格式的 nonce 恰好以 MAGIC 开头、长度不符合分块布局：按旧格式解密
+        nonce = CHUNKED_MAGIC + os.urandom(8)
+        plaintext = b'x' * (CHUNK_SIZE + 4)
+        archive = nonce + ChaCha20Poly1305(self.key).encrypt(nonce, plaintext, None)
+        self.assertFalse(chunked_layout_valid(len(archive)))
+        upload = SimpleUploadedFile('legacy.bin', archive)
+        dst = io.BytesIO()
+        self.assertEqual(decrypt_upload(self.key, upload, dst), 'memory')
+        self.assertEqual(dst.getvalue(), plaintext)
+
+
+class ExportCleanupTests(TestCase):
+    """cleanup_expired_exports removes only orphaned job files and leaves everything else in EXPORT_JOB_DIR alone"""
+
+    def setUp(self):
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        self.export_dir = export_dir.name
+        self.enterContext(override_settings(EXPORT_JOB_DIR=self.export_dir))
+
+    def touch(self, name):
+        with open(os.path.join(self.export_dir, name), 'wb') as f:
+            f.write(b'x')
+
+    def test_only_orphaned_job_files_are_removed(self):
+        user = User.objects.create_user(username='exporter', password=None)
+        job = ExportJob.objects.create(created_by=user, expires_at=job_expiry())
+        orphan = uuid.uuid4()
+        self.touch(f'{job.pk}.bin')
+        self.touch(f'{orphan}.bin')
+        self.touch(f'{orphan}.part')
+        self.touch('notes.txt')
+        self.touch(f'{orphan}.txt')
+        subdir = f'{uuid.uuid4()}.bin'
+        os.mkdir(os.path.join(self.export_dir, subdir))
+
+        self.assertEqual(cleanup_expired_exports(), 2)
+        self.assertEqual(
+            sorted(os.listdir(self.export_dir)),
+            sorted([f'{job.pk}.bin', 'notes.txt', f'{orphan}.txt', subdir]),
+        )
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+from .metrics_utils import REGISTRY, REQUEST_LATENCY
+
+logger = logging.getLogger('problems.timing')
+slow_query_logger = logging.getLogger('problems.slow_query')
+
+# 当前请求的计时：{'request', 'db_count', 'db_time', 'template_time'}；请求之外为 None
+_request_timing = ContextVar('request_timing', default=None)
+# 正在为慢查询跑 EXPLAIN：这条语句本身不计时、不计数
+_explaining = ContextVar('explaining', default=False)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SLOW_QUERY_CACHE_KEY = 'slow_queries'
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+SQL_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+SQL_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper: count every query of the request, add up its time and log the slow ones"""
+    timing = _request_timing.get()
+    if timing is None or _explaining.get():
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        result = execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        timing['db_time'] += duration
+        timing['db_count'] += 1
+    if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        record_slow_query(context['connection'], sql, None if many else params, duration, timing['request'])
+    return result
+
+
+def normalize_sql(sql):
+    """Literals -> ?, IN (?, ?, ...) -> IN (...), collapsed whitespace: one fingerprint per query shape"""
+    sql = SQL_STRING.sub('?', sql.replace('%s', '?'))
+    sql = SQL_NUMBER.sub('?', sql)
+    sql = SQL_IN_LIST.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def query_location():
+    """Innermost app frame that issued the query, e.g. 'problems/views.py:512 in problem_edit'"""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and os.path.abspath(frame.filename) != os.path.abspath(__file__):
+            return f'{os.path.relpath(frame.filename, os.path.dirname(APP_DIR))}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def explain_query(connection, sql, params):
+    if connection.vendor != 'sqlite' or params is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    token = _explaining.set(True)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {e}'
+    finally:
+        _explaining.reset(token)
+
+
+def record_slow_query(connection, sql, params, duration, request):
+    """Log one slow statement and fold it into the per-fingerprint aggregate shown on /staff/slow-queries/"""
+    normalized = normalize_sql(sql)
+    fingerprint = hashlib.md5(normalized.encode()).hexdigest()
+    match = request.resolver_match
+    view = match.view_name if match else None
+    location = query_location()
+    ms = round(duration * 1000, 1)
+
+    entries = cache.get(SLOW_QUERY_CACHE_KEY) or {}
+    entry = entries.get(fingerprint)
+    if entry is None:
+        # 每种查询只在第一次出现时 EXPLAIN，控制开销
+        entry = {'sql': normalized, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                 'plan': explain_query(connection, sql, params)}
+        entries[fingerprint] = entry
+    entry['count'] += 1
+    entry['total_ms'] = round(entry['total_ms'] + ms, 1)
+    entry['max_ms'] = max(entry['max_ms'], ms)
+    entry['view'] = view
+    entry['location'] = location
+    entry['last_seen'] = time.time()
+    if len(entries) > settings.SLOW_QUERY_MAX_ENTRIES:
+        # 超出上限时丢掉累计耗时最少的一条
+        del entries[min(entries, key=lambda key: entries[key]['total_ms'])]
+    cache.set(SLOW_QUERY_CACHE_KEY, entries, None)
+
+    slow_query_logger.warning(json.dumps({
+        'ms': ms, 'view': view, 'location': location, 'sql': normalized, 'plan': entry['plan'],
+    }, ensure_ascii=False))
+
+
+def slow_query_report(order_by='total_ms', limit=None):
+    """Aggregated slow queries, worst first"""
+    entries = list((cache.get(SLOW_QUERY_CACHE_KEY) or {}).values())
+    entries.sort(key=lambda entry: entry[order_by], reverse=True)
+    return entries[:limit or settings.SLOW_QUERY_REPORT_SIZE]
+
+
+def clear_slow_queries():
+    cache.delete(SLOW_QUERY_CACHE_KEY)
+
+
+class TimedTemplate:
+    """Wraps a backend template so that render() time is added to the request timing"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timing = _request_timing.get()
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            if timing is not None:
+                timing['template_time'] += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose top-level renders are timed ({% include %} stays inside the engine)"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class RequestTimingMiddleware:
+    """
+    Per-request wall time, DB query count / time, template render time and response size.
+    Emitted as a Server-Timing header and one JSON log line on the 'problems.timing' logger;
+    requests over REQUEST_QUERY_BUDGET or REQUEST_LATENCY_BUDGET_MS are logged as warnings.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = {'request': request, 'db_count': 0, 'db_time': 0.0, 'template_time': 0.0}
+        token = _request_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(record_query))
+                response = self.get_response(request)
+        finally:
+            _request_timing.reset(token)
+        timing['total_time'] = time.perf_counter() - start
+
+        match = request.resolver_match
+        REQUEST_LATENCY.observe(timing['total_time'], view=match.view_name if match else 'unmatched')
+        REGISTRY.flush()
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = self.server_timing(timing)
+        self.log(request, response, timing)
+        return response
+
+    @staticmethod
+    def server_timing(timing):
+        return ', '.join([
+            f"app;dur={timing['total_time'] * 1000:.1f}",
+            f"db;dur={timing['db_time'] * 1000:.1f};desc=\"{timing['db_count']} queries\"",
+            f"tpl;dur={timing['template_time'] * 1000:.1f}",
+        ])
+
+    @staticmethod
+    def log(request, response, timing):
+        match = request.resolver_match
+        total_ms = timing['total_time'] * 1000
+        over_budget = []
+        if timing['db_count'] > settings.REQUEST_QUERY_BUDGET:
+            over_budget.append('queries')
+        if total_ms > settings.REQUEST_LATENCY_BUDGET_MS:
+            over_budget.append('latency')
+        entry = {
+            'view': match.view_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(total_ms, 1),
+            'db_queries': timing['db_count'],
+            'db_ms': round(timing['db_time'] * 1000, 1),
+            'template_ms': round(timing['template_time'] * 1000, 1),
+            # 流式响应（文件下载）只能取 Content-Length（可能没有）
+            'bytes': (int(response.get('Content-Length', 0)) or None) if response.streaming else len(response.content),
+            'over_budget': over_budget,
+        }
+        level = logging.WARNING if over_budget else logging.INFO
+        logger.log(level, json.dumps(entry, ensure_ascii=False))
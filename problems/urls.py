@@ -4,10 +4,13 @@ from . import views
 
 urlpatterns = [
     path('', views.problem_list, name='problem_list'),
+    path('autocomplete/', views.problem_autocomplete, name='problem_autocomplete'),
     path('add/', views.problem_add, name='problem_add'),
     path('edit/<int:pk>/', views.problem_edit, name='problem_edit'),
     path('delete/<int:pk>/', views.problem_delete, name='problem_delete'),
     path('export/', views.export_json, name='export_json'),
+    path('export/jobs/<uuid:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<uuid:job_id>/download/', views.export_job_download, name='export_job_download'),
     path('import/', views.import_json, name='import_json'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
@@ -20,8 +23,12 @@ urlpatterns = [
     path('upload-image/', views.upload_image, name='upload_image'),
     path('staff/resource-management/', views.resource_management, name='resource_management'),
     path('staff/isolated-images/delete/', views.isolated_images_delete, name='isolated_images_delete'),
+    path('staff/slow-queries/', views.slow_queries, name='slow_queries'),
+    path('metrics', views.metrics, name='metrics'),
     path('clear-uploaded-images/', views.clear_uploaded_images, name='clear_uploaded_images'),
     path('view/<uuid:token>/', views.view_detail, name='view_detail'),
+    path('view/<uuid:token>/related/', views.problem_related, name='problem_related'),
+    path('similar/', views.problem_similar, name='problem_similar'),
     path('site-config/edit/', views.site_config_edit, name='site_config_edit'),
     # CV Base URLs
     path('cv-base/', views.cv_base_list, name='cv_base_list'),
@@ -29,7 +36,11 @@ urlpatterns = [
     path('cv-base/edit/<int:pk>/', views.cv_base_edit, name='cv_base_edit'),
     path('cv-base/delete/<int:pk>/', views.cv_base_delete, name='cv_base_delete'),
     path('cv-base/detail/<int:pk>/', views.cv_base_detail, name='cv_base_detail'),
+    path('cv-base/timeline/', views.cv_base_timeline, name='cv_base_timeline'),
+    path('cv-base/search/', views.cv_base_search, name='cv_base_search'),
+    path('cv-base/month-records/', views.cv_base_month_records, name='cv_base_month_records'),
     path('cv-base/calendar-days/', views.cv_base_calendar_days, name='cv_base_calendar_days'),
+    path('cv-base/calendar-range/', views.cv_base_calendar_range, name='cv_base_calendar_range'),
     path('cv-base/create-by-date/', views.cv_base_create_by_date, name='cv_base_create_by_date'),
     path('cv-base/cancel/<int:pk>/', views.cv_base_cancel, name='cv_base_cancel'),
     path('favicon.ico', RedirectView.as_view(url='/static/favicon.ico', permanent=True)),
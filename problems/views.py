@@ -1,14 +1,21 @@
+import hmac
 import json
 import os
 import uuid
+import html
+import time
+from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.urls import reverse
 from .models import Problem
 from .forms import ProblemForm
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Count
+from django.db.models.functions import ExtractYear, ExtractMonth
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from .forms import RegisterForm
@@ -24,10 +31,26 @@ from django.core.exceptions import PermissionDenied
 from .models import SensitiveWord
 from .forms import SensitiveWordForm
 from .sensitive_utils import SensitiveDataProcessor
+from .markdown_utils import MarkdownRenderer
+from .search_utils import CvBaseSearch, ProblemSearch, KeywordIndex, FuzzyIndex, deferred_problem_indexing
+from .timing_utils import slow_query_report, clear_slow_queries
+from .metrics_utils import REGISTRY, ARCHIVE_DURATION, ARCHIVE_BYTES, ORPHAN_IMAGES, ORPHAN_IMAGE_BYTES, record_upload
+from .metrics_utils import ARCHIVE_PEAK_RSS
+from .archive_utils import MemoryMonitor, build_export, decrypt_upload, archive_records, logger as archive_logger
+from .archive_utils import start_export_job, job_status, ranged_file_response, parse_export_filters, ExportJobBusy
+from .similarity_utils import SimilarityIndex
+from .cache_utils import view_detail_cache_key, view_detail_etag, http_timestamp, problem_list_cache_key
+from .cache_utils import cv_calendar_stamp, cv_calendar_range_cache_key, cv_calendar_etag
+from .cache_utils import CachedCountPaginator, problem_count_cache_key
+from .db_utils import read_from_primary
 
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import FileSystemStorage
 from django.views.decorators.http import require_POST
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.utils.http import http_date
 
 from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth import logout
@@ -41,7 +64,7 @@ from .models import SensitiveWord
 from .forms import SensitiveWordForm
 from .sensitive_utils import SensitiveDataProcessor
 
-from .models import SiteConfig, CvBase
+from .models import SiteConfig, CvBase, ExportJob
 from .forms import SiteConfigForm, CvBaseForm
 from hashlib import pbkdf2_hmac
 import base64, gzip, tarfile, io, tempfile, shutil
@@ -50,6 +73,13 @@ from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 # Multi-file constants
 FILE_DELIMITER = '|||'
 
+# problem_edit 从表单写回的普通字段（附件列表单独合并）
+PROBLEM_EDIT_FIELDS = [
+    'key_words', 'title', 'description', 'root_cause', 'solutions', 'others',
+    'description_editor_type', 'root_cause_editor_type', 'solutions_editor_type',
+    'others_editor_type', 'is_public',
+]
+
 
 def parse_files(file_field_value):
     """Parse 'file1.pdf|||file2.doc' -> ['file1.pdf', 'file2.doc']"""
@@ -63,6 +93,46 @@ def build_filename_string(filenames):
     return FILE_DELIMITER.join(filenames)
 
 
+def merge_file_list(instance, field_base, remove=(), add=()):
+    """Merge '<field_base>_file' on a locked instance: drop removed names, append uploads"""
+    filenames = [f for f in getattr(instance, f'get_{field_base}_files')() if f not in remove]
+    filenames.extend(add)
+    if filenames:
+        getattr(instance, f'set_{field_base}_files')(filenames)
+    else:
+        setattr(instance, f'{field_base}_file', None)
+
+
+def stage_uploads(request, files, storage, taken, kind):
+    """
+    Pick a free name for each upload inside the edit transaction; the files are written once it commits.
+    taken: names in the locked row's list, so serialized edits never hand out the same name twice
+    """
+    config = SiteConfig.get_config()
+    max_size = config.get_max_file_size_bytes()
+    size_str = f"{config.max_file_size}{config.max_file_size_unit}"
+    staged = []
+    for f in files:
+        if f.size > max_size:
+            messages.warning(request, f'File {f.name} exceeds {size_str} limit and was skipped.')
+            continue
+        clean_name = f.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
+        filename = storage.get_available_name(clean_name)
+        while filename in taken:
+            filename = storage.get_available_name(storage.get_alternative_name(*os.path.splitext(clean_name)))
+        taken.add(filename)
+        staged.append((filename, f))
+
+    def write_files():
+        for filename, f in staged:
+            storage.save(filename, f)
+            record_upload(kind, f.size)
+
+    if staged:
+        transaction.on_commit(write_files)
+    return [filename for filename, _ in staged]
+
+
 def delete_file_from_disk(problem, field_base, filename):
     """Delete a specific file from disk for a problem. Directory: uploads/<id>/<field_base>/"""
     file_path = os.path.join(settings.MEDIA_ROOT, str(problem.id), field_base, filename)
@@ -80,40 +150,94 @@ def pwd_to_chacha_key(password: str, salt: bytes = b'lore_keeper_sb') -> bytes:
     return key
 
 def owner_or_superuser_required(view_func):
-    """允许创建者或超级用户"""
+    """
+    允许创建者或超级用户；读到的 Problem 以 problem 参数传给视图，视图不再重复查询。
+    POST 在一个事务内加锁读取，视图的修改与这次读取原子完成
+    """
     def _wrapped_view(request, *args, **kwargs):
         # 仅针对需要 pk 的视图
         pk = kwargs.get('pk')
-        obj = get_object_or_404(Problem, pk=pk)
-        if request.user.is_superuser or obj.created_by == request.user:
-            return view_func(request, *args, **kwargs)
-        raise PermissionDenied
+        if request.method != 'POST':
+            return _call_as_owner(view_func, request, get_object_or_404(Problem, pk=pk), 'problem', args, kwargs)
+        with transaction.atomic():
+            obj = get_object_or_404(Problem.objects.select_for_update(), pk=pk)
+            return _call_as_owner(view_func, request, obj, 'problem', args, kwargs)
+    return _wrapped_view
+
+
+def cv_base_owner_or_superuser_required(view_func):
+    """Allow creator or superuser; same as owner_or_superuser_required, passing cv_record to the view"""
+    def _wrapped_view(request, *args, **kwargs):
+        pk = kwargs.get('pk')
+        if request.method != 'POST':
+            return _call_as_owner(view_func, request, get_object_or_404(CvBase, pk=pk), 'cv_record', args, kwargs)
+        with transaction.atomic():
+            obj = get_object_or_404(CvBase.objects.select_for_update(), pk=pk)
+            return _call_as_owner(view_func, request, obj, 'cv_record', args, kwargs)
     return _wrapped_view
 
 
+def _call_as_owner(view_func, request, obj, name, args, kwargs):
+    if request.user.is_superuser or obj.created_by_id == request.user.id:
+        return view_func(request, *args, **{name: obj}, **kwargs)
+    raise PermissionDenied
+
+
 def superuser_required(view_func):
     return user_passes_test(lambda u: u.is_superuser)(view_func)
 
+def search_excerpt(text, length=80):
+    """Escaped leading excerpt for rows matched without an FTS snippet (e.g. by owner name)"""
+    text = html.unescape(text or '')
+    return html.escape(text[:length] + ('…' if len(text) > length else ''), quote=False)
+
+def is_anonymous_without_session(request):
+    """无 session cookie 且无待显示消息：无需加载 session 即可判定为匿名访问"""
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
 # ---------- 游客可见 ----------
 def problem_list(request):
     # Get search query parameter
-    search_query = request.GET.get('q', '')
+    search_query = request.GET.get('q', '').strip()
+    # 模糊模式：按 trigram 相似度排序，容忍拼写错误
+    fuzzy = bool(search_query) and request.GET.get('mode') == 'fuzzy'
+
+    # 匿名整页缓存：命中时不访问 session、不查库、不渲染
+    cache_key = None
+    if is_anonymous_without_session(request):
+        cache_key = problem_list_cache_key(request.GET.get('page', 1), search_query, 'fuzzy' if fuzzy else '')
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        # 页面将写入共享缓存：从主库读，避免落后的副本把旧内容存到刚递增的版本号下
+        read_from_primary()
 
     # Start with base query filtered by visibility
     # Handle both authenticated and anonymous users
+    # select_related：每行都要显示 created_by.username，避免逐行查询用户
     if request.user.is_authenticated:
-        problems = Problem.objects.filter(
+        problems = Problem.objects.select_related('created_by').filter(
             Q(created_by=request.user) | Q(is_public=True)
         ).order_by('-create_time')
     else:
         # Anonymous users only see public problems
-        problems = Problem.objects.filter(
-            Q(created_by__isnull=True, is_public=True) | Q(is_public=True)
-        ).order_by('-create_time')
+        problems = Problem.objects.select_related('created_by').filter(is_public=True).order_by('-create_time')
 
     # Apply search filter if query exists (search across ALL fields)
-    if search_query:
-        problems = problems.filter(
+    # 全文索引可用时加上 FTS 子查询（词元/前缀匹配，带高亮摘要），与子串匹配取并集：
+    # FTS 按词元匹配，"Exception" 找不到只含 "NullPointerException" 的行，子串条件保证这些行不丢
+    fts_pks = ProblemSearch.matching_pks(search_query) if search_query and not fuzzy else None
+
+    if fuzzy:
+        # 已按相似度排好序的 id 列表，只对当前页取行
+        problems = FuzzyIndex.search(request.user, search_query)
+    elif search_query:
+        matches = (
             Q(key_words__icontains=search_query) |
             Q(title__icontains=search_query) |
             Q(description__icontains=search_query) |
@@ -122,10 +246,18 @@ def problem_list(request):
             Q(others__icontains=search_query) |
             Q(created_by__username__icontains=search_query)
         )
+        if fts_pks is not None:
+            matches |= Q(pk__in=fts_pks)
+        problems = problems.filter(matches)
 
     # Paginate results (use site config)
     items_per_page = SiteConfig.get_config().items_per_page
-    paginator = Paginator(problems, items_per_page)
+    if fuzzy:
+        paginator = Paginator(problems, items_per_page)
+    else:
+        # 总数按 查询 + 可见范围 缓存，避免每页都对搜索条件再跑一次 COUNT(*)
+        scope = f'u{request.user.pk}' if request.user.is_authenticated else 'anon'
+        paginator = CachedCountPaginator(problems, items_per_page, problem_count_cache_key(scope, search_query))
     page_number = request.GET.get('page', 1)
 
     try:
@@ -135,6 +267,15 @@ def problem_list(request):
     except EmptyPage:
         page_obj = paginator.page(paginator.num_pages)
 
+    # 批量取当前页 markdown 字段的预渲染 HTML（一次查询）
+    page_problems = list(page_obj)
+    if fuzzy:
+        problems_by_pk = Problem.objects.select_related('created_by').in_bulk(page_problems)
+        page_problems = [problems_by_pk[pk] for pk in page_problems if pk in problems_by_pk]
+    markdown_html = MarkdownRenderer.get_html_map(
+        text for p in page_problems for text in MarkdownRenderer.markdown_texts(p).values()
+    )
+
     # Serialize current page data only
     data = [
         {
@@ -157,17 +298,44 @@ def problem_list(request):
             'created_by': p.created_by.username if p.created_by else '-',
             'public_token': str(p.public_token),
             'is_public': p.is_public,
+            **{
+                f'{f}_html': markdown_html.get(text)
+                for f, text in MarkdownRenderer.markdown_texts(p).items()
+            },
         }
-        for p in page_obj
+        for p in page_problems
     ]
 
+    # 搜索结果只下发各字段的高亮摘要，不下发全文（详情通过 /view/<token>/ 查看）
+    if fts_pks is not None:
+        snippets = ProblemSearch.snippets(search_query, [p.id for p in page_problems])
+        for entry in data:
+            entry['snippets'] = snippets.get(entry['id']) or {
+                f: search_excerpt(entry[f]) for f in ProblemSearch.FIELDS
+            }
+            for f in ['description', 'root_cause', 'solutions', 'others']:
+                entry.pop(f, None)
+                entry.pop(f'{f}_html', None)
+
     context = {
         'problems_json': json.dumps(data, ensure_ascii=False),
         'page_obj': page_obj,
         'search_query': search_query,
+        'fuzzy': fuzzy,
         'user': request.user,
     }
-    return render(request, 'problems/problem_list.html', context)
+    response = render(request, 'problems/problem_list.html', context)
+    if cache_key:
+        cache.set(cache_key, response.content, settings.PROBLEM_LIST_CACHE_TIMEOUT)
+        patch_vary_headers(response, ('Cookie',))
+    return response
+def problem_autocomplete(request):
+    """API: keyword/title-term suggestions for the search box, limited to problems the user can see"""
+    suggestions = KeywordIndex.suggest(request.user, request.GET.get('q', ''))
+    response = JsonResponse({'suggestions': suggestions})
+    patch_cache_control(response, private=True, max_age=settings.AUTOCOMPLETE_MAX_AGE)
+    return response
+
 # ---------- 登录/注册 ----------
 def register_view(request):
     if not settings.REGISTRATION_OPEN:
@@ -235,6 +403,7 @@ def problem_add(request):
                     # Save file manually to temp directory first
                     fs = FileSystemStorage(location=upload_dir)
                     filename = fs.save(clean_name, f)
+                    record_upload('problem', f.size)
                     filenames.append(filename)
 
                 file_info[field_base] = filenames
@@ -351,11 +520,7 @@ def problem_add(request):
 
 @login_required
 @owner_or_superuser_required
-def problem_edit(request, pk):
-    problem = get_object_or_404(Problem, pk=pk)
-    if not problem.is_public and not (request.user == problem.created_by or request.user.is_superuser):
-        raise PermissionDenied
-
+def problem_edit(request, pk, problem):
     if request.method == 'POST':
         form = ProblemForm(request.POST, request.FILES, instance=problem)
         if not form.is_valid():
@@ -368,125 +533,53 @@ def problem_edit(request, pk):
         processed_form, error_msg = SensitiveDataProcessor.validate_and_process_form(form, request)
 
         try:
-            # Store file deletions and updates for ALL fields that need changes
-            files_to_remove = {}  # {field_base: [filenames to remove]}
-            uploaded_files = {}
+            # problem 已由 owner_or_superuser_required 在本次 POST 的事务内加锁读取：合并表单字段与附件列表后写一次。
+            # 磁盘上的删除/写入登记到 on_commit，事务回滚时文件保持不变
+            with transaction.atomic():
+                files_to_remove = {}  # {field_base: [filenames to remove]}
+                uploaded_files = {}
+                for field_base in ['root_cause', 'solutions', 'others']:
+                    current = getattr(problem, f'get_{field_base}_files')()
+                    # 只删除列表中确实存在的附件
+                    delete_list = [f for f in request.POST.getlist(f'{field_base}_files_delete') if f in current]
+                    if delete_list:
+                        files_to_remove[field_base] = delete_list
 
-            # Handle file deletions from POST data
-            for field_base in ['root_cause', 'solutions', 'others']:
-                delete_list = request.POST.getlist(f'{field_base}_files_delete')
-                if delete_list:
-                    files_to_remove[field_base] = delete_list
-                    # Delete from disk
-                    for filename in delete_list:
-                        delete_file_from_disk(problem, field_base, filename)
-
-            # Handle new file uploads
-            for field_base in ['root_cause', 'solutions', 'others']:
-                field_name = f'{field_base}_files'
-                if field_name in request.FILES:
-                    files = request.FILES.getlist(field_name)
                     # Use correct directory structure: uploads/<id>/<field_base>/
-                    upload_dir = os.path.join(settings.MEDIA_ROOT, str(problem.id), field_base)
-                    os.makedirs(upload_dir, exist_ok=True)
-
-                    filenames = []
-                    # Get file size limit once for this upload batch
-                    max_size = SiteConfig.get_config().get_max_file_size_bytes()
-                    config = SiteConfig.get_config()
-                    size_str = f"{config.max_file_size}{config.max_file_size_unit}"
-
-                    for f in files:
-                        # Validate file size
-                        if f.size > max_size:
-                            messages.warning(request, f'File {f.name} exceeds {size_str} limit and was skipped.')
-                            continue
+                    files = request.FILES.getlist(f'{field_base}_files')
+                    if files:
+                        storage = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, str(problem.id), field_base))
+                        filenames = stage_uploads(request, files, storage, set(current), 'problem')
+                        if filenames:
+                            uploaded_files[field_base] = filenames
 
-                        # Clean filename
-                        clean_name = f.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-
-                        # Save file manually to correct directory
-                        fs = FileSystemStorage(location=upload_dir)
-                        filename = fs.save(clean_name, f)
-                        filenames.append(filename)
-
-                    if filenames:
-                        uploaded_files[field_base] = filenames
-
-            # Save other form fields WITHOUT touching file fields
-            problem.key_words = processed_form.cleaned_data.get('key_words', problem.key_words)
-            problem.title = processed_form.cleaned_data.get('title', problem.title)
-            problem.description = processed_form.cleaned_data.get('description', problem.description)
-            problem.description_editor_type = processed_form.cleaned_data.get('description_editor_type', problem.description_editor_type)
-            problem.root_cause = processed_form.cleaned_data.get('root_cause', problem.root_cause)
-            problem.root_cause_editor_type = processed_form.cleaned_data.get('root_cause_editor_type', problem.root_cause_editor_type)
-            problem.solutions = processed_form.cleaned_data.get('solutions', problem.solutions)
-            problem.solutions_editor_type = processed_form.cleaned_data.get('solutions_editor_type', problem.solutions_editor_type)
-            problem.others = processed_form.cleaned_data.get('others', problem.others)
-            problem.others_editor_type = processed_form.cleaned_data.get('others_editor_type', problem.others_editor_type)
-            problem.is_public = processed_form.cleaned_data.get('is_public', problem.is_public)
-
-            # Use update_fields to only update specific fields (excluding file fields)
-            update_fields = ['key_words', 'title', 'description', 'root_cause', 'solutions', 'others',
-                            'description_editor_type', 'root_cause_editor_type', 'solutions_editor_type',
-                            'others_editor_type', 'is_public', 'update_time']
-            if 'uploaded_images' in request.session:
-                if problem.uploaded_images:
-                    uploaded_images = json.loads(problem.uploaded_images)
-                else:
-                    uploaded_images = []
-                uploaded_images.extend(request.session['uploaded_images'])
-                problem.uploaded_images = json.dumps(uploaded_images)
-                del request.session['uploaded_images']
-                update_fields.append('uploaded_images')
-
-            # Process file field updates BEFORE saving the object
-            # This ensures file updates are done correctly and won't be lost
-            from django.db import connection
-
-            # Only update if there are files to remove or new uploads
-            fields_to_update = set(files_to_remove.keys()) | set(uploaded_files.keys())
-            if fields_to_update:
-                cursor = connection.cursor()
-                table_name = Problem._meta.db_table
-
-                for field_base in fields_to_update:
-                    file_field_column = f'{field_base}_file'
+                for field in PROBLEM_EDIT_FIELDS:
+                    setattr(problem, field, processed_form.cleaned_data.get(field, getattr(problem, field)))
+                update_fields = PROBLEM_EDIT_FIELDS + ['update_time']
 
-                    # Get current value from database
-                    cursor.execute(
-                        f"SELECT {file_field_column} FROM {table_name} WHERE id = %s",
-                        [problem.id]
-                    )
-                    current_value = cursor.fetchone()[0]
+                for field_base in set(files_to_remove) | set(uploaded_files):
+                    merge_file_list(problem, field_base,
+                                    remove=files_to_remove.get(field_base, ()),
+                                    add=uploaded_files.get(field_base, ()))
+                    update_fields.append(f'{field_base}_file')
 
-                    # Parse existing filenames
-                    existing_filenames = []
-                    if current_value:
-                        existing_filenames = parse_files(current_value)
+                if 'uploaded_images' in request.session:
+                    uploaded_images = json.loads(problem.uploaded_images) if problem.uploaded_images else []
+                    uploaded_images.extend(request.session['uploaded_images'])
+                    problem.uploaded_images = json.dumps(uploaded_images)
+                    update_fields.append('uploaded_images')
 
-                    # Remove files marked for deletion
-                    if field_base in files_to_remove:
-                        for filename in files_to_remove[field_base]:
-                            if filename in existing_filenames:
-                                existing_filenames.remove(filename)
+                problem.save(update_fields=update_fields)
 
-                    # Add new upload filenames
-                    if field_base in uploaded_files:
-                        existing_filenames.extend(uploaded_files[field_base])
+                def remove_files():
+                    for field_base, filenames in files_to_remove.items():
+                        for filename in filenames:
+                            delete_file_from_disk(problem, field_base, filename)
 
-                    # Update database with final file list
-                    final_value = build_filename_string(existing_filenames) if existing_filenames else None
-                    cursor.execute(
-                        f"UPDATE {table_name} SET {file_field_column} = %s WHERE id = %s",
-                        [final_value, problem.id]
-                    )
+                if files_to_remove:
+                    transaction.on_commit(remove_files)
 
-            # Now save the object after file fields have been updated
-            problem.save(update_fields=update_fields)
-
-            # Reload object from database to get updated file fields
-            problem.refresh_from_db()
+            request.session.pop('uploaded_images', None)
 
             # 如果有脱敏操作，可以给用户提示
             if error_msg and "Content has been desensitized" in error_msg:
@@ -520,163 +613,153 @@ def problem_edit(request, pk):
 
 @login_required
 @owner_or_superuser_required
-def problem_delete(request, pk):
-    problem = get_object_or_404(Problem, pk=pk)
+def problem_delete(request, pk, problem):
     problem.delete()
     return redirect('problem_list')
 
 @login_required
 @superuser_required
 def export_json(request):
+    started = time.perf_counter()
     body = json.loads(request.body)
     password = body.get('password')
     if not password:
         return JsonResponse({'error': 'need password'}, status=400)
 
-    key = pwd_to_chacha_key(password)
-
-    data = list(
-        Problem.objects.all().values(
-            'id', 'key_words', 'title', 'description', 'description_editor_type',
-            'root_cause', 'root_cause_editor_type', 'solutions', 'solutions_editor_type',
-            'others', 'others_editor_type', 'create_time', 'update_time',
-            'root_cause_file','solutions_file','others_file','uploaded_images',
-            'is_public', 'public_token'
-        )
-    )
+    try:
+        filters = parse_export_filters(body)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    cv_base_data = list(
-        CvBase.objects.all().values(
-            'id', 'record_date', 'title', 'content', 'content_editor_type',
-            'content_file', 'create_time', 'update_time'
-        )
-    )
+    key = pwd_to_chacha_key(password)
 
-    # 创建 tar.gz 打包：items.json + cv_base_records.json + uploads/
-    export_buffer = io.BytesIO()
-
-    with tarfile.open(fileobj=export_buffer, mode='w:gz') as tar:
-        # 1. 添加 items.json
-        json_data = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode()
-        json_file = io.BytesIO(json_data)
-        tarinfo = tarfile.TarInfo(name='items.json')
-        tarinfo.size = len(json_data)
-        tar.addfile(tarinfo, json_file)
-
-        # 2. 添加 cv_base_records.json
-        cv_base_json_data = json.dumps(cv_base_data, cls=DjangoJSONEncoder, ensure_ascii=False, indent=2).encode()
-        cv_base_json_file = io.BytesIO(cv_base_json_data)
-        cv_base_tarinfo = tarfile.TarInfo(name='cv_base_records.json')
-        cv_base_tarinfo.size = len(cv_base_json_data)
-        tar.addfile(cv_base_tarinfo, cv_base_json_file)
-
-        # 3. 添加 uploads 目录
-        uploads_path = Path(settings.MEDIA_ROOT)
-        if uploads_path.exists():
-            # 添加所有按 Problem ID 命名的目录
-            for item_dir in uploads_path.iterdir():
-                if item_dir.is_dir() and item_dir.name.isdigit():
-                    # 递归添加整个目录，保持结构
-                    tar.add(item_dir, arcname=f'uploads/{item_dir.name}')
-
-            # 添加 cv_base 目录
-            cv_base_dir = uploads_path / 'cv_base'
-            if cv_base_dir.exists():
-                tar.add(cv_base_dir, arcname='uploads/cv_base')
-
-            # 添加 upload_images 目录
-            upload_images_dir = uploads_path / 'upload_images'
-            if upload_images_dir.exists():
-                tar.add(upload_images_dir, arcname='uploads/upload_images')
-
-    # 加密整个 tar.gz 数据
-    cipher = ChaCha20Poly1305(key)
-    nonce = os.urandom(12)
-    encrypted = cipher.encrypt(nonce, export_buffer.getvalue(), associated_data=None)
-
-    blob = nonce + encrypted
-
-    response = HttpResponse(blob, content_type='application/octet-stream')
+    # 默认后台任务：返回任务地址，前端轮询进度后下载；{"sync": true} 保留原来的同步下载（脚本/基准测试用）
+    if not body.get('sync'):
+        try:
+            job, created = start_export_job(request.user, key, filters)
+        except ExportJobBusy as e:
+            return JsonResponse({
+                'error': 'another export is in progress',
+                'active_job_id': str(e.job.pk),
+                'active_job_status': e.job.status,
+            }, status=409)
+        return JsonResponse({
+            **job_status(job),
+            'created': created,
+            'status_url': reverse('export_job_status', args=[job.pk]),
+            'download_url': reverse('export_job_download', args=[job.pk]),
+        }, status=202)
+
+    # 预估超过 ARCHIVE_MEMORY_LIMIT_MB 时 archive 为临时文件（分块加密格式），否则为 bytes（旧格式）
+    archive, size, info = build_export(key, filters)
+    ARCHIVE_DURATION.observe(time.perf_counter() - started, operation='export')
+    ARCHIVE_BYTES.inc(size, operation='export')
+    ARCHIVE_PEAK_RSS.set(info['peak_rss_mb'] * 1024 * 1024, operation='export', mode=info['mode'])
+
+    if isinstance(archive, bytes):
+        response = HttpResponse(archive, content_type='application/octet-stream')
+    else:
+        response = FileResponse(archive, content_type='application/octet-stream')
+        response['Content-Length'] = size
     response['Content-Disposition'] = 'attachment; filename="items_with_uploads.bin"'
+    response['X-Archive-Mode'] = info['mode']
+    response['X-Archive-Peak-RSS-MB'] = info['peak_rss_mb']
     return response
 
+@login_required
+@superuser_required
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, pk=job_id)
+    return JsonResponse({
+        **job_status(job),
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'done' else None,
+    })
+
+@login_required
+@superuser_required
+def export_job_download(request, job_id):
+    """Finished archive; supports Range / If-Range so interrupted downloads can resume"""
+    job = get_object_or_404(ExportJob, pk=job_id, status='done')
+    if not job.file_path.exists():
+        raise Http404('archive expired')
+    return ranged_file_response(
+        request, job.file_path, f'items_with_uploads_{job.created_at:%Y%m%d-%H%M%S}.bin',
+        etag=f'"{job.pk}-{job.archive_size}"',
+    )
+
 @login_required
 @superuser_required
 def import_json(request):
     if request.method == 'POST' and request.FILES.get('file'):
+        started = time.perf_counter()
         password = request.POST.get('password')
         file_size = request.FILES['file'].size
         if not password:
             return JsonResponse({'error': 'need password'}, status=400)
 
+        monitor = MemoryMonitor().start()
         try:
-            blob = request.FILES['file'].read()
-            if len(blob) < 12:
-                raise ValueError('file is too short')
-
             key = pwd_to_chacha_key(password)
-            nonce, ct = blob[:12], blob[12:]
 
-            cipher = ChaCha20Poly1305(key)
-            decrypted = cipher.decrypt(nonce, ct, associated_data=None)
-
-            # 解压 tar.gz 到临时目录
-            import_buffer = io.BytesIO(decrypted)
+            # 解密后的 tar.gz 写入临时文件：分块格式边读边解密，旧格式整包解密
+            import_buffer = tempfile.TemporaryFile(dir=settings.ARCHIVE_SPOOL_DIR)
             tmp_dir = tempfile.mkdtemp()
 
             try:
+                archive_mode = decrypt_upload(key, request.FILES['file'], import_buffer)
+                import_buffer.seek(0)
+
+                # 解压 tar.gz 到临时目录
                 with tarfile.open(fileobj=import_buffer, mode='r:gz') as tar:
                     tar.extractall(tmp_dir)
 
-                # 读取 items.json
-                with open(os.path.join(tmp_dir, 'items.json'), 'r') as f:
-                    data = json.loads(f.read())
-
-                # 读取 cv_base_records.json（如果存在）
-                cv_base_data = []
-                cv_base_file_path = os.path.join(tmp_dir, 'cv_base_records.json')
-                if os.path.exists(cv_base_file_path):
-                    with open(cv_base_file_path, 'r') as f:
-                        cv_base_data = json.loads(f.read())
+                # 逐条读取 items / cv_base_records：新格式为 .ndjson（流式），旧格式为 .json（整体解析）
+                data = archive_records(tmp_dir, 'items', required=True)
+                cv_base_data = archive_records(tmp_dir, 'cv_base_records')
+                items_count = cv_base_count = 0
 
                 # ID 映射：original_id -> new_id
                 id_mapping = {}
                 cv_base_id_mapping = {}
 
-                for item in data:
-                    original_id = item.get('id')
-
-                    # 设置默认值
-                    item.setdefault('description_editor_type', 'plain')
-                    item.setdefault('root_cause_editor_type', 'plain')
-                    item.setdefault('solutions_editor_type', 'plain')
-                    item.setdefault('others_editor_type', 'plain')
-
-                    # 处理 public_token
-                    public_token = item.get('public_token')
-                    if public_token:
-                        try:
-                            uuid.UUID(public_token)
-                            if Problem.objects.filter(public_token=public_token).exists():
+                # 逐行索引暂停，导入结束后按批统一建索引（MinHash 等逐行计算是导入的主要耗时）
+                with deferred_problem_indexing():
+                    for item in data:
+                        items_count += 1
+                        original_id = item.get('id')
+
+                        # 设置默认值
+                        item.setdefault('description_editor_type', 'plain')
+                        item.setdefault('root_cause_editor_type', 'plain')
+                        item.setdefault('solutions_editor_type', 'plain')
+                        item.setdefault('others_editor_type', 'plain')
+
+                        # 处理 public_token
+                        public_token = item.get('public_token')
+                        if public_token:
+                            try:
+                                uuid.UUID(public_token)
+                                if Problem.objects.filter(public_token=public_token).exists():
+                                    item['public_token'] = uuid.uuid4()
+                            except (ValueError, AttributeError):
                                 item['public_token'] = uuid.uuid4()
-                        except (ValueError, AttributeError):
+                        else:
                             item['public_token'] = uuid.uuid4()
-                    else:
-                        item['public_token'] = uuid.uuid4()
 
-                    # 移除 id，让 Django 生成新的
-                    item.pop('id', None)
+                        # 移除 id，让 Django 生成新的
+                        item.pop('id', None)
 
-                    # 创建新 Problem
-                    new_problem = Problem.objects.create(created_by=request.user, **item)
+                        # 创建新 Problem
+                        new_problem = Problem.objects.create(created_by=request.user, **item)
 
-                    # 记录 ID 映射
-                    id_mapping[original_id] = new_problem.id
+                        # 记录 ID 映射
+                        id_mapping[original_id] = new_problem.id
 
                 # 处理 CvBase 数据导入
                 from datetime import datetime
 
                 for cv_item in cv_base_data:
+                    cv_base_count += 1
                     original_id = cv_item.get('id')
 
                     # 设置默认值
@@ -811,23 +894,37 @@ def import_json(request):
                                             shutil.copytree(src_item, new_dir / item_name,
                                                           dirs_exist_ok=True)
 
+                monitor.stop()
+                memory = {'mode': archive_mode, **monitor.as_dict()}
+                archive_logger.info(json.dumps({
+                    'operation': 'import', 'bytes': file_size,
+                    'seconds': round(time.perf_counter() - started, 2), **memory,
+                }))
+                ARCHIVE_DURATION.observe(time.perf_counter() - started, operation='import')
+                ARCHIVE_BYTES.inc(file_size, operation='import')
+                ARCHIVE_PEAK_RSS.set(monitor.peak_rss, operation='import', mode=archive_mode)
                 return JsonResponse({
-                    'message': f'import {len(data)} items and {len(cv_base_data)} cv_base records successfully',
+                    'message': f'import {items_count} items and {cv_base_count} cv_base records successfully',
                     'error': None,
                     'id_mapping_count': len(id_mapping),
-                    'cv_base_id_mapping_count': len(cv_base_id_mapping)
+                    'cv_base_id_mapping_count': len(cv_base_id_mapping),
+                    'memory': memory,
                 })
 
             finally:
-                # 清理临时目录
+                # 清理临时文件和目录
+                monitor.stop()
+                import_buffer.close()
                 shutil.rmtree(tmp_dir, ignore_errors=True)
 
         except Exception as e:
             import traceback
+            monitor.stop()
             error_detail = str(e)
             error_type = type(e).__name__
 
-            if 'InvalidTag' in error_detail or 'InvalidKey' in error_detail:
+            # InvalidTag 的 str() 为空：按类型判断
+            if error_type in ('InvalidTag', 'InvalidKey'):
                 return JsonResponse({
                     'status': 'error',
                     'error': f'密码错误或文件格式不正确: {error_type}'
@@ -982,6 +1079,7 @@ def upload_image(request):
         upload_images_path = os.path.join(settings.MEDIA_ROOT, 'upload_images')
         fs = FileSystemStorage(location=upload_images_path)
         filename = fs.save(clean_name, image)
+        record_upload('image', image.size)
         # 将图片名存储在会话中
         if 'uploaded_images' not in request.session:
             request.session['uploaded_images'] = []
@@ -1093,6 +1191,8 @@ def resource_management(request):
             'url': settings.MEDIA_URL.rstrip('/') + '/' + f.lstrip('/'),
             'size': size,
         })
+    ORPHAN_IMAGES.set(len(isolated_data))
+    ORPHAN_IMAGE_BYTES.set(sum(item['size'] for item in isolated_data))
 
     home_size = home_du_human_linux()
 
@@ -1109,60 +1209,64 @@ def resource_management(request):
         filenames = file_field_value.split(FILE_DELIMITER)
         return filename in filenames
 
-    def has_filename_in_uploaded_images(uploaded_images_json, filename):
-        """检查 uploaded_images JSON 是否包含指定文件名"""
-        if not uploaded_images_json:
-            return False
-        try:
-            images = json.loads(uploaded_images_json)
-            if isinstance(images, list):
-                return filename in images
-        except (json.JSONDecodeError, TypeError):
-            pass
-        return False
-
+    found = []
     for p in root.rglob('*'):
-        if p.is_file() and p.stat().st_size > threshold_kb * 1024:
-            rel_path = str(p.relative_to(root))
-            file_name = p.name
-
-            owners = []
-
-            # 解析路径结构
-            parts = rel_path.split('/')
-            if parts and parts[0].isdigit() and len(parts) >= 3:
-                # MEDIA_ROOT 下：<id>/<field>/<filename>
-                # 例如: 2/root_cause/ccr_config_example2.json
-                try:
-                    problem_id = int(parts[0])
-                    field_name = parts[1]  # 'root_cause', 'solutions', 'others'
-
-                    # 精确查询指定 ID 的 Problem
-                    problem = Problem.objects.filter(id=problem_id).first()
-                    if problem:
-                        field_column = f'{field_name}_file'
-                        file_field_obj = getattr(problem, field_column)
-                        # 获取 FileField 的 name 属性（字符串）
-                        file_field_value = file_field_obj.name if file_field_obj else None
-
-                        # 检查该字段是否包含该文件名
-                        if has_filename_in_file_field(file_field_value, file_name):
-                            owners.append(problem)
-                except (ValueError, IndexError):
-                    pass
-
-            elif parts and parts[0] == 'upload_images' and len(parts) >= 2:
-                # upload_images/<filename> - 在所有 uploaded_images 中搜索
-                for problem in Problem.objects.all():
-                    if has_filename_in_uploaded_images(problem.uploaded_images, file_name):
-                        owners.append(problem)
-
-            large_files.append({
-                'path': rel_path,
-                'url' : settings.MEDIA_URL.rstrip('/') + '/' + rel_path.lstrip('/'),
-                'size': p.stat().st_size,
-                'owners': owners,
-            })
+        if p.is_file():
+            size = p.stat().st_size
+            if size > threshold_kb * 1024:
+                found.append((str(p.relative_to(root)), p.name, size))
+
+    # 归属查询按批进行：<id>/ 目录一次 in_bulk；upload_images 扫一遍 uploaded_images 建索引
+    # （原先每个文件各查一次 Problem，upload_images 下的每个文件还要遍历全部 Problem）
+    problem_ids = {
+        int(rel_path.split('/')[0]) for rel_path, _, _ in found
+        if rel_path.split('/')[0].isdigit() and len(rel_path.split('/')) >= 3
+    }
+    problems_by_id = Problem.objects.only(
+        'id', 'title', 'root_cause_file', 'solutions_file', 'others_file'
+    ).in_bulk(problem_ids)
+    image_owners = {}
+    if any(rel_path.startswith('upload_images/') for rel_path, _, _ in found):
+        for problem in Problem.objects.exclude(uploaded_images__isnull=True).exclude(uploaded_images='').only(
+            'id', 'title', 'uploaded_images'
+        ):
+            try:
+                images = json.loads(problem.uploaded_images)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(images, list):
+                for name in set(images):
+                    image_owners.setdefault(name, []).append(problem)
+
+    for rel_path, file_name, size in found:
+        owners = []
+
+        # 解析路径结构
+        parts = rel_path.split('/')
+        if parts and parts[0].isdigit() and len(parts) >= 3:
+            # MEDIA_ROOT 下：<id>/<field>/<filename>
+            # 例如: 2/root_cause/ccr_config_example2.json
+            problem = problems_by_id.get(int(parts[0]))
+            field_name = parts[1]  # 'root_cause', 'solutions', 'others'
+            if problem and field_name in ('root_cause', 'solutions', 'others'):
+                file_field_obj = getattr(problem, f'{field_name}_file')
+                # 获取 FileField 的 name 属性（字符串）
+                file_field_value = file_field_obj.name if file_field_obj else None
+
+                # 检查该字段是否包含该文件名
+                if has_filename_in_file_field(file_field_value, file_name):
+                    owners.append(problem)
+
+        elif parts and parts[0] == 'upload_images' and len(parts) >= 2:
+            # upload_images/<filename> - 引用了该文件名的 Problem
+            owners = image_owners.get(file_name, [])
+
+        large_files.append({
+            'path': rel_path,
+            'url' : settings.MEDIA_URL.rstrip('/') + '/' + rel_path.lstrip('/'),
+            'size': size,
+            'owners': owners,
+        })
 
     return render(request, 'problems/resource_management.html', {
         'isolates'      : isolated_data,
@@ -1171,23 +1275,112 @@ def resource_management(request):
         'home_size'     : home_size,
     })
 
+@staff_member_required
+def slow_queries(request):
+    """Top slow SQL statements recorded by timing_utils (aggregated per normalized statement)"""
+    if request.method == 'POST':
+        clear_slow_queries()
+        messages.success(request, 'Slow query log cleared.')
+        return redirect('slow_queries')
+    order_by = request.GET.get('sort', 'total_ms')
+    if order_by not in ('total_ms', 'max_ms', 'count'):
+        order_by = 'total_ms'
+    return render(request, 'problems/slow_queries.html', {
+        'entries': slow_query_report(order_by),
+        'order_by': order_by,
+        'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+    })
+
+def metrics_token_valid(request):
+    """Authorization: Bearer <METRICS_TOKEN>（未配置 METRICS_TOKEN 时不接受任何 token）"""
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.METRICS_TOKEN.encode()
+    )
+
+def metrics(request):
+    """Prometheus text exposition of metrics_utils.REGISTRY (superusers, scrapers with METRICS_TOKEN or from METRICS_ALLOWED_IPS)"""
+    if not (request.user.is_superuser or metrics_token_valid(request)
+            or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS):
+        return HttpResponseForbidden("Metrics require a superuser session or the metrics token.")
+    return HttpResponse(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def view_detail(request, token):
-    problem = get_object_or_404(Problem, public_token=token)
-    if not problem.is_public and not (request.user.is_superuser or request.user == problem.created_by):
+    # 可见性每次都查库（唯一索引，单行）：缓存只保存匿名渲染结果，权限判断不依赖缓存是否已失效
+    # 这里与渲染读同一个库：副本落后时旧内容只会存到旧 update_time 的键下，不会占用新键
+    entry = Problem.objects.filter(public_token=token).values('is_public', 'created_by_id', 'update_time').first()
+    if entry is None:
+        raise Http404('No Problem matches the given query.')
+
+    if not entry['is_public'] and not (request.user.is_superuser or request.user.id == entry['created_by_id']):
         return HttpResponseForbidden("This item is not publicly accessible.")
 
+    # 匿名访问公开条目时页面与用户无关，可共享缓存；其余按用户区分 ETag
+    shared = entry['is_public'] and not request.user.is_authenticated
+    etag = view_detail_etag(token, entry['update_time'], 'anon' if shared else request.user.pk)
+    last_modified = http_timestamp(entry['update_time'])
+
+    # 重新验证命中时直接 304，不查询、不渲染
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        cache_key = view_detail_cache_key(token, entry['update_time'])
+        content = cache.get(cache_key) if shared else None
+        if content is not None:
+            response = HttpResponse(content)
+        else:
+            problem = get_object_or_404(Problem, public_token=token)
+
+            # 一次性给前端：原始文本 + 编辑器类型 + 服务端预渲染 HTML
+            rendered = MarkdownRenderer.get_rendered_fields(problem)
+            fields = {
+                f: {'text': getattr(problem, f), 'editor': getattr(problem, f'{f}_editor_type'), 'html': rendered.get(f)}
+                for f in ['description','root_cause','solutions','others']
+            }
+            response = render(request, 'problems/view_detail.html', {
+                'problem': problem,
+                'problem_fields_json': json.dumps(fields, cls=DjangoJSONEncoder),
+            })
+            if shared:
+                cache.set(cache_key, response.content, settings.VIEW_DETAIL_CACHE_TIMEOUT)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if shared:
+        patch_cache_control(
+            response, public=True, max_age=settings.VIEW_DETAIL_MAX_AGE,
+            stale_while_revalidate=settings.VIEW_DETAIL_STALE_WHILE_REVALIDATE,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-    # 一次性给前端：原始文本 + 编辑器类型
-    fields = {
-        f: {'text': getattr(problem, f), 'editor': getattr(problem, f'{f}_editor_type')}
-        for f in ['description','root_cause','solutions','others']
-    }
-    return render(request, 'problems/view_detail.html', {
-        'problem': problem,
-        'problem_fields_json': json.dumps(fields, cls=DjangoJSONEncoder),
-    })
 
 
+@login_required
+@require_POST
+def problem_similar(request):
+    """API: near-duplicates of the problem being written (problem_add / problem_edit form)"""
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+    fields = [body.get(name) for name in ('key_words', 'title', 'description')]
+    if not all(value is None or isinstance(value, str) for value in fields):
+        return JsonResponse({'error': 'key_words, title and description must be strings'}, status=400)
+    signature = SimilarityIndex.signature_for(*fields)
+    exclude_pk = body.get('exclude') if isinstance(body.get('exclude'), int) else None
+    return JsonResponse({'similar': SimilarityIndex.similar(request.user, signature, exclude_pk=exclude_pk)})
+
+def problem_related(request, token):
+    """API: related problems for /view/<token>/, loaded by the page so its ETag/304 path stays query-free"""
+    problem = get_object_or_404(Problem.objects.only('id', 'is_public', 'created_by_id'), public_token=token)
+    if not problem.is_public and not (request.user.is_superuser or request.user.id == problem.created_by_id):
+        return HttpResponseForbidden("This item is not publicly accessible.")
+    response = JsonResponse({'related': SimilarityIndex.related(request.user, problem)})
+    patch_cache_control(response, private=True, max_age=settings.VIEW_DETAIL_MAX_AGE)
+    return response
 
 @superuser_required
 def site_config_edit(request):
@@ -1208,20 +1401,24 @@ def site_config_edit(request):
     })
 
 # ---------- CV Base Views ----------
+def cv_base_month_counts(user):
+    """[(year, month, count), ...] newest first — one GROUP BY over the (created_by, record_date) index"""
+    return list(
+        CvBase.objects.filter(created_by=user)
+        .annotate(year=ExtractYear('record_date'), month=ExtractMonth('record_date'))
+        .values('year', 'month')
+        .annotate(count=Count('id'))
+        .order_by('-year', '-month')
+        .values_list('year', 'month', 'count')
+    )
+
+
 @login_required
 def cv_base_list(request):
-    cv_records = CvBase.objects.filter(created_by=request.user).order_by('-record_date')
-    
-    # Group records by year and month
+    # 只加载每月条数，月份内的记录在展开时通过 cv_base_month_records 按需获取
     grouped_records = {}
-    for record in cv_records:
-        year = record.record_date.year
-        month = record.record_date.month
-        if year not in grouped_records:
-            grouped_records[year] = {}
-        if month not in grouped_records[year]:
-            grouped_records[year][month] = []
-        grouped_records[year][month].append(record)
+    for year, month, count in cv_base_month_counts(request.user):
+        grouped_records.setdefault(year, {})[month] = count
 
     context = {
         'grouped_records': grouped_records,
@@ -1230,12 +1427,87 @@ def cv_base_list(request):
     return render(request, 'problems/cv_base_list.html', context)
 
 @login_required
-def cv_base_edit(request, pk):
-    cv_record = get_object_or_404(CvBase, pk=pk)
-    if cv_record.created_by != request.user and not request.user.is_superuser:
-        raise PermissionDenied
+def cv_base_timeline(request):
+    """API: per-month record counts for the timeline"""
+    months = [
+        {'year': year, 'month': month, 'count': count}
+        for year, month, count in cv_base_month_counts(request.user)
+    ]
+    return JsonResponse({'months': months})
 
+@login_required
+def cv_base_search(request):
+    """API: ranked full-text search over the user's own records, with highlighted snippets"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+
+    limit = settings.CV_SEARCH_MAX_RESULTS
+    hits = CvBaseSearch.search(CvBaseSearch.user_scopes(request.user), query, limit=limit) or []
+    if len(hits) < limit:
+        # FTS 按词元匹配，找不到只作为词的一部分出现的查询（非 SQLite 时没有 FTS 结果）：
+        # 排在 FTS 结果之后补上子串匹配的记录，不带摘要
+        hits += [
+            {'id': pk, 'snippets': {}}
+            for pk in CvBase.objects.filter(created_by=request.user).filter(
+                Q(title__icontains=query) | Q(content__icontains=query)
+            ).exclude(pk__in=[hit['id'] for hit in hits])
+            .order_by('-record_date').values_list('id', flat=True)[:limit - len(hits)]
+        ]
+
+    # 再按 created_by 过滤一次，索引与数据不一致时也不会越权
+    rows = dict(
+        CvBase.objects.filter(pk__in=[hit['id'] for hit in hits], created_by=request.user)
+        .values_list('id', 'record_date')
+    )
+    results = [
+        {
+            'id': hit['id'],
+            'record_date': rows[hit['id']].isoformat(),
+            'title_html': hit['snippets'].get('title', ''),
+            'content_html': hit['snippets'].get('content', ''),
+        }
+        for hit in hits if hit['id'] in rows
+    ]
+    return JsonResponse({'results': results})
+
+@login_required
+def cv_base_month_records(request):
+    """API: records of one month (title/date/file count only, no content)"""
+    try:
+        year = int(request.GET.get('year', ''))
+        month = int(request.GET.get('month', ''))
+        start = date(year, month, 1)
+        # 下月 1 日在同一校验块内：year=9999, month=12 会溢出
+        end = date(year + month // 12, month % 12 + 1, 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid year or month'}, status=400)
+
+    # 日期范围过滤（可走索引），不用 __year/__month
+    rows = CvBase.objects.filter(
+        created_by=request.user,
+        record_date__gte=start,
+        record_date__lt=end,
+    ).order_by('-record_date').values_list('id', 'record_date', 'title', 'update_time', 'content_file')
+
+    records = [
+        {
+            'id': pk,
+            'record_date': record_date.strftime('%m-%d'),
+            'title': title,
+            'update_time': update_time.strftime('%Y-%m-%d %H:%M'),
+            'file_count': len(parse_files(content_file)),
+        }
+        for pk, record_date, title, update_time, content_file in rows
+    ]
+    return JsonResponse({'records': records})
+
+@login_required
+@cv_base_owner_or_superuser_required
+def cv_base_edit(request, pk, cv_record):
     action = 'Edit' if cv_record.title or cv_record.content else 'Add'
+    # ModelForm 校验时会把表单值写回 instance，先记下原日期
+    original_record_date = cv_record.record_date
 
     if request.method == 'POST':
         form = CvBaseForm(request.POST, request.FILES, instance=cv_record)
@@ -1252,107 +1524,13 @@ def cv_base_edit(request, pk):
             })
 
         try:
-            # Handle file deletions
-            delete_list = request.POST.getlist('content_files_delete')
-            if delete_list:
-                for filename in delete_list:
-                    delete_file_from_disk_cvbase(cv_record, 'content', filename)
-                # Update database to remove deleted files from the list
-                from django.db import connection
-                cursor = connection.cursor()
-                table_name = CvBase._meta.db_table
-                
-                # Get current file list from database
-                cursor.execute(
-                    f"SELECT content_file FROM {table_name} WHERE id = %s",
-                    [cv_record.id]
-                )
-                current_value = cursor.fetchone()[0]
-                
-                # Parse existing filenames
-                existing_filenames = []
-                if current_value:
-                    existing_filenames = parse_files(current_value)
-                
-                # Remove files marked for deletion
-                for filename in delete_list:
-                    if filename in existing_filenames:
-                        existing_filenames.remove(filename)
-                
-                # Update database with final file list
-                final_value = build_filename_string(existing_filenames) if existing_filenames else None
-                cursor.execute(
-                    f"UPDATE {table_name} SET content_file = %s WHERE id = %s",
-                    [final_value, cv_record.id]
-                )
-                # Refresh the record to get updated file field
-                cv_record.refresh_from_db()
-
-            # Handle new file uploads
-            if 'content_files' in request.FILES:
-                files = request.FILES.getlist('content_files')
-                upload_dir = os.path.join(settings.MEDIA_ROOT, 'cv_base', str(cv_record.id), 'content')
-                os.makedirs(upload_dir, exist_ok=True)
-
-                filenames = []
-                max_size = SiteConfig.get_config().get_max_file_size_bytes()
-                config = SiteConfig.get_config()
-                size_str = f"{config.max_file_size}{config.max_file_size_unit}"
-
-                for f in files:
-                    if f.size > max_size:
-                        messages.warning(request, f'File {f.name} exceeds {size_str} limit and was skipped.')
-                        continue
-
-                    clean_name = f.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
-                    fs = FileSystemStorage(location=upload_dir)
-                    filename = fs.save(clean_name, f)
-                    filenames.append(filename)
-
-                if filenames:
-                    # Add new files to existing files
-                    existing_files = cv_record.get_content_files()
-                    existing_files.extend(filenames)
-                    from django.db import connection
-                    cursor = connection.cursor()
-                    table_name = CvBase._meta.db_table
-                    file_string = build_filename_string(existing_files) if existing_files else None
-                    cursor.execute(
-                        f"UPDATE {table_name} SET content_file = %s WHERE id = %s",
-                        [file_string, cv_record.id]
-                    )
-
-            # Save form fields
-            cv_record.title = form.cleaned_data.get('title', cv_record.title)
-            cv_record.content = form.cleaned_data.get('content', cv_record.content)
-            cv_record.content_editor_type = form.cleaned_data.get('content_editor_type', cv_record.content_editor_type)
-
-            # Handle record_date update
+            # Handle record_date update (validated before touching files on disk)
+            new_record_date = None
             new_record_date_str = request.POST.get('record_date')
             if new_record_date_str:
                 try:
                     from datetime import datetime
                     new_record_date = datetime.strptime(new_record_date_str, '%Y-%m-%d').date()
-
-                    # Check if date is already used by another record
-                    if CvBase.objects.filter(
-                        created_by=request.user,
-                        record_date=new_record_date
-                    ).exclude(pk=cv_record.pk).exists():
-                        messages.error(request, f'A record already exists for {new_record_date}. Please choose a different date.')
-                        config = SiteConfig.get_config()
-                        max_file_size_bytes = config.get_max_file_size_bytes()
-                        max_file_size_str = f"{config.max_file_size}{config.max_file_size_unit}"
-                        return render(request, 'problems/cv_base_form.html', {
-                            'form': form,
-                            'action': action,
-                            'cv_record': cv_record,
-                            'max_file_size_bytes': max_file_size_bytes,
-                            'max_file_size_str': max_file_size_str
-                        })
-
-                    cv_record.record_date = new_record_date
-                    update_fields = ['title', 'content', 'content_editor_type', 'record_date', 'update_time']
                 except ValueError:
                     messages.error(request, 'Invalid date format')
                     config = SiteConfig.get_config()
@@ -1365,12 +1543,58 @@ def cv_base_edit(request, pk):
                         'max_file_size_bytes': max_file_size_bytes,
                         'max_file_size_str': max_file_size_str
                     })
-            else:
+
+                # Check if date is already used by another record (only when the date actually changes)
+                if new_record_date != original_record_date and CvBase.objects.filter(
+                    created_by=request.user,
+                    record_date=new_record_date
+                ).exclude(pk=cv_record.pk).exists():
+                    messages.error(request, f'A record already exists for {new_record_date}. Please choose a different date.')
+                    config = SiteConfig.get_config()
+                    max_file_size_bytes = config.get_max_file_size_bytes()
+                    max_file_size_str = f"{config.max_file_size}{config.max_file_size_unit}"
+                    return render(request, 'problems/cv_base_form.html', {
+                        'form': form,
+                        'action': action,
+                        'cv_record': cv_record,
+                        'max_file_size_bytes': max_file_size_bytes,
+                        'max_file_size_str': max_file_size_str
+                    })
+
+            # cv_record 已由 cv_base_owner_or_superuser_required 在本次 POST 的事务内加锁读取：合并后写一次，
+            # 磁盘上的删除/写入登记到 on_commit
+            with transaction.atomic():
+                current = cv_record.get_content_files()
+                delete_list = [f for f in request.POST.getlist('content_files_delete') if f in current]
+
+                filenames = []
+                files = request.FILES.getlist('content_files')
+                if files:
+                    storage = FileSystemStorage(location=os.path.join(settings.MEDIA_ROOT, 'cv_base', str(cv_record.id), 'content'))
+                    filenames = stage_uploads(request, files, storage, set(current), 'cv_base')
+
+                cv_record.title = form.cleaned_data.get('title', cv_record.title)
+                cv_record.content = form.cleaned_data.get('content', cv_record.content)
+                cv_record.content_editor_type = form.cleaned_data.get('content_editor_type', cv_record.content_editor_type)
                 update_fields = ['title', 'content', 'content_editor_type', 'update_time']
 
-            cv_record.save(update_fields=update_fields)
-            
-            cv_record.refresh_from_db()
+                if delete_list or filenames:
+                    merge_file_list(cv_record, 'content', remove=delete_list, add=filenames)
+                    update_fields.append('content_file')
+
+                if new_record_date:
+                    cv_record.record_date = new_record_date
+                    update_fields.append('record_date')
+
+                cv_record.save(update_fields=update_fields)
+
+                def remove_files():
+                    for filename in delete_list:
+                        delete_file_from_disk_cvbase(cv_record, 'content', filename)
+
+                if delete_list:
+                    transaction.on_commit(remove_files)
+
             messages.success(request, 'CV record updated successfully!')
             return redirect('cv_base_list')
         
@@ -1431,6 +1655,7 @@ def cv_base_add(request):
                 clean_name = f.name.replace(' ', '_').replace('/', '_').replace('\\', '_')
                 fs = FileSystemStorage(location=upload_dir)
                 filename = fs.save(clean_name, f)
+                record_upload('cv_base', f.size)
                 filenames.append(filename)
 
             file_info['content'] = filenames
@@ -1535,12 +1760,14 @@ def cv_base_detail(request, pk):
     if cv_record.created_by != request.user and not request.user.is_superuser:
         raise HttpResponseForbidden("You don't have permission to view this record.")
     
+    rendered = MarkdownRenderer.get_rendered_fields(cv_record)
     fields = {
-        'content': {'text': cv_record.content, 'editor': cv_record.content_editor_type}
+        'content': {'text': cv_record.content, 'editor': cv_record.content_editor_type, 'html': rendered.get('content')}
     }
     return render(request, 'problems/cv_base_detail.html', {
         'cv_record': cv_record,
         'cv_fields_json': json.dumps(fields, cls=DjangoJSONEncoder),
+        'content_html': rendered.get('content', ''),
     })
 
 @login_required
@@ -1558,16 +1785,61 @@ def cv_base_calendar_days(request):
     except ValueError:
         return JsonResponse({'error': 'Invalid year or month'}, status=400)
     
+    try:
+        start = date(year, month, 1)
+        # 下月 1 日在同一校验块内：year=9999, month=12 会溢出
+        end = date(year + month // 12, month % 12 + 1, 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid year or month'}, status=400)
+
     existing_dates = list(
         CvBase.objects.filter(
             created_by=request.user,
-            record_date__year=year,
-            record_date__month=month
+            record_date__gte=start,
+            record_date__lt=end
         ).values_list('record_date__day', flat=True)
     )
     
     return JsonResponse({'existing_dates': existing_dates})
 
+@login_required
+def cv_base_calendar_range(request):
+    """API: existing record dates in [start, end] — one BETWEEN query, cached per user with an ETag"""
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        return JsonResponse({'error': 'start and end must be YYYY-MM-DD'}, status=400)
+    if end < start or (end - start).days >= settings.CV_CALENDAR_MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Range must be 1-{settings.CV_CALENDAR_MAX_RANGE_DAYS} days'}, status=400)
+
+    # stamp = 用户最新 update_time + 记录数，CvBase 变更时失效；命中时 304 不查库
+    stamp = cv_calendar_stamp(request.user.id)
+    etag = cv_calendar_etag(request.user.id, stamp, start, end)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache_key = cv_calendar_range_cache_key(request.user.id, stamp, start, end)
+        dates = cache.get(cache_key)
+        if dates is None:
+            dates = [
+                d.isoformat() for d in CvBase.objects.using('default').filter(
+                    created_by=request.user,
+                    record_date__range=(start, end)
+                ).order_by('record_date').values_list('record_date', flat=True)
+            ]
+            cache.set(cache_key, dates, settings.CV_CALENDAR_CACHE_TIMEOUT)
+
+        data = {'start': start.isoformat(), 'end': end.isoformat(), 'dates': dates}
+        if request.GET.get('format') == 'bitmap':
+            # 每天一位：'1' 表示当天已有记录
+            offsets = {(date.fromisoformat(d) - start).days for d in dates}
+            data['bitmap'] = ''.join('1' if i in offsets else '0' for i in range((end - start).days + 1))
+        response = JsonResponse(data)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 @login_required
 def cv_base_create_by_date(request):
     """Create CV record for specific date"""
@@ -1625,12 +1897,3 @@ def delete_file_from_disk_cvbase(cv_base, field_base, filename):
             return False
     return False
 
-def cv_base_owner_or_superuser_required(view_func):
-    """Allow creator or superuser"""
-    def _wrapped_view(request, *args, **kwargs):
-        pk = kwargs.get('pk')
-        obj = get_object_or_404(CvBase, pk=pk)
-        if request.user.is_superuser or obj.created_by == request.user:
-            return view_func(request, *args, **kwargs)
-        raise PermissionDenied
-    return _wrapped_view